@@ -5,6 +5,7 @@ import json
 import uuid
 import threading
 import time
+from concurrent.futures import Future
 from datetime import datetime
 import pytz
 from werkzeug.utils import secure_filename
@@ -14,6 +15,15 @@ from services.google_drive_service import GoogleDriveService
 from services.google_sheets_service import GoogleSheetsService
 from services.email_service import send_notification_email
 from services.sms_service import SMSService
+from services.job_queue import SubmissionJobQueue, QueueFullError
+from services.job_store import SubmissionJobStore, DATA_DIR
+from services.stage_graph import StageGraph
+from services.progress_model import StageTimingModel
+from services.notification_outbox import NotificationOutbox
+from services.progress_store import create_progress_store
+from services.ocr_cache import OCRResultCache, save_upload_with_hash, hash_file
+from services.utility_profiles import configure_profiles as configure_utility_profiles
+from services.llm_client import get_llm_client
 from dotenv import load_dotenv
 import gc
 import psutil
@@ -27,8 +37,29 @@ app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png'}
 
-# Global progress tracking
-progress_sessions = {}
+# Progress sessions live in a store shared by every gunicorn worker (PROGRESS_STORE=sqlite|memory)
+progress_store = create_progress_store()
+
+# Bounded worker pool for submissions - caps concurrent OCR/PDF/Drive pipelines
+submission_queue = SubmissionJobQueue(
+    worker_count=int(os.getenv('SUBMISSION_WORKERS', '2')),
+    max_queued=int(os.getenv('SUBMISSION_QUEUE_SIZE', '8'))
+)
+
+# Durable job records so submissions survive gunicorn worker recycling
+job_store = SubmissionJobStore()
+
+# Measured stage durations (EWMA) - drive progress percentages and ETAs
+stage_timings = StageTimingModel()
+
+# Email/SMS are delivered by a background dispatcher with retries, off the critical path
+notification_outbox = NotificationOutbox()
+
+# Extracted bill data keyed by upload SHA-256 - a resubmitted bill skips OCR and LLM parsing
+ocr_cache = OCRResultCache(
+    ttl_seconds=int(os.getenv('OCR_CACHE_TTL_SECONDS', str(7 * 86400))),
+    max_entries=int(os.getenv('OCR_CACHE_MAX_ENTRIES', '500'))
+)
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs('temp', exist_ok=True)
@@ -67,14 +98,49 @@ dynamic_sheets_service = sheets_service  # Points to same instance!
 
 sms_service = SMSService()
 
-# Initialize Google Sheets structure on startup
-try:
-    sheets_service.setup_required_tabs()
-    # Force update headers to new 24-column structure (one-time fix)
-    sheets_service.force_update_headers()
-    print("Google Sheets setup completed with forced header update")
-except Exception as e:
-    print(f"Warning: Could not setup Google Sheets tabs: {e}")
+def setup_google_sheets():
+    """One-time Google Sheets structure setup for a deploy; returns whether it succeeded"""
+    try:
+        sheets_service.setup_required_tabs()
+        # Force update headers to new 24-column structure (one-time fix)
+        sheets_service.force_update_headers()
+        print("Google Sheets setup completed with forced header update")
+        return True
+    except Exception as e:
+        print(f"Warning: Could not setup Google Sheets tabs: {e}")
+        return False
+
+def setup_google_sheets_once():
+    """
+    Run setup_google_sheets() once per deploy across all workers. The first worker to
+    take the file lock runs it and records the deploy in a marker under DATA_DIR;
+    other workers, and workers recycled later, skip it.
+    """
+    import fcntl
+    # Render sets the deployed commit; elsewhere a new app.py means a new deploy
+    deploy_key = os.getenv('RENDER_GIT_COMMIT') or str(int(os.path.getmtime(__file__)))
+    marker_path = os.path.join(DATA_DIR, 'sheets_setup.done')
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(os.path.join(DATA_DIR, 'sheets_setup.lock'), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return  # Another worker is running it
+        try:
+            with open(marker_path) as marker:
+                if marker.read().strip() == deploy_key:
+                    return
+        except FileNotFoundError:
+            pass
+        if setup_google_sheets():
+            with open(marker_path, 'w') as marker:
+                marker.write(deploy_key)
+
+def _setup_google_sheets_in_background():
+    try:
+        setup_google_sheets_once()
+    except Exception as e:
+        print(f"Warning: Google Sheets setup did not run: {e}")
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -86,115 +152,95 @@ def generate_unique_id():
     return f"SUB-{timestamp}-{uuid_hex}"
 
 # Progress tracking functions
-def create_progress_session():
-    """Create a new progress tracking session"""
-    session_id = str(uuid.uuid4())
-    progress_sessions[session_id] = {
+# Each open stream holds one of the worker's gunicorn threads: streams are recycled
+# well inside the request timeout, and only a few may be open per worker at once -
+# beyond that the browser gets a 503 and falls back to polling /progress
+PROGRESS_STREAM_MAX_SECONDS = int(os.getenv('PROGRESS_STREAM_MAX_SECONDS', '30'))
+PROGRESS_STREAM_HEARTBEAT_SECONDS = 3
+PROGRESS_STREAM_MAX_CONCURRENT = int(os.getenv('PROGRESS_STREAM_MAX_CONCURRENT',
+                                               str(max(1, int(os.getenv('GUNICORN_THREADS', '8')) // 4))))
+_progress_stream_slots = threading.BoundedSemaphore(PROGRESS_STREAM_MAX_CONCURRENT)
+
+def create_progress_session(session_id=None):
+    """Create a new progress tracking session (optionally re-creating a known session ID)"""
+    session_id = session_id or str(uuid.uuid4())
+    progress_store.create(session_id, {
         'current_step': 0,
         'total_steps': 7,
         'percentage': 0,
         'step_name': 'Initializing',
         'step_description': 'Preparing to process your submission',
         'start_time': time.time(),
-        'estimated_completion': time.time() + 120,  # 2 minutes estimate
+        'estimated_completion': time.time() + stage_timings.remaining_seconds(SUBMISSION_STAGES),
         'completed': False,
         'error': None,
         'status': 'in_progress'  # Mark as actively processing
-    }
+    })
     print(f"📝 Created new progress session: {session_id}")
     return session_id
 
-def update_progress(session_id, step, step_name, step_description, percentage=None):
-    """Update progress for a session"""
-    if session_id not in progress_sessions:
-        return
-    
-    session = progress_sessions[session_id]
-    session['current_step'] = step
-    session['step_name'] = step_name
-    session['step_description'] = step_description
-    
-    if percentage is None:
-        # Calculate percentage based on step
-        percentage = min(int((step / session['total_steps']) * 100), 100)
+def update_progress(session_id, step, step_name, step_description, percentage=None, remaining_seconds=None):
+    """Update progress for a session.
     
-    session['percentage'] = percentage
-    
-    # Update time estimates
-    elapsed = time.time() - session['start_time']
-    if step > 0:
-        estimated_total = (elapsed / step) * session['total_steps']
-        session['estimated_completion'] = session['start_time'] + estimated_total
+    percentage and remaining_seconds come from the measured stage timing model;
+    when omitted the previous values are kept.
+    """
+    def _apply(session):
+        session['current_step'] = step
+        session['step_name'] = step_name
+        session['step_description'] = step_description
+        
+        # Stages run concurrently, so never let the bar move backwards
+        if percentage is not None:
+            session['percentage'] = max(percentage, session['percentage'])
+        
+        if remaining_seconds is not None:
+            session['estimated_completion'] = time.time() + remaining_seconds
     
-    print(f"Progress {session_id}: Step {step}/7 - {step_name} ({percentage}%)")
+    session = progress_store.update(session_id, mutate=_apply)
+    if session is None:
+        return
+    print(f"Progress {session_id}: Step {step}/7 - {step_name} ({session['percentage']}%)")
 
 def complete_progress(session_id, success=True, error=None):
     """Mark progress as completed and clean up memory"""
-    if session_id not in progress_sessions:
-        return
+    def _apply(session):
+        session['completed'] = True
+        session['percentage'] = 100 if success else session['percentage']
+        session['error'] = error
+        session['status'] = 'completed'  # Mark as no longer processing
+        session['completed_time'] = time.time()  # Track when it completed
+        
+        if success:
+            session['step_name'] = 'Complete'
+            session['step_description'] = 'Submission processed successfully'
+        
+        # Clean up result data to save memory (keep only essential info)
+        if 'result' in session:
+            # Keep only the IDs for reference, remove large data
+            if isinstance(session['result'], dict):
+                session['result'] = {
+                    'poa_id': session['result'].get('poa_id'),
+                    'unique_id': session['result'].get('unique_id')
+                }
+        
+        # Mark session for early cleanup (2 minutes instead of 10)
+        session['cleanup_time'] = time.time() + 120  # 2 minutes
     
-    session = progress_sessions[session_id]
-    session['completed'] = True
-    session['percentage'] = 100 if success else session['percentage']
-    session['error'] = error
-    session['status'] = 'completed'  # Mark as no longer processing
-    session['completed_time'] = time.time()  # Track when it completed
+    if progress_store.update(session_id, mutate=_apply) is None:
+        return
     
     if success:
-        session['step_name'] = 'Complete'
-        session['step_description'] = 'Submission processed successfully'
         print(f"✅ Completed progress session: {session_id}")
     else:
         print(f"❌ Failed progress session: {session_id} - Error: {error}")
-    
-    # Clean up result data to save memory (keep only essential info)
-    if 'result' in session:
-        # Keep only the IDs for reference, remove large data
-        if isinstance(session['result'], dict):
-            session['result'] = {
-                'poa_id': session['result'].get('poa_id'),
-                'unique_id': session['result'].get('unique_id')
-            }
-    
-    # Mark session for early cleanup (2 minutes instead of 10)
-    session['cleanup_time'] = time.time() + 120  # 2 minutes
 
 def cleanup_old_sessions():
     """Clean up old progress sessions while protecting active ones"""
-    current_time = time.time()
-    sessions_to_remove = []
-    
-    for session_id, session in progress_sessions.items():
-        # NEVER delete sessions that are still processing
-        if session.get('status') == 'in_progress':
-            continue
-            
-        # Check if session is completed or abandoned
-        is_completed = session.get('status') == 'completed'
-        is_old = current_time > session.get('start_time', 0) + 600  # 10 minutes instead of 2
-        
-        # Remove if completed AND older than 2 minutes, or if abandoned for 10 minutes
-        if is_completed and current_time > session.get('completed_time', session['start_time']) + 120:
-            sessions_to_remove.append(session_id)
-        elif not is_completed and is_old:
-            sessions_to_remove.append(session_id)
-    
-    # Remove old sessions
-    for session_id in sessions_to_remove:
-        print(f"🗑️ Removing old session: {session_id}")
-        del progress_sessions[session_id]
-    
-    # Keep more sessions (20 instead of 10) and NEVER remove in_progress ones
-    if len(progress_sessions) > 20:
-        # Sort by start time but exclude in_progress sessions
-        completed_sessions = [(sid, s) for sid, s in progress_sessions.items() 
-                            if s.get('status') != 'in_progress']
-        completed_sessions.sort(key=lambda x: x[1]['start_time'], reverse=True)
-        
-        # If we have too many completed sessions, remove the oldest
-        if len(completed_sessions) > 15:
-            for sid, _ in completed_sessions[15:]:
-                del progress_sessions[sid]
+    # Completed sessions go after 2 minutes, abandoned ones after 10; in-progress sessions are never removed
+    removed = progress_store.purge(completed_ttl=120, abandoned_ttl=600, keep_completed=15)
+    if removed:
+        print(f"🗑️ Removed {removed} old progress session(s)")
     
     # Log memory status with more detail
     try:
@@ -206,39 +252,16 @@ def cleanup_old_sessions():
             print(f"⚠️ High memory usage: {memory_mb:.1f}MB - forcing aggressive cleanup")
             
             # NEVER clear in-progress sessions, even at critical memory levels
-            if memory_mb > 300:
-                # Count in-progress sessions
-                in_progress_count = sum(1 for s in progress_sessions.values() 
-                                      if s.get('status') == 'in_progress')
-                completed_count = len(progress_sessions) - in_progress_count
-                
-                print(f"🚨 CRITICAL memory: {in_progress_count} active, {completed_count} completed sessions")
-                
-                # Only clear completed sessions that are older than 5 minutes
-                current_time = time.time()
-                cleared_count = 0
-                for sid, session in list(progress_sessions.items()):
-                    if (session.get('status') == 'completed' and 
-                        current_time - session.get('completed_time', session['start_time']) > 300):
-                        del progress_sessions[sid]
-                        cleared_count += 1
-                        print(f"   Cleared old completed session: {sid}")
-                
-                if cleared_count > 0:
-                    print(f"   Total cleared: {cleared_count} sessions")
-                else:
-                    print(f"   No old completed sessions to clear")
+            in_progress_count = progress_store.count('in_progress')
+            completed_count = progress_store.count() - in_progress_count
+            print(f"🚨 {in_progress_count} active, {completed_count} completed sessions")
+            
+            # Keep in-progress sessions plus the 5 most recent completed ones
+            cleared_count = progress_store.purge(completed_ttl=120, abandoned_ttl=600, keep_completed=5)
+            if cleared_count > 0:
+                print(f"   Total cleared: {cleared_count} sessions")
             else:
-                # Keep in-progress sessions plus 5 most recent completed ones
-                in_progress = {sid: s for sid, s in progress_sessions.items() 
-                             if s.get('status') == 'in_progress'}
-                completed = [(sid, s) for sid, s in progress_sessions.items() 
-                           if s.get('status') != 'in_progress']
-                completed.sort(key=lambda x: x[1]['start_time'], reverse=True)
-                
-                progress_sessions.clear()
-                progress_sessions.update(in_progress)
-                progress_sessions.update(dict(completed[:5]))
+                print(f"   No old completed sessions to clear")
             
             # Force garbage collection multiple times
             for _ in range(3):
@@ -249,37 +272,46 @@ def cleanup_old_sessions():
             print(f"📊 Memory after cleanup: {memory_after:.1f}MB (freed {memory_mb - memory_after:.1f}MB)")
     except:
         pass
-@app.route('/progress/<session_id>')
-def get_progress(session_id):
-    """Get current progress for a session"""
-    # Removed cleanup_old_sessions() to prevent race conditions
-    
-    if session_id not in progress_sessions:
-        return jsonify({'error': 'Session not found'}), 404
-    
-    session = progress_sessions[session_id]
+
+def build_progress_payload(session_id):
+    """Snapshot of a session's progress for the client, or None if the session is unknown"""
+    session = progress_store.get(session_id)
+    if session is None:
+        return None
     
     # Calculate remaining time estimate
     current_time = time.time()
-    elapsed = current_time - session['start_time']
+    percentage = session['percentage']
+    queue_position = submission_queue.position(session_id)
+    if queue_position is None and not session.get('processing_started'):
+        # Queued in another worker - fall back to the position recorded at submit time
+        queue_position = session.get('queue_position') or None
     
     if session['completed']:
         remaining_time = 0
         time_text = "Complete!"
-    elif session['current_step'] > 0:
-        estimated_total = session['estimated_completion'] - session['start_time']
-        remaining = max(0, estimated_total - elapsed)
+    else:
+        remaining = max(0, session['estimated_completion'] - current_time)
+        if queue_position:
+            # Jobs ahead of us must finish first - each takes roughly one full pipeline run
+            remaining += (queue_position / submission_queue.worker_count) * stage_timings.remaining_seconds(SUBMISSION_STAGES)
         remaining_time = int(remaining)
         
-        if remaining_time > 60:
+        # Advance the bar between stage events using the measured ETA
+        processing_started = session.get('processing_started')
+        if processing_started and session['estimated_completion'] > processing_started:
+            live = 100 * (current_time - processing_started) / (session['estimated_completion'] - processing_started)
+            percentage = max(percentage, min(int(live), 99))
+        
+        if queue_position:
+            # Submissions waiting for a free worker report their place in line
+            time_text = f"Queued - {queue_position} submission(s) ahead of yours"
+        elif remaining_time > 60:
             time_text = f"About {remaining_time//60} minute(s) remaining"
         elif remaining_time > 0:
             time_text = f"About {remaining_time} seconds remaining"
         else:
             time_text = "Almost done..."
-    else:
-        remaining_time = 120  # Default estimate
-        time_text = "Estimated time: 1-2 minutes"
     
     # Determine status for JavaScript
     if session['completed'] and not session['error']:
@@ -293,22 +325,73 @@ def get_progress(session_id):
         'session_id': session_id,
         'current_step': session['current_step'],
         'total_steps': session['total_steps'],
-        'percentage': session['percentage'],
+        'percentage': percentage,
         'step_name': session['step_name'],
         'step_description': session['step_description'],
         'remaining_time': remaining_time,
         'time_text': time_text,
         'completed': session['completed'],
         'error': session['error'],
-        'status': status
+        'status': status,
+        'queue_position': queue_position,
+        'ocr_cache_hit': session.get('ocr_cache_hit', False)
     }
     
     # Include result data if completed successfully
     if status == 'completed' and 'result' in session:
         response_data['result_data'] = session['result']
         
+    return response_data
+
+@app.route('/progress/<session_id>')
+def get_progress(session_id):
+    """Get current progress for a session (polling fallback for the event stream)"""
+    # Removed cleanup_old_sessions() to prevent race conditions
+    
+    response_data = build_progress_payload(session_id)
+    if response_data is None:
+        return jsonify({'error': 'Session not found'}), 404
+    
     return jsonify(response_data)
 
+@app.route('/progress/<session_id>/stream')
+def stream_progress(session_id):
+    """Server-Sent Events stream pushed by update_progress/complete_progress"""
+    if progress_store.version(session_id) is None:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    # Keep threads free for /submit and /progress - the client polls instead
+    if not _progress_stream_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many progress streams - poll /progress instead'})
+        response.headers['Retry-After'] = str(PROGRESS_STREAM_MAX_SECONDS)
+        return response, 503
+    
+    def _events():
+        # Ask the browser to reconnect quickly when we end the stream below
+        yield "retry: 2000\n\n"
+        deadline = time.time() + PROGRESS_STREAM_MAX_SECONDS
+        last_version = None
+        with progress_store.watch(session_id) as wait_for_change:
+            while time.time() < deadline:
+                # Every progress write bumps the session version, whichever worker made it
+                last_version = wait_for_change(last_version, timeout=PROGRESS_STREAM_HEARTBEAT_SECONDS)
+                
+                # Send on every change, and as a heartbeat so the bar keeps moving with the ETA
+                payload = build_progress_payload(session_id)
+                if payload is None:
+                    yield "event: gone\ndata: {}\n\n"
+                    return
+                yield f"data: {json.dumps(payload)}\n\n"
+                if payload['status'] in ('completed', 'error'):
+                    return
+    
+    response = app.response_class(_events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let proxies buffer the stream
+    # Runs when the stream ends or the client disconnects
+    response.call_on_close(_progress_stream_slots.release)
+    return response
+
 @app.route('/')
 def index():
     try:
@@ -1563,239 +1646,365 @@ def test_pixel_perfect_full():
             'traceback': traceback.format_exc()
         }), 500
 
-def process_submission_background(session_id, form_data, file_path):
-    """Background processing function with progress tracking and dynamic template selection"""
+EMPTY_OCR_DATA = {
+    'utility_name': '',
+    'customer_name': '',
+    'account_number': '',
+    'poid': '',
+    'monthly_usage': '',
+    'annual_usage': '',
+    'service_address': ''
+}
+
+# OCR fields printed on the POA and agreement
+DOCUMENT_OCR_FIELDS = ('utility_name', 'account_number', 'poid', 'monthly_usage', 'annual_usage', 'service_address')
+
+def _run_stage(job_id, checkpoint, stage, func):
+    """Run a pipeline stage once - stages completed by an earlier attempt are replayed from the checkpoint"""
+    if stage in checkpoint:
+        print(f"⏩ Job {job_id}: reusing checkpointed stage '{stage}'")
+        return checkpoint[stage]
+    result = func()
+    job_store.save_checkpoint(job_id, stage, result)
+    checkpoint[stage] = result
+    return result
+
+def _extract_bill_data(file_path, progress_callback=None):
+    """
+    Run OCR + LLM extraction, falling back to empty fields so the submission can continue.
+    progress_callback(event, data) receives the per-page and early-fields events as OCR streams.
+    """
+    try:
+        # Per-utility extraction profiles can be tuned in the Dynamic Form Revisions sheet
+        configure_utility_profiles(dynamic_sheets_service.get_utility_profiles())
+    except Exception as e:
+        print(f"⚠️  Could not load utility profiles, using built-in profiles: {e}")
+    
     try:
-        # Step 1: Uploading Document (5-20%)
-        update_progress(session_id, 1, "Uploading Document", "Saving your utility bill securely", 5)
-        time.sleep(0.2)  # Simulate upload
-        update_progress(session_id, 1, "Uploading Document", "Validating file format", 15)
-        time.sleep(0.3)
-        update_progress(session_id, 1, "Uploading Document", "File saved successfully", 20)
-        
-        # Step 2: OCR Processing (20-35%)
-        update_progress(session_id, 2, "OCR Analysis", "Initializing text recognition", 25)
-        time.sleep(0.2)
-        update_progress(session_id, 2, "OCR Analysis", "Reading text from your utility bill", 30)
+        ocr_data = process_utility_bill(file_path, SERVICE_ACCOUNT_INFO, progress_callback)
+        print(f"✅ OCR extraction successful: {json.dumps(ocr_data, indent=2)}")
+        return ocr_data
+    except Exception as ocr_error:
+        import traceback
+        error_details = traceback.format_exc()
+        print(f"❌ OCR extraction failed: {str(ocr_error)}")
+        print(f"❌ Error type: {type(ocr_error).__name__}")
+        print(f"❌ Full traceback:\n{error_details}")
+        
+        # Log critical info for debugging
+        print(f"🔍 Debug info:")
+        print(f"   - File path: {file_path}")
+        print(f"   - File exists: {os.path.exists(file_path)}")
+        print(f"   - Service account configured: {'Yes' if SERVICE_ACCOUNT_INFO else 'No'}")
+        print(f"   - OpenAI key configured: {'Yes' if os.getenv('OPENAI_API_KEY') else 'No'}")
+        
+        # Use empty OCR data to continue processing
+        return dict(EMPTY_OCR_DATA)
+
+def _generate_agreement(form_data, ocr_data, timestamp):
+    """Generate the Community Solar Agreement, using the dynamic template mapping when configured"""
+    # Get agreement template from dynamic sheets with validation
+    dynamic_sheets_id = os.getenv('DYNAMIC_GOOGLE_SHEETS_ID')
+    dynamic_drive_id = os.getenv('DYNAMIC_GOOGLE_DRIVE_FOLDER_ID')
+    
+    if not (dynamic_sheets_id and dynamic_drive_id):
+        # Fallback to original method if dynamic config not available
+        return generate_agreement_pdf(form_data, ocr_data, form_data['developer_assigned'], timestamp)
+    
+    # Reuse existing drive service with different parent folder
+    dynamic_drive_service = GoogleDriveService(parent_folder_id=dynamic_drive_id)
+    
+    agreement_filename = dynamic_sheets_service.get_developer_agreement(
+        form_data['developer_assigned'], 
+        form_data['utility_provider'], 
+        form_data['account_type']
+    )
+    
+    # Check if we need Mass Market override
+    if form_data['account_type'] == 'Mass Market [Residential]':
+        mass_market_filename = dynamic_sheets_service.get_developer_agreement(
+            form_data['developer_assigned'], 
+            'Mass Market', 
+            form_data['account_type']
+        )
+        if mass_market_filename:
+            agreement_filename = mass_market_filename
+    
+    if agreement_filename:
         try:
-            ocr_data = process_utility_bill(file_path, SERVICE_ACCOUNT_INFO)
-            print(f"✅ OCR extraction successful: {json.dumps(ocr_data, indent=2)}")
-        except Exception as ocr_error:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"❌ OCR extraction failed: {str(ocr_error)}")
-            print(f"❌ Error type: {type(ocr_error).__name__}")
-            print(f"❌ Full traceback:\n{error_details}")
-            
-            # Log critical info for debugging
-            print(f"🔍 Debug info:")
-            print(f"   - File path: {file_path}")
-            print(f"   - File exists: {os.path.exists(file_path)}")
-            print(f"   - Service account configured: {'Yes' if SERVICE_ACCOUNT_INFO else 'No'}")
-            print(f"   - OpenAI key configured: {'Yes' if os.getenv('OPENAI_API_KEY') else 'No'}")
-            
-            # Use empty OCR data to continue processing
-            ocr_data = {
-                'utility_name': '',
-                'customer_name': '',
-                'account_number': '',
-                'poid': '',
-                'monthly_usage': '',
-                'annual_usage': '',
-                'service_address': ''
+            return generate_agreement_pdf(form_data, ocr_data, form_data['developer_assigned'], timestamp, agreement_filename, dynamic_drive_service)
+        except Exception as template_error:
+            print(f"Template processing failed: {template_error}")
+    else:
+        print(f"No template mapping found for {form_data['developer_assigned']} + {form_data['utility_provider']}")
+    
+    # Fallback to original method
+    return generate_agreement_pdf(form_data, ocr_data, form_data['developer_assigned'], timestamp)
+
+def _documents_still_needed(checkpoint):
+    """Drop checkpointed documents whose temp file is gone but which still need uploading"""
+    for stage in ('poa', 'agreement', 'agency_agreement'):
+        path = checkpoint.get(stage)
+        if path and f"upload_{stage}" not in checkpoint and not os.path.exists(path):
+            print(f"⚠️  Checkpointed {stage} document missing on disk - regenerating")
+            del checkpoint[stage]
+
+# Transient Drive errors are retried per file instead of failing the whole submission
+DRIVE_UPLOAD_RETRIES = int(os.getenv('DRIVE_UPLOAD_RETRIES', '3'))
+
+# Submission stage graph: stage -> stages it depends on (topological order)
+SUBMISSION_STAGES = {
+    # No dependencies - these start at t=0
+    'ocr': (),
+    # Waits for the first complete set of document fields streamed out of 'ocr' (must be listed after it)
+    'ocr_fields': (),
+    'agent_lookup': (),
+    'drive_folder': (),
+    'agency_agreement': (),
+    # Documents that embed OCR data - they start before the LLM finishes when rules cover their fields
+    'poa': ('ocr_fields',),
+    'agreement': ('ocr_fields',),
+    # Each upload is its own checkpoint so a resumed job never uploads a file twice
+    'upload_utility_bill': ('drive_folder',),
+    # ...and are checked against the final 'ocr' result before they go out
+    'upload_poa': ('drive_folder', 'poa', 'ocr_fields', 'ocr'),
+    'upload_agreement': ('drive_folder', 'agreement', 'ocr_fields', 'ocr'),
+    'upload_agency_agreement': ('drive_folder', 'agency_agreement'),
+    'sheet_log': ('ocr', 'agent_lookup', 'upload_utility_bill', 'upload_poa',
+                  'upload_agreement', 'upload_agency_agreement'),
+    'notifications': ('ocr', 'agent_lookup', 'sheet_log'),
+}
+
+# Progress step shown while each pipeline stage runs: stage -> (step, step_name, description)
+STAGE_PROGRESS = {
+    'ocr': (2, "OCR Analysis", "Reading text from your utility bill"),
+    'ocr_fields': (2, "OCR Analysis", "Reading account details from your utility bill"),
+    'agent_lookup': (3, "AI Processing", "Looking up agent information"),
+    'drive_folder': (5, "Cloud Storage", "Creating secure folder"),
+    'poa': (4, "Generating Documents", "Creating Power of Attorney"),
+    'agreement': (4, "Generating Documents", "Creating Community Solar Agreement"),
+    'agency_agreement': (4, "Generating Documents", "Creating Terms & Conditions"),
+    'upload_utility_bill': (5, "Cloud Storage", "Uploading utility bill"),
+    'upload_poa': (5, "Cloud Storage", "Uploading Power of Attorney"),
+    'upload_agreement': (5, "Cloud Storage", "Uploading Agreement"),
+    'upload_agency_agreement': (5, "Cloud Storage", "Uploading Terms & Conditions"),
+    'sheet_log': (6, "Logging Data", "Writing to Google Sheets"),
+    'notifications': (7, "Notifications", "Queueing email and SMS notifications"),
+}
+
+def process_submission_background(session_id, form_data, file_path, content_hash=None):
+    """Background processing function with progress tracking and dynamic template selection.
+    
+    The pipeline is a stage graph: independent stages (OCR, Drive folder creation,
+    agent lookup, Terms & Conditions) run concurrently, and each stage is
+    checkpointed in the job store so an interrupted submission resumes where it stopped.
+    content_hash is the upload's SHA-256 (recomputed from disk when resuming).
+    """
+    job_id = session_id
+    try:
+        job_store.mark_running(job_id)
+        checkpoint = job_store.get_checkpoint(job_id)
+        if checkpoint:
+            print(f"🔁 Resuming job {job_id} - completed stages: {', '.join(checkpoint)}")
+        
+        # Fix timestamps on the first attempt so retries reuse the same folder and file names
+        def _job_context():
+            est = pytz.timezone('US/Eastern')
+            return {
+                'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+                'submission_date': datetime.now(est).isoformat()
             }
-        update_progress(session_id, 2, "OCR Analysis", "Text extraction complete", 35)
-        
-        # Step 3: AI Processing (35-50%)
-        update_progress(session_id, 3, "AI Processing", "Analyzing document structure", 40)
-        time.sleep(0.3)
-        update_progress(session_id, 3, "AI Processing", "Extracting account information", 45)
-        time.sleep(0.4)
-        update_progress(session_id, 3, "AI Processing", "Validating extracted data", 50)
-        
-        # Get submission date in EST timezone
-        est = pytz.timezone('US/Eastern')
-        submission_date = datetime.now(est)
+        context = _run_stage(job_id, checkpoint, 'context', _job_context)
+        timestamp = context['timestamp']
+        submission_date = datetime.fromisoformat(context['submission_date'])
         folder_name = f"{submission_date.strftime('%Y-%m-%d')}_{form_data['account_name']}_{form_data['utility_provider']}"
         
-        # Step 4: Generate Documents (50-70%)
-        update_progress(session_id, 4, "Generating Documents", "Preparing document templates", 55)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        update_progress(session_id, 4, "Generating Documents", "Creating Power of Attorney", 60)
-        poa_pdf_path = generate_poa_pdf(form_data, ocr_data, timestamp)
+        # Regenerate documents if temp files from an earlier attempt are gone
+        _documents_still_needed(checkpoint)
+        
+        # Stages replayed from the checkpoint (or served from cache) finish instantly and must not skew the timing model
+        resumed_stages = set(checkpoint)
+        untimed_stages = set()
+        processing_started = time.time()
+        progress_store.update(session_id, {'processing_started': processing_started})
+        update_progress(session_id, 1, "Uploading Document", "File saved successfully",
+                        remaining_seconds=stage_timings.remaining_seconds(SUBMISSION_STAGES, completed=resumed_stages))
+        
+        # Set by the OCR stage with the first complete document field set (or its final result)
+        ocr_fields_ready = Future()
+        
+        def _on_ocr_event(event, data):
+            if event == 'page':
+                update_progress(session_id, STAGE_PROGRESS['ocr'][0], STAGE_PROGRESS['ocr'][1],
+                                f"Read page {data['page']} of your utility bill")
+            elif event == 'fields' and not ocr_fields_ready.done():
+                print(f"⚡ Job {job_id}: document fields ready before parsing finished - starting documents")
+                ocr_fields_ready.set_result(data)
+        
+        def _ocr(_):
+            try:
+                ocr_data = _ocr_extract()
+            except Exception as e:
+                if not ocr_fields_ready.done():
+                    ocr_fields_ready.set_exception(e)
+                raise
+            if not ocr_fields_ready.done():
+                ocr_fields_ready.set_result(ocr_data)
+            return ocr_data
+        
+        def _ocr_fields(_):
+            # A resumed job replays 'ocr' from its checkpoint without running it
+            if 'ocr' in resumed_stages:
+                untimed_stages.add('ocr_fields')
+                return checkpoint['ocr']
+            return ocr_fields_ready.result()
+        
+        def _ocr_extract():
+            # A resubmitted bill (same bytes) reuses the earlier extraction
+            try:
+                bill_hash = content_hash or hash_file(file_path)
+                cached = ocr_cache.get(bill_hash)
+            except Exception as e:
+                print(f"⚠️  OCR cache unavailable: {e}")
+                bill_hash, cached = None, None
+            
+            if cached is not None:
+                print(f"♻️  Job {job_id}: OCR cache hit for {bill_hash[:12]} - skipping OCR and parsing")
+                untimed_stages.update(('ocr', 'ocr_fields'))
+                progress_store.update(session_id, {'ocr_cache_hit': True})
+                step, step_name, _ = STAGE_PROGRESS['ocr']
+                update_progress(session_id, step, step_name, "Recognized this bill from an earlier submission")
+                return cached
+            
+            ocr_data = _extract_bill_data(file_path, _on_ocr_event)
+            # Don't cache the empty fallback or placeholder data - a later attempt may succeed
+            if (bill_hash and not ocr_data.get('mock_data')
+                    and any(ocr_data.get(field) for field in EMPTY_OCR_DATA)):
+                try:
+                    ocr_cache.put(bill_hash, ocr_data)
+                except Exception as e:
+                    print(f"⚠️  Could not cache OCR result: {e}")
+            return ocr_data
         
-        update_progress(session_id, 4, "Generating Documents", "Creating Community Solar Agreement", 65)
+        def _agency_agreement(_):
+            from services.pdf_template_processor import PDFTemplateProcessor
+            pdf_processor = PDFTemplateProcessor("GreenWatt-documents")
+            return pdf_processor.process_agency_agreement(form_data, timestamp)
         
-        # Get agreement template from dynamic sheets with validation
-        dynamic_sheets_id = os.getenv('DYNAMIC_GOOGLE_SHEETS_ID')
-        dynamic_drive_id = os.getenv('DYNAMIC_GOOGLE_DRIVE_FOLDER_ID')
+        document_builders = {
+            'poa': lambda ocr_data: generate_poa_pdf(form_data, ocr_data, timestamp),
+            'agreement': lambda ocr_data: _generate_agreement(form_data, ocr_data, timestamp),
+        }
         
-        if dynamic_sheets_id and dynamic_drive_id:
-            # Reuse existing drive service with different parent folder
-            dynamic_drive_service = GoogleDriveService(parent_folder_id=dynamic_drive_id)
-            
-            agreement_filename = dynamic_sheets_service.get_developer_agreement(
-                form_data['developer_assigned'], 
-                form_data['utility_provider'], 
-                form_data['account_type']
-            )
+        def _upload(document_stage, file_name):
+            def _run(inputs):
+                path = file_path if document_stage is None else inputs[document_stage]
+                # Terms & Conditions are optional - skip the upload if generation failed
+                if document_stage == 'agency_agreement' and not (path and os.path.exists(path)):
+                    return None
+                rebuilt_path = None
+                if document_stage in document_builders:
+                    # Documents started from the early OCR fields must agree with the row written to the sheet
+                    changed = [field for field in DOCUMENT_OCR_FIELDS
+                               if inputs['ocr'].get(field, '') != inputs['ocr_fields'].get(field, '')]
+                    if changed:
+                        print(f"🔁 Job {job_id}: final OCR changed {', '.join(changed)} - regenerating {document_stage}")
+                        path = rebuilt_path = document_builders[document_stage](inputs['ocr'])
+                try:
+                    return drive_service.upload_file(path, file_name, inputs['drive_folder'],
+                                                     retries=DRIVE_UPLOAD_RETRIES)
+                finally:
+                    if rebuilt_path and os.path.exists(rebuilt_path):
+                        os.remove(rebuilt_path)
+            return _run
+        
+        def _log_to_sheet(inputs):
+            ocr_data = inputs['ocr']
+            agent_name = inputs['agent_lookup']['name']
+            links = {
+                key: drive_service.get_file_link(inputs[f"upload_{key}"]) if inputs[f"upload_{key}"] else ''
+                for key in ('utility_bill', 'poa', 'agreement', 'agency_agreement')
+            }
+            utility_name_final = ocr_data.get('utility_name', form_data['utility_provider'])
+            unique_id = generate_unique_id()
+            poa_id_generated = f"POA-{timestamp}-{unique_id.split('-')[-1]}"
+            
+            sheet_data = [
+                unique_id,                       # Unique submission ID (A)
+                submission_date.strftime('%m/%d/%Y %I:%M %p EST'),  # Submission Date (B) - MM/DD/YYYY 12hr EST
+                form_data['business_entity'],    # Business Entity Name (C)
+                form_data['account_name'],       # Account Name (D)
+                form_data['contact_name'],       # Contact Name (E)
+                form_data['title'],              # Title (F)
+                form_data['phone'],              # Phone (G)
+                form_data['email'],              # Email (H)
+                ocr_data.get('service_address', form_data.get('service_addresses', '')),  # Service Address (OCR) (I) - Now using OCR
+                form_data['developer_assigned'], # Developer Assigned (J)
+                form_data['account_type'],       # Account Type (K)
+                form_data['utility_provider'],  # Utility Provider (Form) (L)
+                utility_name_final,             # Utility Name (OCR) (M)
+                ocr_data.get('account_number', ''),  # Account Number (OCR) (N)
+                ocr_data.get('poid', form_data.get('poid', '')),        # POID (OCR) (O) - Now using OCR
+                # Column P removed (was POID Form)
+                ocr_data.get('monthly_usage', ''),   # Monthly Usage (OCR) (P) - shifted left
+                ocr_data.get('annual_usage', ''),    # Annual Usage (OCR) (Q) - shifted left
+                form_data['agent_id'],           # Agent ID (R) - shifted left
+                agent_name,                      # Agent Name (S) - shifted left
+                # Column T removed (was Service Address OCR duplicate)
+                poa_id_generated,                # POA ID (T) - shifted left
+                links['utility_bill'],          # Utility Bill Link (U) - shifted left
+                links['poa'],                    # POA Link (V) - shifted left
+                links['agreement'],              # Agreement Link (W) - shifted left
+                links['agency_agreement'],          # Terms & Conditions Link (X)
+                '',                             # CDG SMS Sent (Y) - starts empty, updated when SMS is sent
+                ''                              # CDG Enrollment Status (Z) - starts empty, updated when SMS response received
+            ]
+            
+            row_number = None
+            try:
+                result = sheets_service.append_row(sheet_data)
+                # Extract row number from result
+                if result and 'updates' in result and 'updatedRange' in result['updates']:
+                    import re
+                    updated_range = result['updates']['updatedRange']
+                    row_match = re.search(r'!A(\d+):Z\d+', updated_range)
+                    if row_match:
+                        row_number = int(row_match.group(1))
+                        print(f"Data written to row {row_number}")
+            except Exception as e:
+                print(f"Sheet insertion failed: {e}")
             
-            # Check if we need Mass Market override
-            if form_data['account_type'] == 'Mass Market [Residential]':
-                mass_market_filename = dynamic_sheets_service.get_developer_agreement(
-                    form_data['developer_assigned'], 
-                    'Mass Market', 
-                    form_data['account_type']
-                )
-                if mass_market_filename:
-                    agreement_filename = mass_market_filename
+            return {'unique_id': unique_id, 'row_number': row_number, 'links': links}
+        
+        def _queue_notifications(inputs):
+            ocr_data = inputs['ocr']
+            agent_info = inputs['agent_lookup']
+            agent_name = agent_info['name']
+            row_number = inputs['sheet_log']['row_number']
             
-            if agreement_filename:
-                try:
-                    agreement_pdf_path = generate_agreement_pdf(form_data, ocr_data, form_data['developer_assigned'], timestamp, agreement_filename, dynamic_drive_service)
-                except Exception as template_error:
-                    print(f"Template processing failed: {template_error}")
-                    # Fallback to original method
-                    agreement_pdf_path = generate_agreement_pdf(form_data, ocr_data, form_data['developer_assigned'], timestamp)
+            # Delivery happens on the outbox dispatcher - the submission completes once these are recorded
+            notification_outbox.enqueue('email', {
+                'agent_name': agent_name,
+                'customer_name': form_data['account_name'],
+                'utility': form_data['utility_provider'],
+                'signed_date': submission_date.strftime('%Y-%m-%d'),
+                'annual_usage': ocr_data.get('annual_usage', 'N/A'),
+                'agent_email': agent_info['email'],
+                'sales_manager_email': agent_info['sales_manager_email']
+            }, dedupe_key=f"{job_id}:email")
+            
+            # Send SMS verification to customer only if consent was given
+            if form_data['sms_consent']:
+                notification_outbox.enqueue('customer_sms', {
+                    'job_id': job_id,
+                    'phone': form_data['phone'],
+                    'contact_name': form_data['contact_name'],
+                    'row_number': row_number
+                }, dedupe_key=f"{job_id}:customer_sms")
             else:
-                print(f"No template mapping found for {form_data['developer_assigned']} + {form_data['utility_provider']}")
-                # Fallback to original method
-                agreement_pdf_path = generate_agreement_pdf(form_data, ocr_data, form_data['developer_assigned'], timestamp)
-        else:
-            # Fallback to original method if dynamic config not available
-            agreement_pdf_path = generate_agreement_pdf(form_data, ocr_data, form_data['developer_assigned'], timestamp)
-        
-        # Generate Terms & Conditions (Agency Agreement) with signature
-        update_progress(session_id, 4, "Generating Documents", "Creating Terms & Conditions", 68)
-        from services.pdf_template_processor import PDFTemplateProcessor
-        pdf_processor = PDFTemplateProcessor("GreenWatt-documents")
-        agency_agreement_pdf_path = pdf_processor.process_agency_agreement(form_data, timestamp)
-        update_progress(session_id, 4, "Generating Documents", "All documents created", 70)
-        
-        # Step 5: Cloud Storage (70-85%)
-        update_progress(session_id, 5, "Cloud Storage", "Connecting to Google Drive", 72)
-        time.sleep(0.2)
-        update_progress(session_id, 5, "Cloud Storage", "Creating secure folder", 75)
-        drive_folder_id = drive_service.create_folder(folder_name)
-        
-        update_progress(session_id, 5, "Cloud Storage", "Uploading utility bill", 78)
-        utility_bill_id = drive_service.upload_file(file_path, f"utility_bill_{timestamp}.pdf", drive_folder_id)
-        
-        update_progress(session_id, 5, "Cloud Storage", "Uploading Power of Attorney", 80)
-        poa_id = drive_service.upload_file(poa_pdf_path, f"poa_{timestamp}.pdf", drive_folder_id)
-        
-        update_progress(session_id, 5, "Cloud Storage", "Uploading Agreement", 82)
-        agreement_id = drive_service.upload_file(agreement_pdf_path, f"agreement_{timestamp}.pdf", drive_folder_id)
-        
-        # Upload Terms & Conditions (Agency Agreement) if generated successfully
-        agency_agreement_id = None
-        if agency_agreement_pdf_path and os.path.exists(agency_agreement_pdf_path):
-            update_progress(session_id, 5, "Cloud Storage", "Uploading Terms & Conditions", 84)
-            agency_agreement_id = drive_service.upload_file(agency_agreement_pdf_path, f"agency_agreement_{timestamp}.pdf", drive_folder_id)
-        
-        # Generate public links
-        update_progress(session_id, 5, "Cloud Storage", "Generating secure links", 85)
-        utility_bill_link = drive_service.get_file_link(utility_bill_id)
-        poa_link = drive_service.get_file_link(poa_id)
-        agreement_link = drive_service.get_file_link(agreement_id)
-        agency_agreement_link = drive_service.get_file_link(agency_agreement_id) if agency_agreement_id else ''
-        
-        # Step 6: Logging Data (85-95%)
-        update_progress(session_id, 6, "Logging Data", "Preparing submission data", 87)
-        
-        # Get agent info (name, email, sales manager email) and other data
-        agent_info = sheets_service.get_agent_info(form_data['agent_id'])
-        agent_name = agent_info['name']
-        utility_name_final = ocr_data.get('utility_name', form_data['utility_provider'])
-        unique_id = generate_unique_id()
-        poa_id_generated = f"POA-{timestamp}-{unique_id.split('-')[-1]}"
-        
-        sheet_data = [
-            unique_id,                       # Unique submission ID (A)
-            submission_date.strftime('%m/%d/%Y %I:%M %p EST'),  # Submission Date (B) - MM/DD/YYYY 12hr EST
-            form_data['business_entity'],    # Business Entity Name (C)
-            form_data['account_name'],       # Account Name (D)
-            form_data['contact_name'],       # Contact Name (E)
-            form_data['title'],              # Title (F)
-            form_data['phone'],              # Phone (G)
-            form_data['email'],              # Email (H)
-            ocr_data.get('service_address', form_data.get('service_addresses', '')),  # Service Address (OCR) (I) - Now using OCR
-            form_data['developer_assigned'], # Developer Assigned (J)
-            form_data['account_type'],       # Account Type (K)
-            form_data['utility_provider'],  # Utility Provider (Form) (L)
-            utility_name_final,             # Utility Name (OCR) (M)
-            ocr_data.get('account_number', ''),  # Account Number (OCR) (N)
-            ocr_data.get('poid', form_data.get('poid', '')),        # POID (OCR) (O) - Now using OCR
-            # Column P removed (was POID Form)
-            ocr_data.get('monthly_usage', ''),   # Monthly Usage (OCR) (P) - shifted left
-            ocr_data.get('annual_usage', ''),    # Annual Usage (OCR) (Q) - shifted left
-            form_data['agent_id'],           # Agent ID (R) - shifted left
-            agent_name,                      # Agent Name (S) - shifted left
-            # Column T removed (was Service Address OCR duplicate)
-            poa_id_generated,                # POA ID (T) - shifted left
-            utility_bill_link,              # Utility Bill Link (U) - shifted left
-            poa_link,                        # POA Link (V) - shifted left
-            agreement_link,                  # Agreement Link (W) - shifted left
-            agency_agreement_link,              # Terms & Conditions Link (X)
-            '',                             # CDG SMS Sent (Y) - starts empty, updated when SMS is sent
-            ''                              # CDG Enrollment Status (Z) - starts empty, updated when SMS response received
-        ]
-        
-        update_progress(session_id, 6, "Logging Data", "Writing to Google Sheets", 90)
-        row_number = None
-        try:
-            result = sheets_service.append_row(sheet_data)
-            # Extract row number from result
-            if result and 'updates' in result and 'updatedRange' in result['updates']:
-                import re
-                updated_range = result['updates']['updatedRange']
-                row_match = re.search(r'!A(\d+):Z\d+', updated_range)
-                if row_match:
-                    row_number = int(row_match.group(1))
-                    print(f"Data written to row {row_number}")
-        except Exception as e:
-            print(f"Sheet insertion failed: {e}")
-        
-        update_progress(session_id, 6, "Logging Data", "Data saved successfully", 95)
-        
-        # Step 7: Notifications (95-100%)
-        update_progress(session_id, 7, "Notifications", "Preparing email notification", 96)
-        
-        # Send email notification to internal team
-        update_progress(session_id, 7, "Notifications", "Sending email notification", 97)
-        from services.email_service import send_notification_email
-        send_notification_email(
-            agent_name=agent_name,
-            customer_name=form_data['account_name'],
-            utility=form_data['utility_provider'],
-            signed_date=submission_date.strftime('%Y-%m-%d'),
-            annual_usage=ocr_data.get('annual_usage', 'N/A'),
-            agent_email=agent_info['email'],
-            sales_manager_email=agent_info['sales_manager_email']
-        )
-        
-        # Send SMS verification to customer only if consent was given
-        if form_data['sms_consent']:
-            update_progress(session_id, 7, "Notifications", "Sending SMS verification", 98)
-            try:
-                sms_response = sms_service.send_customer_verification_sms(
-                    customer_phone=form_data['phone'],
-                    customer_name=form_data['contact_name']
-                )
-                print(f"SMS sent: {sms_response}")
-                
-                # Log SMS sent status to Google Sheets
-                if sms_response and sms_response.get('success') and row_number:
-                    sheets_service.log_sms_sent(row_index=row_number)
-            except Exception as sms_error:
-                print(f"SMS failed: {sms_error}")
-        else:
-            print("SMS consent not given - skipping customer verification SMS")
+                print("SMS consent not given - skipping customer verification SMS")
             
-        # Send SMS notification to internal team
-        update_progress(session_id, 7, "Notifications", "Notifying team", 99)
-        try:
+            # One intent per internal number so a failed recipient is retried on its own
             internal_sms_data = {
                 'customer_name': form_data['account_name'],
                 'agent_name': agent_name,
@@ -1803,30 +2012,85 @@ def process_submission_background(session_id, form_data, file_path):
                 'annual_usage': ocr_data.get('annual_usage', 'N/A'),
                 'submission_date': submission_date.strftime('%Y-%m-%d %H:%M:%S')
             }
-            
-            internal_sms_results = sms_service.send_internal_notification_sms(internal_sms_data)
-            print(f"📱 Internal SMS notifications: {len([r for r in internal_sms_results if r.get('success') if r]) if internal_sms_results else 0} sent successfully")
-            
-        except Exception as e:
-            print(f"⚠️  Error sending internal SMS notifications: {e}")
+            for phone in sms_service.internal_numbers:
+                if phone.strip():
+                    notification_outbox.enqueue('internal_sms', {
+                        'phone': phone.strip(),
+                        'submission': internal_sms_data
+                    }, dedupe_key=f"{job_id}:internal_sms:{phone.strip()}")
+            return {'queued': True}
+        
+        def _checkpointed(stage, func):
+            return lambda inputs: _run_stage(job_id, checkpoint, stage, lambda: func(inputs))
+        
+        stage_funcs = {
+            'ocr': _ocr,
+            'ocr_fields': _ocr_fields,
+            'agent_lookup': lambda _: sheets_service.get_agent_info(form_data['agent_id']),
+            'drive_folder': lambda _: drive_service.create_folder(folder_name),
+            'agency_agreement': _agency_agreement,
+            'poa': lambda inputs: document_builders['poa'](inputs['ocr_fields']),
+            'agreement': lambda inputs: document_builders['agreement'](inputs['ocr_fields']),
+            'upload_utility_bill': _upload(None, f"utility_bill_{timestamp}.pdf"),
+            'upload_poa': _upload('poa', f"poa_{timestamp}.pdf"),
+            'upload_agreement': _upload('agreement', f"agreement_{timestamp}.pdf"),
+            'upload_agency_agreement': _upload('agency_agreement', f"agency_agreement_{timestamp}.pdf"),
+            'sheet_log': _log_to_sheet,
+            'notifications': _queue_notifications,
+        }
+        graph = StageGraph(name=f"submission-{job_id[:8]}")
+        for stage, depends_on in SUBMISSION_STAGES.items():
+            graph.add_stage(stage, _checkpointed(stage, stage_funcs[stage]), depends_on)
+        
+        # Callbacks run on the graph's coordinating thread, so no locking is needed here
+        completed_stages = set(resumed_stages)
+        running_stages = {}   # stage -> started_at
+        
+        def _report_progress():
+            # Several stages run at once - report the one furthest behind
+            if not running_stages:
+                return
+            stage = min(running_stages, key=lambda name: STAGE_PROGRESS[name][0])
+            step, step_name, description = STAGE_PROGRESS[stage]
+            remaining = stage_timings.remaining_seconds(SUBMISSION_STAGES, completed_stages, running_stages)
+            elapsed = time.time() - processing_started
+            percentage = min(int(100 * elapsed / (elapsed + remaining)), 99) if elapsed + remaining > 0 else 0
+            update_progress(session_id, step, step_name, description, percentage, remaining)
+        
+        def _on_stage_start(stage):
+            running_stages[stage] = time.time()
+            _report_progress()
+        
+        def _on_stage_complete(stage, result, seconds):
+            del running_stages[stage]
+            completed_stages.add(stage)
+            if stage not in resumed_stages and stage not in untimed_stages:
+                print(f"✅ Job {job_id}: stage '{stage}' finished in {seconds:.2f}s")
+                try:
+                    stage_timings.record(stage, seconds)
+                except Exception as e:
+                    print(f"⚠️  Could not record stage timing: {e}")
+            _report_progress()
+        
+        results = graph.run(
+            max_workers=int(os.getenv('SUBMISSION_STAGE_CONCURRENCY', '4')),
+            on_stage_start=_on_stage_start,
+            on_stage_complete=_on_stage_complete
+        )
         
         # Store result data in session for retrieval
-        progress_sessions[session_id]['result'] = {
-            'drive_folder': f"https://drive.google.com/drive/folders/{drive_folder_id}",
-            'documents': {
-                'utility_bill': utility_bill_link,
-                'poa': poa_link,
-                'agreement': agreement_link,
-                'agency_agreement': agency_agreement_link
-            }
-        }
+        links = results['sheet_log']['links']
+        progress_store.update(session_id, {'result': {
+            'drive_folder': f"https://drive.google.com/drive/folders/{results['drive_folder']}",
+            'documents': links
+        }})
         
         # Clean up temporary files
-        os.remove(file_path)
-        os.remove(poa_pdf_path)
-        os.remove(agreement_pdf_path)
-        if agency_agreement_pdf_path and os.path.exists(agency_agreement_pdf_path):
-            os.remove(agency_agreement_pdf_path)
+        for path in (file_path, results['poa'], results['agreement'], results['agency_agreement']):
+            if path and os.path.exists(path):
+                os.remove(path)
+        
+        job_store.mark_completed(job_id)
         
         # Complete successfully
         complete_progress(session_id, success=True)
@@ -1839,11 +2103,106 @@ def process_submission_background(session_id, form_data, file_path):
         print(f"Background processing error: {e}")
         import traceback
         traceback.print_exc()
+        try:
+            job_store.mark_failed(job_id, str(e))
+        except Exception as store_error:
+            print(f"⚠️  Could not record job failure: {store_error}")
         complete_progress(session_id, success=False, error=str(e))
         
         # Force garbage collection even on error to free memory
         gc.collect()
 
+# Notification outbox handlers - raising schedules a retry with backoff
+def _deliver_email_notification(payload):
+    if not os.getenv('SENDGRID_API_KEY'):
+        print("Warning: SENDGRID_API_KEY not configured - skipping email notification")
+        return
+    if not send_notification_email(**payload):
+        raise RuntimeError("SendGrid email send failed")
+
+def _deliver_customer_sms(payload):
+    sms_response = sms_service.send_customer_verification_sms(
+        customer_phone=payload['phone'],
+        customer_name=payload['contact_name']
+    )
+    print(f"SMS sent: {sms_response}")
+    if not sms_response:
+        return  # Twilio not configured
+    if not sms_response.get('success'):
+        raise RuntimeError(sms_response.get('error', 'SMS send failed'))
+    
+    # Log SMS sent status to Google Sheets as its own intent, so a Sheets error never resends the SMS
+    if payload.get('row_number'):
+        notification_outbox.enqueue('sms_sent_log', {'row_number': payload['row_number']},
+                                    dedupe_key=f"{payload['job_id']}:sms_sent_log")
+
+def _deliver_sms_sent_log(payload):
+    if not sheets_service.log_sms_sent(row_index=payload['row_number']):
+        raise RuntimeError(f"Could not mark SMS sent on row {payload['row_number']}")
+
+def _deliver_internal_sms(payload):
+    results = sms_service.send_internal_notification_sms(payload['submission'], numbers=[payload['phone']])
+    if not results:
+        return  # Twilio not configured
+    failed = [r for r in results if not r.get('success')]
+    if failed:
+        raise RuntimeError(failed[0].get('error', 'Internal SMS send failed'))
+    print(f"📱 Internal SMS notification sent to {payload['phone']}")
+
+notification_outbox.register_handler('email', _deliver_email_notification)
+notification_outbox.register_handler('customer_sms', _deliver_customer_sms)
+notification_outbox.register_handler('sms_sent_log', _deliver_sms_sent_log)
+notification_outbox.register_handler('internal_sms', _deliver_internal_sms)
+
+def recover_interrupted_jobs():
+    """Resume submissions orphaned by a recycled or crashed worker"""
+    try:
+        orphaned_jobs = job_store.claim_orphaned_jobs()
+    except Exception as e:
+        print(f"⚠️  Could not check for interrupted jobs: {e}")
+        return
+    
+    for index, job in enumerate(orphaned_jobs):
+        session_id = job['session_id']
+        print(f"🔁 Recovering interrupted submission {job['job_id']} (attempt {job['attempts'] + 1})")
+        if progress_store.version(session_id) is None:
+            create_progress_session(session_id)
+        update_progress(session_id, 0, "Resuming", "Resuming your submission after a server restart", 0)
+        try:
+            submission_queue.submit(job['job_id'], process_submission_background,
+                                    session_id, job['form_data'], job['file_path'])
+        except QueueFullError:
+            # Leave the rest for a later pass once the backlog drains
+            for deferred_job in orphaned_jobs[index:]:
+                job_store.release_job(deferred_job['job_id'])
+            print("⚠️  Submission queue full - deferring recovery of remaining jobs")
+            break
+
+_job_recovery_state = {'pid': None, 'last_run': 0}
+
+@app.before_request
+def resume_interrupted_jobs():
+    """Claim orphaned jobs once per worker process, then at most once a minute"""
+    # Normally already done by the gunicorn post_fork hook; covers `python app.py` and other servers
+    init_worker()
+    now = time.time()
+    if _job_recovery_state['pid'] == os.getpid() and now - _job_recovery_state['last_run'] < 60:
+        return
+    _job_recovery_state['pid'] = os.getpid()
+    _job_recovery_state['last_run'] = now
+    recover_interrupted_jobs()
+
+
+def _queue_full_response():
+    """429 response returned when the submission backlog is full"""
+    response = jsonify({
+        'success': False,
+        'status': 'queue_full',
+        'error': 'We are processing a high volume of submissions. Please try again in a minute.',
+        'queue': submission_queue.stats()
+    })
+    response.headers['Retry-After'] = '60'
+    return response, 429
 
 @app.route('/submit', methods=['POST'])
 def submit_form():
@@ -1882,32 +2241,53 @@ def submit_form():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type'}), 400
         
+        # Reject early when the backlog is full so we don't store an upload we can't process
+        if not submission_queue.has_capacity():
+            return _queue_full_response()
+        
         # Save file for background processing
         filename = secure_filename(file.filename)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"{timestamp}_{filename}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        content_hash = save_upload_with_hash(file, filepath)
         
         # Create progress session
         session_id = create_progress_session()
         
-        # Start background processing thread
-        import threading
-        thread = threading.Thread(
-            target=process_submission_background,
-            args=(session_id, form_data, filepath)
-        )
-        thread.daemon = True
-        thread.start()
-        
-        # Log memory status after starting background thread
-        service_manager.log_memory_status("after starting submission thread")
+        # Record the job durably, then hand it to the bounded worker pool
+        job_store.create_job(session_id, session_id, form_data, filepath)
+        try:
+            queue_position = submission_queue.submit(
+                session_id, process_submission_background, session_id, form_data, filepath,
+                content_hash=content_hash
+            )
+        except QueueFullError:
+            job_store.delete_job(session_id)
+            progress_store.delete(session_id)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return _queue_full_response()
+        
+        if queue_position:
+            def _mark_queued(session):
+                # A worker may already have picked the job up
+                if session['current_step'] == 0:
+                    session['step_name'] = "Queued"
+                    session['step_description'] = f"Waiting for a free processing slot ({queue_position} ahead of you)"
+                    # Lets workers that don't own the queue report a position too
+                    session['queue_position'] = queue_position
+            progress_store.update(session_id, mutate=_mark_queued)
+        
+        # Log memory status after queueing the job
+        service_manager.log_memory_status("after queueing submission")
         
         # Return session ID for progress tracking
         return jsonify({
             'success': True,
             'session_id': session_id,
+            'status': 'queued' if queue_position else 'processing',
+            'queue_position': queue_position,
             'message': 'Processing started - track progress with session ID'
         })
         
@@ -3323,12 +3703,20 @@ def automatic_cleanup():
             time.sleep(60)  # Run every minute
             cleanup_old_sessions()
             
+            # Drop finished job records (they hold customer form data)
+            try:
+                job_store.purge_finished()
+                notification_outbox.purge_finished()
+                ocr_cache.evict()
+            except Exception as e:
+                print(f"Error purging finished jobs: {e}")
+            
             # Log memory status every 5 minutes
             if int(time.time()) % 300 < 60:
                 try:
                     process = psutil.Process(os.getpid())
                     memory_mb = process.memory_info().rss / 1024 / 1024
-                    print(f"📊 Memory usage: {memory_mb:.1f}MB | Sessions: {len(progress_sessions)}")
+                    print(f"📊 Memory usage: {memory_mb:.1f}MB | Sessions: {progress_store.count()}")
                 except:
                     pass
         except Exception as e:
@@ -3350,7 +3738,12 @@ def memory_status():
             'percent': process.memory_percent(),
             'available_mb': psutil.virtual_memory().available / 1024 / 1024,
             'total_mb': psutil.virtual_memory().total / 1024 / 1024,
-            'progress_sessions': len(progress_sessions),
+            'progress_sessions': progress_store.count(),
+            'submission_queue': submission_queue.stats(),
+            'submission_jobs': job_store.count_by_status(),
+            'notification_outbox': notification_outbox.count_by_status(),
+            'ocr_cache': ocr_cache.stats(),
+            'llm_client': get_llm_client().stats(),
             'gc_stats': gc.get_stats()
         }
         
@@ -3372,11 +3765,35 @@ def memory_status():
         return jsonify({'error': str(e)}), 500
 
 
-# Start background cleanup thread
-cleanup_thread = threading.Thread(target=automatic_cleanup, daemon=True)
-cleanup_thread.start()
-print("✅ Started automatic memory cleanup thread")
+_worker_state = {'pid': None}
+_worker_state_lock = threading.Lock()
+
+def init_worker():
+    """
+    Per-process startup, run in each gunicorn worker after fork (see gunicorn.conf.py).
+    Threads don't survive fork, so background threads are started here rather than
+    at import time, where --preload would start them in the master.
+    """
+    with _worker_state_lock:
+        if _worker_state['pid'] == os.getpid():
+            return
+        _worker_state['pid'] = os.getpid()
+    
+    # Start background cleanup thread
+    cleanup_thread = threading.Thread(target=automatic_cleanup, name="automatic-cleanup", daemon=True)
+    cleanup_thread.start()
+    print(f"✅ Started automatic memory cleanup thread (pid {os.getpid()})")
+    
+    # Deliver notifications left pending by a previous worker
+    notification_outbox.start()
+    
+    # Start the submission pool here rather than on the first /submit
+    submission_queue.start()
+    
+    # Off the request path, so a slow Sheets API doesn't delay the worker
+    threading.Thread(target=_setup_google_sheets_in_background, name="sheets-setup", daemon=True).start()
 
 if __name__ == '__main__':
+    init_worker()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
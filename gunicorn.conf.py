@@ -0,0 +1,34 @@
+# Gunicorn configuration (picked up automatically from the working directory)
+#
+# The app is preloaded once in the master: templates, fonts, PDF processors and
+# the config snapshot are shared copy-on-write by every worker. Anything holding
+# a socket or a thread (Google/Vision/Twilio clients, background threads) is
+# created per worker after fork - see init_worker() in app.py.
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+# gthread lets progress event streams wait without blocking other requests
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = 120
+max_requests = 50
+max_requests_jitter = 10
+preload_app = True
+
+
+def when_ready(server):
+    """Master finished loading the app - freeze it before any worker is forked"""
+    # Objects moved to the permanent generation are never scanned by the
+    # workers' collector, so their pages stay shared instead of being copied
+    gc.collect()
+    gc.freeze()
+    server.log.info("Froze %d preloaded objects before forking workers", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    """Start this worker's background threads; network clients are created lazily on first use"""
+    from app import init_worker
+    init_worker()
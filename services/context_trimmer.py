@@ -0,0 +1,73 @@
+"""
+Trim OCR text down to the parts of the bill the LLM actually needs.
+
+A 10-page statement is mostly rate tables, messages and legal boilerplate.
+Instead of the whole text, the prompt gets the bill header (customer name,
+mailing address, utility branding) plus a window of text around every
+anchor relevant to the requested fields, with overlapping windows merged.
+"""
+
+import os
+import re
+
+LLM_CONTEXT_TRIM = os.getenv('LLM_CONTEXT_TRIM', 'true').lower() == 'true'
+LLM_CONTEXT_HEADER_CHARS = int(os.getenv('LLM_CONTEXT_HEADER_CHARS', '600'))
+LLM_CONTEXT_WINDOW_CHARS = int(os.getenv('LLM_CONTEXT_WINDOW_CHARS', '300'))
+
+UTILITY_ANCHOR = r'RG&E|Rochester Gas|NYSEG|National\s*Grid|Con\s*Ed|PSEG|Orange\s*(?:&|and)\s*Rockland|Central\s*Hudson|PG&E'
+
+# field -> text that marks where it appears on a bill
+FIELD_ANCHORS = {
+    'utility_name': re.compile(UTILITY_ANCHOR, re.IGNORECASE),
+    'customer_name': re.compile(r'Customer|Account Holder|Account Name|Bill to|Name on Account', re.IGNORECASE),
+    'account_number': re.compile(r'\bAccount\b|\bAcct\b', re.IGNORECASE),
+    'poid': re.compile(r'Po[Dd]\s*ID|Point of Delivery|\bPOID\b|Point ID', re.IGNORECASE),
+    'monthly_usage_kwh': re.compile(r'Billed Usage|kWh|Energy Usage|Consumption', re.IGNORECASE),
+    'usage_breakdown': re.compile(r'Billed Usage', re.IGNORECASE),
+    'service_address': re.compile(r'Service Address|Service Location|Property Address', re.IGNORECASE),
+}
+
+# Below this the trimmed text isn't worth losing context over - send everything
+MIN_REDUCTION = 0.2
+
+
+def _merge(spans):
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def trim_to_anchors(text, fields=None, window=None, header=None, extra_anchors=None):
+    """
+    Header plus windows around the anchors for `fields` (all fields by default)
+    and around matches of extra_anchors (a utility profile's anchor pattern).
+    Returns (trimmed_text, info); the text is returned unchanged when trimming is
+    disabled, no anchor is found, or the saving is too small to matter.
+    """
+    window = LLM_CONTEXT_WINDOW_CHARS if window is None else window
+    header = LLM_CONTEXT_HEADER_CHARS if header is None else header
+    info = {'original_chars': len(text), 'trimmed_chars': len(text), 'windows': 0, 'trimmed': False}
+    if not LLM_CONTEXT_TRIM or len(text) <= header:
+        return text, info
+
+    spans = [(0, header)]
+    patterns = [FIELD_ANCHORS[field] for field in (fields or FIELD_ANCHORS) if field in FIELD_ANCHORS]
+    if extra_anchors is not None:
+        patterns.append(extra_anchors)
+    for pattern in patterns:
+        for match in pattern.finditer(text):
+            spans.append((max(0, match.start() - window), min(len(text), match.end() + window)))
+    if len(spans) == 1:
+        return text, info
+
+    merged = _merge(spans)
+    trimmed = ' ... '.join(text[start:end] for start, end in merged)
+    if len(trimmed) > len(text) * (1 - MIN_REDUCTION):
+        return text, info
+
+    info.update({'trimmed_chars': len(trimmed), 'windows': len(merged), 'trimmed': True})
+    return trimmed, info
@@ -0,0 +1,103 @@
+"""
+Confidence scoring for rule-extracted bill fields.
+
+An extractor's base confidence says how specific the rule that matched
+was. These checks adjust it with evidence about the value itself:
+
+- shape: does the value look like that field at all (digit counts, not a
+  meter number, not the utility's own name)
+- proximity: how close the value sits to its label in the text
+- agreement: checksum-like cross-checks - the account number or POID
+  repeated elsewhere on the bill (remittance stub), usage readings that add
+  up to a printed total, or word-box and flat-text usage that agree
+"""
+
+import re
+
+from .context_trimmer import FIELD_ANCHORS
+
+# Values further than this from their label start losing confidence
+PROXIMITY_FULL_CHARS = 25
+PROXIMITY_FLOOR = 0.85
+AGREEMENT_BONUS = 0.05
+MAX_CONFIDENCE = 0.99
+
+# Fields whose value should sit right after a label in the text
+PROXIMITY_FIELDS = ('customer_name', 'account_number', 'poid', 'service_address')
+
+METER_NUMBER_RE = re.compile(r'^035\d{7}$')
+ZIP_RE = re.compile(r'\b[A-Z]{2}\s+\d{5}(?:-\d{4})?$')
+
+
+def _value_pattern(value):
+    """Regex finding a value in the text even when OCR split it with spaces or dashes"""
+    return re.compile(r'[ \-]?'.join(re.escape(char) for char in str(value)))
+
+
+def _shape(field, value, profile):
+    if field == 'account_number':
+        clean = re.sub(r'[ \-]', '', value)
+        return 1.0 if 8 <= len(clean) <= 18 and sum(c.isdigit() for c in clean) >= 6 else 0.0
+    if field == 'poid':
+        return 0.0 if METER_NUMBER_RE.match(value) else 1.0
+    if field == 'customer_name':
+        # A utility's own name is printed all over the bill - never the customer
+        if profile.name and profile.name.lower() in value.lower():
+            return 0.0
+        return 1.0 if len(value.split()) <= 4 else 0.7
+    if field == 'service_address':
+        return 1.0 if ZIP_RE.search(value) else 0.5
+    if field == 'monthly_usage_kwh':
+        return 1.0 if 0 < value < 1000000 else 0.0
+    return 1.0
+
+
+def _proximity(field, value, text):
+    """1.0 when some occurrence of the value follows its label closely, decaying to PROXIMITY_FLOOR"""
+    label_ends = [match.end() for match in FIELD_ANCHORS[field].finditer(text)]
+    distances = [
+        occurrence.start() - max(end for end in label_ends if end <= occurrence.start())
+        for occurrence in _value_pattern(value).finditer(text)
+        if label_ends and label_ends[0] <= occurrence.start()
+    ]
+    if not distances:
+        return PROXIMITY_FLOOR
+    distance = min(distances)
+    if distance <= PROXIMITY_FULL_CHARS:
+        return 1.0
+    return max(PROXIMITY_FLOOR, 1.0 - (distance - PROXIMITY_FULL_CHARS) / 500.0)
+
+
+def _agrees(field, value, text, breakdown=None, text_column=None):
+    if field in ('account_number', 'poid'):
+        return len(_value_pattern(value).findall(text)) >= 2
+    if field == 'monthly_usage_kwh':
+        if breakdown and text_column and list(breakdown) == list(text_column):
+            return True
+        # A printed total equal to the summed readings
+        if breakdown and len(breakdown) > 1:
+            total = re.compile(r'(?<![\d,])(?:{:,}|{})\s*kWh'.format(value, value), re.IGNORECASE)
+            return bool(total.search(text))
+    return False
+
+
+def score_fields(rule_results, text, profile, text_column=None):
+    """
+    Re-score rule results ({field: (value, confidence)}) against the text.
+    text_column is the flat-text Billed Usage reading when the usage came from word boxes.
+    """
+    scored = {}
+    breakdown = rule_results['usage_breakdown'][0]
+    for field, (value, confidence) in rule_results.items():
+        if confidence <= 0 or field in ('utility_name', 'usage_breakdown') or value in ('', None):
+            scored[field] = (value, confidence)
+            continue
+        confidence *= _shape(field, value, profile)
+        if confidence and field in PROXIMITY_FIELDS:
+            confidence *= _proximity(field, value, text)
+        if confidence and _agrees(field, value, text, breakdown, text_column):
+            confidence += AGREEMENT_BONUS
+        scored[field] = (value, round(min(confidence, MAX_CONFIDENCE), 3))
+    # The breakdown is only as good as the total it adds up to
+    scored['usage_breakdown'] = (breakdown, scored['monthly_usage_kwh'][1])
+    return scored
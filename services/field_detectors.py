@@ -0,0 +1,95 @@
+"""
+Cheap regex detectors for the bill fields we need before the LLM runs.
+
+Used to stop OCR early: once every required field has been spotted with
+enough confidence, the remaining pages of a long statement are skipped.
+Detectors only decide whether a field is *present* - the LLM still does
+the actual extraction from the text collected so far.
+"""
+
+import os
+import re
+
+from .utility_profiles import classify_utility, profile_for
+
+# Confidence every required field must reach before the page scan stops
+EARLY_EXIT_CONFIDENCE = float(os.getenv('OCR_EARLY_EXIT_CONFIDENCE', '0.7'))
+
+ACCOUNT_RE = re.compile(
+    r'\b(account|acct)\.?(\s*(?:no\.?|number|#))?[^A-Za-z0-9]{0,20}((?:[0-9][0-9 \-]{6,24})?[0-9])',
+    re.IGNORECASE
+)
+POID_PATTERNS = [
+    (re.compile(r'Po[Dd]\s*ID:?\s*(R\d{14})'), 0.95),
+    (re.compile(r'(?:Po[Dd]\s*ID|Point of Delivery ID):?\s*([A-Z]?\d{8,20})', re.IGNORECASE), 0.8),
+    (re.compile(r'\b(?:POID|Point ID):?\s*([A-Z0-9]{6,20})', re.IGNORECASE), 0.7),
+]
+KWH_RE = re.compile(r'(\d[\d,]*(?:\.\d+)?)\s*kWh\b(?!\s*/\s*day)', re.IGNORECASE)
+USAGE_KEYWORD_RE = re.compile(r'Billed Usage|kWh Used|Energy Usage|Consumption|Usage|kWh This Period', re.IGNORECASE)
+
+
+def detect_utility(text):
+    profile = classify_utility(text)
+    return profile.name if profile else ''
+
+
+def detect_account_number(text):
+    """(value, confidence) for the first plausible account number after an account label"""
+    for match in ACCOUNT_RE.finditer(text):
+        candidate = re.sub(r'[ \-]', '', match.group(3))
+        if 8 <= len(candidate) <= 18 and sum(c.isdigit() for c in candidate) >= 6:
+            # "Account Number: ..." is a stronger signal than a bare "account ..."
+            return candidate, (0.9 if match.group(2) else 0.7)
+    return '', 0.0
+
+
+def detect_poid(text):
+    for pattern, confidence in POID_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1), confidence
+    return '', 0.0
+
+
+def detect_usage(text):
+    """(kWh values found near a usage label, confidence)"""
+    values = []
+    for match in KWH_RE.finditer(text):
+        window = text[max(0, match.start() - 120):match.start()]
+        if USAGE_KEYWORD_RE.search(window):
+            values.append(match.group(1).replace(',', ''))
+    if not values:
+        return [], 0.0
+    return values, 0.8
+
+
+def detect_fields(text):
+    """Run every detector: {field: (value, confidence)}"""
+    utility = detect_utility(text)
+    return {
+        'utility_name': (utility, 0.9 if utility else 0.0),
+        'account_number': detect_account_number(text),
+        'poid': detect_poid(text),
+        'usage': detect_usage(text),
+    }
+
+
+def required_fields(utility_name):
+    # The utility decides whether a POID is expected, so it must be known too
+    fields = ['utility_name', 'account_number', 'usage']
+    profile = profile_for(utility_name)
+    if profile and profile.poid_required:
+        fields.append('poid')
+    return fields
+
+
+def missing_fields(detected, min_confidence=None):
+    """Required fields not yet spotted with enough confidence"""
+    min_confidence = EARLY_EXIT_CONFIDENCE if min_confidence is None else min_confidence
+    return [field for field in required_fields(detected['utility_name'][0])
+            if detected[field][1] < min_confidence]
+
+
+def fields_complete(detected, min_confidence=None):
+    """Whether every field the LLM needs has been spotted with enough confidence"""
+    return not missing_fields(detected, min_confidence)
@@ -1,7 +1,25 @@
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+import io
 import os
+import random
+import socket
+import time
+import uuid
 from .google_service_manager import GoogleServiceManager
 
+# HTTP statuses worth retrying - rate limits and transient server errors
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Tags each upload so a retry can find a file created by an attempt whose response was lost
+UPLOAD_KEY_PROPERTY = 'greenwatt_upload_key'
+
+
+def _is_retryable(error):
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES
+    return isinstance(error, (socket.timeout, ConnectionError, TimeoutError))
+
 class GoogleDriveService:
     def __init__(self, service_account_info=None, parent_folder_id=None):
         # Use the singleton service manager
@@ -43,33 +61,70 @@ class GoogleDriveService:
             print(f"Error creating folder: {e}")
             raise
             
-    def upload_file(self, file_path, file_name, folder_id=None):
-        file_metadata = {'name': file_name}
+    def upload_file(self, file_path, file_name, folder_id=None, retries=0):
+        """
+        Upload a file path or bytes; transient Drive errors are retried up to `retries` times.
+        files().create isn't idempotent, so each retry first checks whether the failed
+        attempt created the file anyway (a 5xx or timeout can arrive after the write).
+        """
+        file_metadata = {'name': file_name, 'appProperties': {UPLOAD_KEY_PROPERTY: uuid.uuid4().hex}}
         
         if folder_id:
             file_metadata['parents'] = [folder_id]
-            
-        mime_type = 'application/pdf' if file_path.endswith('.pdf') else 'image/jpeg'
         
-        try:
-            media = MediaFileUpload(file_path, mimetype=mime_type)
-            
-            file = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id',
-                supportsAllDrives=True
-            ).execute()
-            
-            file_id = file.get('id')
-            
-            # Note: Permissions are inherited from parent in Shared Drives
-            # No need to set individual permissions
-            
-            return file_id
-        except Exception as e:
-            print(f"Error uploading file: {e}")
-            raise
+        # Bytes have no path, so fall back to the target name to pick the type
+        source_name = file_path if isinstance(file_path, str) else file_name
+        mime_type = 'application/pdf' if source_name.endswith('.pdf') else 'image/jpeg'
+        
+        for attempt in range(retries + 1):
+            try:
+                if attempt:
+                    existing_id = self._find_upload(file_metadata['appProperties'][UPLOAD_KEY_PROPERTY], folder_id)
+                    if existing_id:
+                        print(f"Upload of {file_name} had succeeded before the error - not uploading again")
+                        return existing_id
+                
+                if isinstance(file_path, (bytes, bytearray)):
+                    media = MediaIoBaseUpload(io.BytesIO(file_path), mimetype=mime_type)
+                else:
+                    media = MediaFileUpload(file_path, mimetype=mime_type)
+                
+                file = self.service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id',
+                    supportsAllDrives=True
+                ).execute()
+                
+                file_id = file.get('id')
+                
+                # Note: Permissions are inherited from parent in Shared Drives
+                # No need to set individual permissions
+                
+                return file_id
+            except Exception as e:
+                if attempt < retries and _is_retryable(e):
+                    delay = (2 ** attempt) + random.uniform(0, 0.5)
+                    print(f"Upload of {file_name} failed ({e}) - retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                print(f"Error uploading file: {e}")
+                raise
+    
+    def _find_upload(self, upload_key, folder_id=None):
+        """ID of the file tagged with upload_key by an earlier attempt, or None"""
+        query = f"appProperties has {{ key='{UPLOAD_KEY_PROPERTY}' and value='{upload_key}' }} and trashed = false"
+        if folder_id:
+            query += f" and '{folder_id}' in parents"
+        response = self.service.files().list(
+            q=query,
+            pageSize=1,
+            fields="files(id)",
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True
+        ).execute()
+        files = response.get('files', [])
+        return files[0]['id'] if files else None
             
     def get_file_link(self, file_id):
         return f"https://drive.google.com/file/d/{file_id}/view"
@@ -1,6 +1,23 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest, build_http
+import google_auth_httplib2
 import threading
+import os
+
+
+class ThreadLocalHttpRequest(HttpRequest):
+    """
+    HttpRequest that executes on a per-thread authorized connection.
+    httplib2 connections are not thread-safe, and the shared service objects
+    are used concurrently by submission workers.
+    """
+
+    def execute(self, http=None, num_retries=0):
+        if http is None:
+            http = GoogleServiceManager().get_thread_http()
+        return super().execute(http=http, num_retries=num_retries)
+
 
 class GoogleServiceManager:
     """
@@ -13,6 +30,7 @@ class GoogleServiceManager:
     _sheets_service = None
     _drive_service = None
     _credentials = None
+    _thread_local = threading.local()
     
     def __new__(cls):
         if cls._instance is None:
@@ -33,6 +51,16 @@ class GoogleServiceManager:
             )
             print("✅ GoogleServiceManager initialized with credentials")
     
+    def get_thread_http(self):
+        """Get the authorized HTTP connection owned by the calling thread"""
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            if not self._credentials:
+                raise ValueError("GoogleServiceManager not initialized. Call initialize() first.")
+            http = google_auth_httplib2.AuthorizedHttp(self._credentials, http=build_http())
+            self._thread_local.http = http
+        return http
+    
     def get_sheets_service(self):
         """Get or create the Google Sheets service instance"""
         if not self._sheets_service:
@@ -40,7 +68,8 @@ class GoogleServiceManager:
                 raise ValueError("GoogleServiceManager not initialized. Call initialize() first.")
             
             print("🔄 Creating Google Sheets service instance...")
-            self._sheets_service = build('sheets', 'v4', credentials=self._credentials)
+            self._sheets_service = build('sheets', 'v4', credentials=self._credentials,
+                                         requestBuilder=ThreadLocalHttpRequest)
             print("✅ Google Sheets service created")
         
         return self._sheets_service
@@ -52,7 +81,8 @@ class GoogleServiceManager:
                 raise ValueError("GoogleServiceManager not initialized. Call initialize() first.")
             
             print("🔄 Creating Google Drive service instance...")
-            self._drive_service = build('drive', 'v3', credentials=self._credentials)
+            self._drive_service = build('drive', 'v3', credentials=self._credentials,
+                                        requestBuilder=ThreadLocalHttpRequest)
             print("✅ Google Drive service created")
         
         return self._drive_service
@@ -74,4 +104,18 @@ class GoogleServiceManager:
         """Log current memory usage"""
         memory = self.get_memory_usage()
         print(f"📊 Memory Usage {operation}: {memory['rss_mb']:.1f}MB ({memory['percent']:.1f}%)")
-        return memory
\ No newline at end of file
+        return memory
+
+
+def _reset_after_fork():
+    """
+    Drop connections inherited from the parent process (gunicorn --preload).
+    The discovery service objects and credentials hold no sockets and are kept;
+    every request goes through a per-thread AuthorizedHttp, which each worker
+    now opens for itself.
+    """
+    GoogleServiceManager._thread_local = threading.local()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,6 +1,36 @@
+import threading
 from cachetools import TTLCache
 from .google_service_manager import GoogleServiceManager
 
+
+class LockedTTLCache(TTLCache):
+    """TTLCache guarded by a lock - pipeline stages read and fill it concurrently"""
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        with self._lock:
+            return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return super().__contains__(key)
+
+    def popitem(self):
+        with self._lock:
+            return super().popitem()
+
+
 class GoogleSheetsService:
     def __init__(self, service_account_info=None, spreadsheet_id=None, agent_spreadsheet_id=None, dynamic_spreadsheet_id=None):
         # Use the singleton service manager
@@ -19,7 +49,7 @@ class GoogleSheetsService:
         self.dynamic_spreadsheet_id = dynamic_spreadsheet_id  # Dynamic form data sheet
         
         # INCREASED cache size for better performance (was 16, now 100)
-        self.cache = TTLCache(maxsize=100, ttl=600)
+        self.cache = LockedTTLCache(maxsize=100, ttl=600)
         
         # Column indexes for formatting (0-based) - Updated after removing form columns
         self.MONTHLY_USAGE_COL = 15   # Column P - kWh format (shifted left by 2)
@@ -383,6 +413,36 @@ class GoogleSheetsService:
             # Fallback to hardcoded list
             return ["National Grid", "NYSEG", "RG&E"]
     
+    def get_utility_profiles(self):
+        """Get utility extraction profile rows from the Utility_Profiles sheet (empty if the tab doesn't exist)"""
+        cache_key = "utility_profiles"
+        if cache_key in self.cache:
+            return self.cache[cache_key]
+            
+        try:
+            # Lives next to the Utilities tab in the dynamic spreadsheet
+            sheet_id = self.dynamic_spreadsheet_id or self.spreadsheet_id
+            rows = self.service.spreadsheets().values().get(
+                spreadsheetId=sheet_id,
+                range="Utility_Profiles!A:H"
+            ).execute().get("values", [])
+            
+            # Rows as dictionaries keyed by the header row
+            profiles = []
+            if rows:
+                header = [column.strip().lower() for column in rows[0]]
+                profiles = [dict(zip(header, row)) for row in rows[1:] if row]
+            
+            # Cache the result
+            self.cache[cache_key] = profiles
+            return profiles
+            
+        except Exception as e:
+            print(f"Error getting utility profiles: {e}")
+            # Built-in profiles only - cache the miss so a missing tab isn't re-fetched every bill
+            self.cache[cache_key] = []
+            return []
+    
     def get_active_developers(self):
         """Get list of active developers from Developer_Mapping sheet"""
         cache_key = "active_developers"
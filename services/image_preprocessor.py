@@ -0,0 +1,136 @@
+"""
+Image preprocessing before Vision OCR.
+
+Phone photos of bills are often 4-8MB and rendered PDF pages are lossless
+PNGs. Vision only needs legible text, so images are normalized first:
+EXIF rotation, grayscale, deskew, downscale so typical text is about
+OCR_TARGET_TEXT_HEIGHT pixels tall, then JPEG encoding.
+"""
+
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+OCR_PREPROCESS = os.getenv('OCR_PREPROCESS', 'true').lower() == 'true'
+# Vision reads text reliably well below this height; larger text only costs bytes
+OCR_TARGET_TEXT_HEIGHT = int(os.getenv('OCR_TARGET_TEXT_HEIGHT', '24'))
+OCR_MAX_IMAGE_DIMENSION = int(os.getenv('OCR_MAX_IMAGE_DIMENSION', '3000'))
+# Never shrink below this long edge, however large the text looks
+OCR_MIN_IMAGE_DIMENSION = int(os.getenv('OCR_MIN_IMAGE_DIMENSION', '1024'))
+OCR_JPEG_QUALITY = int(os.getenv('OCR_JPEG_QUALITY', '85'))
+OCR_DESKEW_MAX_DEGREES = float(os.getenv('OCR_DESKEW_MAX_DEGREES', '10'))
+
+# Text height is measured on a copy no larger than this - a full-size label map of a
+# 12MP photo is ~48MB of int32 per pool thread
+TEXT_HEIGHT_SAMPLE_DIMENSION = 1600
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def _load_grayscale(content):
+    """
+    Decode image bytes, apply the EXIF orientation and convert to 8-bit grayscale.
+    Returns (gray, rotated) where rotated says whether the EXIF orientation changed the pixels.
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        rotated = image.getexif().get(EXIF_ORIENTATION_TAG, 1) != 1
+        image = ImageOps.exif_transpose(image)
+        return np.asarray(image.convert('L')), rotated
+
+
+def _text_mask(gray):
+    """Binary mask of dark foreground (text) pixels"""
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return mask
+
+
+def estimate_skew(gray):
+    """Skew of the text lines in degrees (positive = lines slope down to the right), or 0.0 when unsure"""
+    # Work on a small copy - the angle doesn't need full resolution
+    scale = min(1.0, 1000.0 / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    # Smear characters horizontally into text lines, then fit straight segments through them
+    mask = cv2.dilate(_text_mask(small), cv2.getStructuringElement(cv2.MORPH_RECT, (15, 1)))
+    lines = cv2.HoughLinesP(mask, 1, np.pi / 720, threshold=100,
+                            minLineLength=small.shape[1] // 4, maxLineGap=20)
+    if lines is None:
+        return 0.0
+    angles = [np.degrees(np.arctan2(y2 - y1, x2 - x1)) for x1, y1, x2, y2 in lines[:, 0]]
+    angles = [angle for angle in angles if abs(angle) <= OCR_DESKEW_MAX_DEGREES]
+    if len(angles) < 5:
+        return 0.0
+    angle = float(np.median(angles))
+    return angle if abs(angle) >= 0.5 else 0.0
+
+
+def deskew(gray, angle):
+    """Rotate so text lines are horizontal (OpenCV's positive angle turns the image counter-clockwise)"""
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR, borderValue=255)
+
+
+def estimate_text_height(gray):
+    """Median height in pixels (of the full-size image) of character-sized connected components, or None"""
+    # Measure on a smaller copy and scale the result back up, as estimate_skew does
+    scale = min(1.0, float(TEXT_HEIGHT_SAMPLE_DIMENSION) / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    count, _, stats, _ = cv2.connectedComponentsWithStats(_text_mask(small), connectivity=8)
+    small_heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    heights = small_heights / scale
+    widths = stats[1:, cv2.CC_STAT_WIDTH] / scale
+    # Ignore specks, rules and table borders (bounds in full-size pixels), and blobs too small to measure
+    heights = heights[(heights >= 6) & (heights <= 200) & (widths >= 2) & (widths <= heights * 3)
+                      & (small_heights >= 3)]
+    if len(heights) < 20:
+        return None
+    return float(np.median(heights))
+
+
+def preprocess_for_vision(content):
+    """
+    Normalize image bytes for OCR. Returns (bytes, info); the original bytes are
+    returned unchanged when preprocessing is disabled, fails, or doesn't help.
+    """
+    info = {'original_bytes': len(content), 'preprocessed': False}
+    if not OCR_PREPROCESS:
+        return content, info
+
+    try:
+        gray, exif_rotated = _load_grayscale(content)
+        info['original_size'] = [int(gray.shape[1]), int(gray.shape[0])]
+
+        angle = estimate_skew(gray)
+        if angle:
+            gray = deskew(gray, angle)
+        info['deskew_degrees'] = round(angle, 2)
+
+        # Only ever shrink: by text height, by the dimension cap, but not below the floor
+        long_edge = max(gray.shape)
+        scale = min(1.0, OCR_MAX_IMAGE_DIMENSION / long_edge)
+        text_height = estimate_text_height(gray)
+        if text_height:
+            scale = min(scale, OCR_TARGET_TEXT_HEIGHT / text_height)
+        scale = max(scale, min(1.0, OCR_MIN_IMAGE_DIMENSION / long_edge))
+        if scale < 0.95:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        info['scale'] = round(scale, 3)
+
+        ok, encoded = cv2.imencode('.jpg', gray, [cv2.IMWRITE_JPEG_QUALITY, OCR_JPEG_QUALITY])
+        if not ok:
+            return content, info
+        processed = encoded.tobytes()
+    except Exception as e:
+        print(f"⚠️  Image preprocessing failed, sending original bytes: {e}")
+        return content, info
+
+    # A small, already-compressed upload can come out larger - keep it unless we rotated it
+    # (by deskewing, or by applying an EXIF orientation the original bytes only carry as a tag)
+    if len(processed) >= len(content) and not angle and not exif_rotated:
+        return content, info
+
+    info.update({'preprocessed': True, 'processed_bytes': len(processed),
+                 'processed_size': [int(gray.shape[1]), int(gray.shape[0])]})
+    return processed, info
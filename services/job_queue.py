@@ -0,0 +1,162 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueueFullError(Exception):
+    """Raised when the submission backlog has no free slots"""
+
+
+class SubmissionJobQueue:
+    """
+    Fixed-size worker pool with a bounded backlog for form submissions.
+
+    Each submission runs OCR, PDF generation and Drive uploads, so running
+    them all at once in a 512MB worker leads to OOM kills. This pool caps the
+    number of pipelines running concurrently and rejects new work once the
+    backlog is full, turning memory spikes into predictable throughput.
+    """
+
+    # Guards the per-process start - concurrent first requests in a fresh worker race for it
+    _start_lock = threading.Lock()
+
+    def __init__(self, worker_count=2, max_queued=8, history_size=50):
+        self.worker_count = max(1, int(worker_count))
+        self.max_queued = max(0, int(max_queued))
+        self.history_size = history_size
+        self._pid = None
+        self._reset_state()
+
+    def _reset_state(self):
+        """Create fresh synchronization primitives (also used after fork)"""
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = []             # job ids waiting for a worker, FIFO
+        self._jobs = OrderedDict()     # job_id -> per-job state dict
+        self._running = 0
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads in this process; called from each gunicorn worker after fork"""
+        self._ensure_workers()
+
+    def _ensure_workers(self):
+        """Start worker threads in the current process (threads don't survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+
+            self._reset_state()
+            for index in range(self.worker_count):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"submission-worker-{index + 1}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            # Published last so no caller sees the pid before the queue its workers read exists
+            self._pid = os.getpid()
+        print(f"✅ Started submission worker pool: {self.worker_count} workers, backlog of {self.max_queued}")
+
+    def has_capacity(self):
+        """Return True if a new job would currently be admitted"""
+        with self._lock:
+            return len(self._pending) < self.max_queued + self._idle_workers()
+
+    def submit(self, job_id, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) for execution.
+        Returns the queue position (0 means it starts immediately).
+        Raises QueueFullError when the backlog is full.
+        """
+        self._ensure_workers()
+
+        with self._lock:
+            if len(self._pending) >= self.max_queued + self._idle_workers():
+                raise QueueFullError(f"Submission queue is full ({self.max_queued} waiting)")
+
+            self._jobs[job_id] = {
+                'status': 'queued',
+                'queued_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'error': None
+            }
+            self._pending.append(job_id)
+            position = self._position_locked(job_id)
+
+        self._queue.put((job_id, func, args, kwargs))
+        return position
+
+    def position(self, job_id):
+        """Return the number of jobs that must start before this one, or None if not queued"""
+        with self._lock:
+            if job_id not in self._pending:
+                return None
+            return self._position_locked(job_id)
+
+    def get_job(self, job_id):
+        """Return a copy of the job state, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        """Return pool utilization counters"""
+        with self._lock:
+            return {
+                'workers': self.worker_count,
+                'running': self._running,
+                'queued': len(self._pending),
+                'max_queued': self.max_queued
+            }
+
+    def _idle_workers(self):
+        return max(0, self.worker_count - self._running)
+
+    def _position_locked(self, job_id):
+        # Jobs ahead of us that will be picked up by idle workers don't make us wait
+        return max(0, self._pending.index(job_id) + 1 - self._idle_workers())
+
+    def _worker_loop(self):
+        while True:
+            job_id, func, args, kwargs = self._queue.get()
+
+            with self._lock:
+                if job_id in self._pending:
+                    self._pending.remove(job_id)
+                self._running += 1
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    job['status'] = 'running'
+                    job['started_at'] = time.time()
+
+            error = None
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                error = str(e)
+                print(f"❌ Submission job {job_id} raised: {e}")
+                import traceback
+                traceback.print_exc()
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    job = self._jobs.get(job_id)
+                    if job is not None:
+                        job['status'] = 'failed' if error else 'done'
+                        job['finished_at'] = time.time()
+                        job['error'] = error
+                    self._trim_history_locked()
+                self._queue.task_done()
+
+    def _trim_history_locked(self):
+        """Drop the oldest finished job states beyond history_size"""
+        finished = [jid for jid, job in self._jobs.items() if job['status'] in ('done', 'failed')]
+        for jid in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[jid]
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import sqlite3
+import contextlib
+
+# Local state lives next to the app so it survives gunicorn worker recycling
+DATA_DIR = os.getenv('GREENWATT_DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data'))
+
+
+def connect_local_db(db_path, timeout=30):
+    """Open a SQLite connection tuned for several threads/processes on one box"""
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+    return conn
+
+
+@contextlib.contextmanager
+def local_db_connection(db_path):
+    """connect_local_db() for one block of work; the connection is always closed"""
+    conn = connect_local_db(db_path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _process_alive(pid):
+    """Check whether a process with this PID is still running on this box"""
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SubmissionJobStore:
+    """
+    Durable record of submissions and the pipeline stages they completed.
+
+    Each job is owned by the process that is running it. When gunicorn
+    recycles a worker (--max-requests) its in-flight jobs are orphaned; the
+    next worker claims them and resumes from the last completed stage
+    instead of re-running OCR and Drive uploads.
+    """
+
+    def __init__(self, db_path=None, max_attempts=3):
+        self.db_path = db_path or os.path.join(DATA_DIR, 'submission_jobs.db')
+        self.max_attempts = max_attempts
+        self._init_schema()
+
+    def _init_schema(self):
+        with local_db_connection(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id      TEXT PRIMARY KEY,
+                    session_id  TEXT NOT NULL,
+                    form_data   TEXT NOT NULL,
+                    file_path   TEXT NOT NULL,
+                    status      TEXT NOT NULL,
+                    owner_pid   INTEGER,
+                    attempts    INTEGER NOT NULL DEFAULT 0,
+                    error       TEXT,
+                    created_at  REAL NOT NULL,
+                    updated_at  REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+                CREATE TABLE IF NOT EXISTS job_stages (
+                    job_id       TEXT NOT NULL,
+                    stage        TEXT NOT NULL,
+                    result       TEXT,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, stage)
+                );
+            """)
+
+    def create_job(self, job_id, session_id, form_data, file_path):
+        """Record a newly accepted submission owned by this process"""
+        now = time.time()
+        with local_db_connection(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, session_id, form_data, file_path, status, owner_pid, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, session_id, json.dumps(form_data), file_path, os.getpid(), now, now)
+            )
+
+    def mark_running(self, job_id):
+        """Mark a job as started by this process and count the attempt"""
+        with local_db_connection(self.db_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', owner_pid = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE job_id = ?",
+                (os.getpid(), time.time(), job_id)
+            )
+
+    def mark_completed(self, job_id):
+        self._finish(job_id, 'completed', None)
+
+    def mark_failed(self, job_id, error):
+        self._finish(job_id, 'failed', error)
+
+    def _finish(self, job_id, status, error):
+        with local_db_connection(self.db_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def delete_job(self, job_id):
+        with local_db_connection(self.db_path) as conn:
+            conn.execute("DELETE FROM job_stages WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def save_checkpoint(self, job_id, stage, result):
+        """Persist the JSON-serializable output of a completed stage"""
+        now = time.time()
+        with local_db_connection(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_stages (job_id, stage, result, completed_at) VALUES (?, ?, ?, ?)",
+                (job_id, stage, json.dumps(result), now)
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+
+    def get_checkpoint(self, job_id):
+        """Return {stage: result} for every stage this job already completed"""
+        with local_db_connection(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT stage, result FROM job_stages WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return {row['stage']: json.loads(row['result']) for row in rows}
+
+    def claim_orphaned_jobs(self):
+        """
+        Take ownership of unfinished jobs whose owning process has died.
+        Jobs that already used up max_attempts are marked failed instead.
+        Returns a list of job dicts for this process to resume.
+        """
+        claimed = []
+        with local_db_connection(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+                ).fetchall()
+                now = time.time()
+                for row in rows:
+                    if _process_alive(row['owner_pid']):
+                        continue
+                    if row['attempts'] >= self.max_attempts:
+                        conn.execute(
+                            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE job_id = ?",
+                            (f"Gave up after {row['attempts']} interrupted attempts", now, row['job_id'])
+                        )
+                        print(f"❌ Job {row['job_id']} abandoned after {row['attempts']} attempts")
+                        continue
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', owner_pid = ?, updated_at = ? WHERE job_id = ?",
+                        (os.getpid(), now, row['job_id'])
+                    )
+                    claimed.append({
+                        'job_id': row['job_id'],
+                        'session_id': row['session_id'],
+                        'form_data': json.loads(row['form_data']),
+                        'file_path': row['file_path'],
+                        'attempts': row['attempts']
+                    })
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def release_job(self, job_id):
+        """Give up ownership so another process (or a later pass) can claim the job"""
+        with local_db_connection(self.db_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET owner_pid = NULL, updated_at = ? WHERE job_id = ?",
+                (time.time(), job_id)
+            )
+
+    def purge_finished(self, max_age_seconds=86400):
+        """Delete finished jobs (and their form data) older than max_age_seconds"""
+        cutoff = time.time() - max_age_seconds
+        with local_db_connection(self.db_path) as conn:
+            conn.execute(
+                "DELETE FROM job_stages WHERE job_id IN "
+                "(SELECT job_id FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ?)",
+                (cutoff,)
+            )
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ?",
+                (cutoff,)
+            ).rowcount
+        return deleted
+
+    def count_by_status(self):
+        with local_db_connection(self.db_path) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
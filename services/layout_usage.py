@@ -0,0 +1,115 @@
+"""
+Geometric "Billed Usage" extraction from OCR word boxes.
+
+RG&E and NYSEG bills list one kWh reading per meter/period in a
+"Billed Usage" table column; the monthly total is their sum. Flattened OCR
+text interleaves that column with the rest of the table, so instead of
+reading text we find the header's box and sum the kWh values whose boxes
+sit directly underneath it.
+
+Words are (x0, y0, x1, y1, text) tuples in page pixel/point coordinates -
+the same order PyMuPDF's page.get_text("words") uses.
+"""
+
+import re
+
+import numpy as np
+
+NUMBER_RE = re.compile(r'^(\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?$')
+NUMBER_WITH_UNIT_RE = re.compile(r'^(\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?kWh$', re.IGNORECASE)
+# A row labelled like this ends the column (totals would double count the readings)
+COLUMN_END_RE = re.compile(r'^(?:Total|Average|Next|Charges|Amount)', re.IGNORECASE)
+
+# Rows further than this many line heights below the previous reading are a different table
+MAX_ROW_GAP_LINES = 4
+
+
+def words_from_annotation(full_text_annotation):
+    """Word boxes from a Vision full_text_annotation"""
+    words = []
+    for page in full_text_annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    xs = [vertex.x for vertex in word.bounding_box.vertices]
+                    ys = [vertex.y for vertex in word.bounding_box.vertices]
+                    text = ''.join(symbol.text for symbol in word.symbols)
+                    words.append((min(xs), min(ys), max(xs), max(ys), text))
+    return words
+
+
+def _to_int(value):
+    return int(round(float(value.replace(',', ''))))
+
+
+def billed_usage_from_words(words):
+    """
+    kWh readings aligned under a "Billed Usage" header, top to bottom.
+    Returns [] when there is no such header or nothing lines up under it.
+    """
+    if not words:
+        return []
+    boxes = np.array([word[:4] for word in words], dtype=float)
+    texts = [str(word[4]) for word in words]
+    lowered = np.array([text.lower().strip(':') for text in texts])
+    center_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    heights = np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+
+    for billed in np.flatnonzero(lowered == 'billed'):
+        line_height = heights[billed]
+        is_usage = lowered == 'usage'
+        # "Usage" on the same line, just to the right of "Billed"...
+        beside = (is_usage
+                  & (np.abs(center_y - center_y[billed]) < line_height * 0.6)
+                  & (boxes[:, 0] >= boxes[billed, 2] - line_height * 0.5)
+                  & (boxes[:, 0] - boxes[billed, 2] < line_height * 2))
+        # ...or wrapped onto the next line of the header cell
+        below = (is_usage
+                 & (boxes[:, 1] >= boxes[billed, 3] - line_height * 0.5)
+                 & (boxes[:, 1] - boxes[billed, 3] < line_height)
+                 & (boxes[:, 0] < boxes[billed, 2]) & (boxes[:, 2] > boxes[billed, 0]))
+        usage = np.flatnonzero(beside | below)
+        if not len(usage):
+            continue
+        header = np.concatenate([np.minimum(boxes[billed, :2], boxes[usage[0], :2]),
+                                 np.maximum(boxes[billed, 2:], boxes[usage[0], 2:])])
+        values = _readings_under(header, line_height, boxes, texts, lowered, center_y, heights)
+        if values:
+            return values
+    return []
+
+
+def _readings_under(header, line_height, boxes, texts, lowered, center_y, heights):
+    # Right-aligned numbers can start left of the header, so allow some slack either side
+    slack = line_height * 2
+    column_x0, column_x1 = header[0] - slack, header[2] + slack
+
+    readings = []  # (y, value)
+    for unit in np.flatnonzero(np.char.startswith(lowered, 'kwh') | np.char.endswith(lowered, 'kwh')):
+        if boxes[unit, 1] <= header[3] - line_height * 0.25 or '/' in lowered[unit]:
+            continue  # above the header, or a kWh/day average
+        inline = NUMBER_WITH_UNIT_RE.match(texts[unit])
+        if inline:
+            value, left = inline.group(1), boxes[unit, 0]
+        else:
+            # Closest number to the left of "kWh" on the same line
+            same_line = np.abs(center_y - center_y[unit]) < heights[unit] * 0.6
+            left_of = (boxes[:, 2] <= boxes[unit, 0] + 1) & (boxes[unit, 0] - boxes[:, 2] < heights[unit] * 2)
+            candidates = [i for i in np.flatnonzero(same_line & left_of) if NUMBER_RE.match(texts[i])]
+            if not candidates:
+                continue
+            number = max(candidates, key=lambda i: boxes[i, 2])
+            value, left = NUMBER_RE.match(texts[number]).group(1), boxes[number, 0]
+        if left <= column_x1 and boxes[unit, 2] >= column_x0:
+            readings.append((center_y[unit], value))
+
+    values, last_y = [], (header[1] + header[3]) / 2
+    for y, value in sorted(readings):
+        if y - last_y > line_height * MAX_ROW_GAP_LINES:
+            break
+        row_labels = lowered[np.abs(center_y - y) < line_height * 0.6]
+        if any(COLUMN_END_RE.match(label) for label in row_labels):
+            break
+        values.append(_to_int(value))
+        last_y = y
+    return values
@@ -0,0 +1,30 @@
+import os
+import hashlib
+
+from .job_store import DATA_DIR
+from .sqlite_cache import SQLiteKVCache
+
+
+def parse_cache_key(cleaned_text, prompt_version, model):
+    """SHA-256 over everything that determines a temperature-0 completion"""
+    digest = hashlib.sha256()
+    digest.update(f"{prompt_version}\0{model}\0".encode('utf-8'))
+    digest.update(cleaned_text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class LLMParseCache(SQLiteKVCache):
+    """
+    Persistent memo of LLM bill-parsing responses.
+
+    Parsing runs at temperature 0, so identical normalized OCR text with the
+    same prompt version yields the same answer. A rescan of the same bill
+    (or a Vision re-OCR that produces the same text) skips the round trip.
+    Entries expire after ttl_seconds; least recently used entries are evicted
+    beyond max_entries.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=30 * 86400, max_entries=2000):
+        # The prompt version is part of every key, so the entry version never changes
+        super().__init__(db_path or os.path.join(DATA_DIR, 'llm_parse_cache.db'), 'llm_parse_cache',
+                         ttl_seconds, max_entries)
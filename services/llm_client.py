@@ -0,0 +1,283 @@
+"""
+Pooled, deadline-bounded client for the OpenAI chat completions API.
+
+Calls go over one requests.Session per process, so connections to the API
+stay open between bills (gunicorn forks its workers, so the session and
+its threads are recreated in each child). Every call has an overall
+deadline. Attempts that hit a rate limit, a 5xx or a connection error are
+retried with jittered exponential backoff, but never past that deadline.
+
+Hedging: once enough latencies have been recorded, a call that is still
+waiting at the LLM_HEDGE_PERCENTILE latency sends one duplicate request,
+and the first answer wins. Requests use temperature 0, so both copies
+return the same JSON and the duplicate only costs tokens.
+
+OPENAI_BASE_URL points the client at any compatible endpoint, such as a
+local mock server when testing. Metrics (latency percentiles, retries,
+hedges, tokens) are kept per worker process; see stats().
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+LLM_DEADLINE_SECONDS = float(os.getenv('LLM_DEADLINE_SECONDS', '45'))
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv('LLM_ATTEMPT_TIMEOUT_SECONDS', '30'))
+LLM_CONNECT_TIMEOUT_SECONDS = 5.0
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_HEDGE = os.getenv('LLM_HEDGE', 'true').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '95'))
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', '8'))
+
+# Hedging waits until the percentile means something
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Full-jitter backoff: sleep uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_CAP_SECONDS = 8.0
+
+# HTTP statuses worth retrying - rate limits, conflicts and transient server errors
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+PLACEHOLDER_API_KEY = "sk-proj-your_openai_api_key_here"
+
+
+class LLMRequestError(Exception):
+    """A chat completion failed; `retryable` says whether another attempt might succeed"""
+
+    def __init__(self, message, status=None, retryable=False, retry_after=None, timed_out=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.timed_out = timed_out
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header, or None"""
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', '')))
+    except ValueError:
+        return None
+
+
+def _percentile(sorted_values, percentile):
+    index = min(len(sorted_values) - 1, int(round(percentile / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LLMClient:
+    def __init__(self, api_key=None, base_url=None, deadline=None, attempt_timeout=None, max_retries=None,
+                 hedge=None, hedge_percentile=None, pool_size=None):
+        self._api_key = api_key
+        self.base_url = (base_url or OPENAI_BASE_URL).rstrip('/')
+        self.deadline = deadline or LLM_DEADLINE_SECONDS
+        self.attempt_timeout = attempt_timeout or LLM_ATTEMPT_TIMEOUT_SECONDS
+        self.max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.hedge = LLM_HEDGE if hedge is None else hedge
+        self.hedge_percentile = hedge_percentile or LLM_HEDGE_PERCENTILE
+        self.pool_size = pool_size or LLM_POOL_SIZE
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._session = None
+        self._executor = None
+        self._metrics_lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counters = dict.fromkeys(('calls', 'successes', 'failures', 'attempts', 'retries', 'timeouts',
+                                        'hedges', 'hedge_wins', 'prompt_tokens', 'completion_tokens'), 0)
+
+    @property
+    def api_key(self):
+        # Read the environment on every call so a key added after startup is picked up
+        api_key = self._api_key or os.getenv('OPENAI_API_KEY')
+        return api_key if api_key and api_key != PLACEHOLDER_API_KEY else None
+
+    @property
+    def configured(self):
+        return self.api_key is not None
+
+    def _ensure_started(self):
+        """Create the session and worker threads in this process (neither survives fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            session = requests.Session()
+            # Retries are handled here, with the deadline in mind - not by urllib3
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+            # Room for a hedge alongside every pooled request
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size * 2, thread_name_prefix="llm-request")
+            self._pid = os.getpid()
+
+    def chat_completion(self, messages, model, temperature=0, max_tokens=500, deadline=None):
+        """
+        Send a chat completion and return the assistant message text.
+        Raises LLMRequestError once retries or the deadline (seconds, default LLM_DEADLINE_SECONDS) run out.
+        """
+        if not self.configured:
+            raise LLMRequestError("OpenAI API key not set")
+        self._ensure_started()
+        payload = {'model': model, 'messages': messages, 'temperature': temperature, 'max_tokens': max_tokens}
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        self._count('calls')
+
+        data, error = None, None
+        for attempt in range(self.max_retries + 1):
+            try:
+                data = self._attempt(payload, deadline_at)
+                break
+            except LLMRequestError as e:
+                error = e
+                if not e.retryable or attempt == self.max_retries:
+                    break
+                delay = e.retry_after
+                if delay is None:
+                    delay = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                # Don't sleep through the deadline - fail now instead
+                if time.monotonic() + delay >= deadline_at:
+                    break
+                print(f"⚠️  {e} - retrying in {delay:.1f}s (attempt {attempt + 2}/{self.max_retries + 1})")
+                self._count('retries')
+                time.sleep(delay)
+
+        if data is None:
+            self._count('failures')
+            raise error
+        usage = data.get('usage') or {}
+        with self._metrics_lock:
+            self._counters['successes'] += 1
+            self._counters['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            self._counters['completion_tokens'] += usage.get('completion_tokens', 0)
+        try:
+            return data['choices'][0]['message']['content'].strip()
+        except (KeyError, IndexError, TypeError, AttributeError):
+            raise LLMRequestError("OpenAI response has no message content")
+
+    def _attempt(self, payload, deadline_at):
+        """One attempt, hedged with a duplicate request if it runs past the latency percentile"""
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise LLMRequestError(f"No response within the {self.deadline:.0f}s deadline")
+        timeout = min(self.attempt_timeout, remaining)
+        attempt_deadline = time.monotonic() + timeout
+        futures = [self._executor.submit(self._post, payload, timeout)]
+
+        hedge_after = self._hedge_delay()
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                # Counted rather than logged - at p95 this fires on one call in twenty
+                self._count('hedges')
+                futures.append(self._executor.submit(self._post, payload, attempt_deadline - time.monotonic()))
+
+        # The requests timeout bounds each socket read; this bounds the whole attempt
+        error, pending = None, set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, attempt_deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                self._count('timeouts')
+                # Stragglers finish on their own socket timeout; their results are dropped
+                raise LLMRequestError(f"OpenAI request timed out after {timeout:.1f}s", retryable=True,
+                                      timed_out=True)
+            for future in done:
+                try:
+                    data = future.result()
+                except LLMRequestError as e:
+                    error = error or e
+                    continue
+                if future is not futures[0]:
+                    self._count('hedge_wins')
+                return data
+        # Counted once per attempt, however many of its requests timed out
+        if error.timed_out:
+            self._count('timeouts')
+        raise error
+
+    def _post(self, payload, timeout):
+        self._count('attempts')
+        timeout = max(timeout, 0.1)
+        started = time.monotonic()
+        try:
+            response = self._session.post(
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                headers={'Authorization': f"Bearer {self.api_key}"},
+                timeout=(min(LLM_CONNECT_TIMEOUT_SECONDS, timeout), timeout)
+            )
+        except requests.Timeout as e:
+            raise LLMRequestError(f"OpenAI request timed out after {timeout:.1f}s", retryable=True,
+                                  timed_out=True) from e
+        except requests.RequestException as e:
+            raise LLMRequestError(f"OpenAI request failed: {e}", retryable=True) from e
+
+        if response.status_code != 200:
+            raise LLMRequestError(
+                f"OpenAI returned HTTP {response.status_code}: {response.text[:200]}",
+                status=response.status_code,
+                retryable=response.status_code in RETRYABLE_STATUSES,
+                retry_after=_retry_after(response)
+            )
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise LLMRequestError("OpenAI returned a response that isn't JSON", retryable=True) from e
+
+        with self._metrics_lock:
+            self._latencies.append(time.monotonic() - started)
+        return data
+
+    def _hedge_delay(self):
+        """Seconds to wait before hedging, or None while hedging is off or there's too little history"""
+        if not self.hedge:
+            return None
+        with self._metrics_lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        return _percentile(latencies, self.hedge_percentile)
+
+    def _count(self, counter, amount=1):
+        with self._metrics_lock:
+            self._counters[counter] += amount
+
+    def stats(self):
+        """Counters and latency percentiles for this worker process"""
+        with self._metrics_lock:
+            stats = dict(self._counters)
+            latencies = sorted(self._latencies)
+        stats['base_url'] = self.base_url
+        stats['latency_ms'] = {
+            'samples': len(latencies),
+            'p50': round(_percentile(latencies, 50) * 1000) if latencies else None,
+            'p95': round(_percentile(latencies, 95) * 1000) if latencies else None,
+            'p99': round(_percentile(latencies, 99) * 1000) if latencies else None,
+        }
+        hedge_after = self._hedge_delay()
+        stats['hedge_after_ms'] = round(hedge_after * 1000) if hedge_after is not None else None
+        return stats
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Shared client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
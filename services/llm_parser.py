@@ -1,20 +1,41 @@
-import openai
 import json
 import os
+import time
+from .llm_cache import LLMParseCache, parse_cache_key
+from .llm_client import get_llm_client
+from .rule_extractor import extract_with_rules, split_confident
+from .context_trimmer import trim_to_anchors
+from .utility_profiles import profile_for
 
-# Set OpenAI API key (check environment variable on every call)
-def _ensure_openai_key():
-    if not openai.api_key:
-        api_key = os.getenv('OPENAI_API_KEY')
-        if api_key and api_key != "sk-proj-your_openai_api_key_here":
-            openai.api_key = api_key
-        else:
-            print("⚠️  OpenAI API key not set - using fallback mode for testing")
-            # Don't raise exception for testing mode
-            pass
+# Bump whenever the extraction prompt or model below changes - cached responses are keyed on it
+PROMPT_VERSION = 3
+LLM_MODEL = "gpt-4o"
+
+_parse_cache = None
+
+def _get_parse_cache():
+    """Shared LLM response cache, created on first use (None if it can't be opened)"""
+    global _parse_cache
+    if _parse_cache is None:
+        try:
+            _parse_cache = LLMParseCache(
+                ttl_seconds=int(os.getenv('LLM_CACHE_TTL_SECONDS', str(30 * 86400))),
+                max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '2000'))
+            )
+        except Exception as e:
+            print(f"⚠️  LLM parse cache unavailable: {e}")
+            return None
+    return _parse_cache
+
+# The API key is read from the environment on every call
+def _openai_configured():
+    if get_llm_client().configured:
+        return True
+    print("⚠️  OpenAI API key not set - using fallback mode for testing")
+    return False
 
 # Initial setup
-_ensure_openai_key()
+_openai_configured()
 
 def normalize_ocr_text(text):
     """
@@ -36,41 +57,26 @@ def normalize_ocr_text(text):
     
     return text
 
-def parse_utility_bill_with_llm(raw_ocr_text):
-    """
-    Use OpenAI to parse utility bill text and extract structured data
-    """
-    try:
-        # Ensure API key is set
-        _ensure_openai_key()
-        
-        # Check if OpenAI is available
-        if not openai.api_key:
-            print("⚠️  OpenAI not available - returning fallback mock data")
-            return {
-                'utility_name': 'National Grid',
-                'customer_name': 'Test Customer',
-                'account_number': '123456789',
-                'poid': 'TEST123456',
-                'monthly_usage': '1500',
-                'annual_usage': '18000',
-                'service_address': '123 Test Street, Buffalo, NY 14201'
-            }
-        # Clean up OCR text first
-        cleaned_text = normalize_ocr_text(raw_ocr_text)
-        prompt = """You are extracting fields from raw OCR text of US utility bills.
+# Prompt pieces - bump PROMPT_VERSION whenever any of them change
+PROMPT_HEADER = """You are extracting fields from raw OCR text of US utility bills.
 Return JSON with *exactly* these keys:
 
-utility_name      – String
-customer_name     – String
-account_number    – String
-poid              – String (may be empty)
-monthly_usage_kwh – Integer (no commas)
-usage_breakdown   – Array of numbers (for debugging, may be empty)
-service_address   – String (may be empty)
-  
-Rules:
-• Utility name: Look for these exact company names or their websites in the text:
+"""
+
+# field -> line describing its JSON key, in response order
+FIELD_KEYS = {
+    'utility_name': 'utility_name      – String',
+    'customer_name': 'customer_name     – String',
+    'account_number': 'account_number    – String',
+    'poid': 'poid              – String (may be empty)',
+    'monthly_usage_kwh': 'monthly_usage_kwh – Integer (no commas)',
+    'usage_breakdown': 'usage_breakdown   – Array of numbers (for debugging, may be empty)',
+    'service_address': 'service_address   – String (may be empty)',
+}
+
+# field -> extraction rules sent to the model
+FIELD_RULES = {
+    'utility_name': """• Utility name: Look for these exact company names or their websites in the text:
   - "PG&E" or "pge.com" → return "PG&E"
   - "NYSEG" or "nyseg" → return "NYSEG"  
   - "RG&E" or "rge" → return "RG&E"
@@ -79,18 +85,15 @@ Rules:
   - "PSEG" → return "PSEG"
   - "Orange & Rockland" or "O&R" → return "Orange & Rockland"
   - "Central Hudson" → return "Central Hudson"
-  If none found, return empty string.
-
-• Customer name: Look for the account holder's name, typically found:
+  If none found, return empty string.""",
+    'customer_name': """• Customer name: Look for the account holder's name, typically found:
   - At the top of the bill in the mailing address section
   - After "Bill to:" or "Account holder:" or "Customer:"
   - In the account information section
   - Usually appears as "First Last" or "Last, First" format
-  - Avoid company names - look for individual person names
-
-• Account number = first 8–18 character sequence containing at least 6 digits appearing within 50 characters AFTER: ["account","acct","account no","account number"] (case-insensitive). Keep hyphens and leading zeros.
-
-• POID = Point of Delivery ID for RG&E/NYSEG bills:
+  - Avoid company names - look for individual person names""",
+    'account_number': """• Account number = first 8–18 character sequence containing at least 6 digits appearing within 50 characters AFTER: ["account","acct","account no","account number"] (case-insensitive). Keep hyphens and leading zeros.""",
+    'poid': """• POID = Point of Delivery ID for RG&E/NYSEG bills:
   - For RG&E bills: Look for "POD ID:" or "PoD ID:" label, then extract the value that IMMEDIATELY follows
     * RG&E POIDs ALWAYS start with "R" followed by 14 digits (e.g., R01000035625383)
     * DO NOT confuse with meter numbers which typically start with "035" and are 10 digits
@@ -98,9 +101,8 @@ Rules:
   - For NYSEG bills: Look for "PoD ID" or "Point of Delivery ID" in top right section  
   - For other utilities: Look for "POID", "Point ID", or similar near account information
   - Extract the complete alphanumeric sequence including any prefix letters
-  - If not found, return empty string (National Grid typically doesn't have POID)
-
-• monthly_usage_kwh = Find the ENERGY CONSUMPTION in kWh (kilowatt-hours) for this billing period:
+  - If not found, return empty string (National Grid typically doesn't have POID)""",
+    'monthly_usage_kwh': """• monthly_usage_kwh = Find the ENERGY CONSUMPTION in kWh (kilowatt-hours) for this billing period:
   
   FOR RG&E AND NYSEG BILLS ONLY:
   - Look for a table column labeled "Billed Usage" or "Usage" 
@@ -120,196 +122,317 @@ Rules:
   GENERAL RULES:
   - This is ENERGY consumed, NOT dollar amounts
   - Return as integer (round if decimal, strip commas)
-  - Ignore kW (kilowatt), therms, or other non-kWh units
-
-• usage_breakdown = For RG&E/NYSEG bills, return array of individual kWh values found in usage column:
+  - Ignore kW (kilowatt), therms, or other non-kWh units""",
+    'usage_breakdown': """• usage_breakdown = For RG&E/NYSEG bills, return array of individual kWh values found in usage column:
   - Example: [1217, 1768, 3213] if those were the kWh values in the column
   - For other utilities, return empty array []
-  - This helps with debugging and verification
-
-• service_address = Service address from utility bill:
+  - This helps with debugging and verification""",
+    'service_address': """• service_address = Service address from utility bill:
   - Look for service address in bill header or account information section
   - Usually appears after "Service Address:", "Service Location:", or "Property Address:"
   - Extract full address including street, city, state, zip
-  - Different from billing/mailing address - this is where electricity is delivered
+  - Different from billing/mailing address - this is where electricity is delivered""",
+}
 
-If a field isn't present, return an empty string (or 0 for numbers).
+PROMPT_FOOTER = """If a field isn't present, return an empty string (or 0 for numbers).
 Respond with JSON ONLY, no commentary.
 
 Text to parse:
 """
-        
-        print("="*30)
-        print("SENDING TO LLM:")
-        print("Text sample:", cleaned_text[:800], "...")
-        print("="*30)
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a utility bill data extraction expert. Parse the text and return only valid JSON. Look carefully at company names and websites to identify the correct utility."},
-                {"role": "user", "content": prompt + cleaned_text}
-            ],
-            temperature=0,
-            max_tokens=500
-        )
-        
-        response_text = response.choices[0].message.content.strip()
-        
-        print("="*30)
-        print("RAW LLM RESPONSE:")
-        print(response_text)
-        print("="*30)
-        
-        # Try to parse the JSON response
+
+def build_extraction_prompt(fields=None, notes=()):
+    """Extraction prompt asking only for `fields` (all fields by default), with extra notes before the text"""
+    fields = [field for field in FIELD_KEYS if fields is None or field in fields]
+    return (PROMPT_HEADER
+            + "\n".join(FIELD_KEYS[field] for field in fields)
+            + "\n  \nRules:\n"
+            + "\n\n".join(FIELD_RULES[field] for field in fields)
+            + "\n\n" + "".join(note + "\n\n" for note in notes) + PROMPT_FOOTER)
+
+def _request_llm_parse(prompt, cleaned_text):
+    """Send the bill text to OpenAI and return the parsed JSON response"""
+    print("="*30)
+    print("SENDING TO LLM:")
+    print("Text sample:", cleaned_text[:800], "...")
+    print("="*30)
+    
+    # Pooled session with a deadline, retries and hedging - see llm_client
+    response_text = get_llm_client().chat_completion(
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a utility bill data extraction expert. Parse the text and return only valid JSON. Look carefully at company names and websites to identify the correct utility."},
+            {"role": "user", "content": prompt + cleaned_text}
+        ],
+        temperature=0,
+        max_tokens=500
+    )
+    
+    print("="*30)
+    print("RAW LLM RESPONSE:")
+    print(response_text)
+    print("="*30)
+    
+    # Try to parse the JSON response
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        # If JSON parsing fails, try to extract JSON from the response
+        import re
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group())
+        raise ValueError("Could not parse JSON from LLM response")
+
+def fallback_parse_data():
+    """Placeholder result used when OpenAI isn't configured (local testing)"""
+    return {
+        'utility_name': 'National Grid',
+        'customer_name': 'Test Customer',
+        'account_number': '123456789',
+        'poid': 'TEST123456',
+        'monthly_usage': '1500',
+        'annual_usage': '18000',
+        'service_address': '123 Test Street, Buffalo, NY 14201',
+        # Placeholder values must never be cached as a bill's real data
+        'mock_data': True
+    }
+
+def request_missing_fields(cleaned_text, rule_results, missing):
+    """
+    Ask the LLM for just the `missing` fields, with the utility's prompt hint and any
+    low-confidence rule guesses. Returns {field: value}, or None if OpenAI isn't configured.
+    """
+    if not _openai_configured():
+        return None
+    
+    notes = []
+    # Field rules for POID/usage depend on the utility - add its profile's prompt fragment
+    profile = profile_for(rule_results['utility_name'][0])
+    if profile and profile.prompt_hint:
+        notes.append(profile.prompt_hint)
+    # Low-confidence rule matches are offered for the model to confirm or correct
+    candidates = {field: rule_results[field][0] for field in missing if rule_results[field][0] not in ('', 0, [])}
+    if candidates:
+        notes.append("Unverified guesses from pattern matching - check each against the text and "
+                     "correct it if wrong: " + json.dumps(candidates))
+    prompt = build_extraction_prompt(missing, notes)
+    
+    # Only send the header and the text around anchors for the fields we still need
+    llm_text, trim_info = trim_to_anchors(cleaned_text, missing,
+                                          extra_anchors=profile.anchor_pattern if profile else None)
+    print(f"✂️  LLM context: {trim_info['original_chars']} -> {trim_info['trimmed_chars']} chars "
+          f"(~{trim_info['trimmed_chars'] // 4} tokens, "
+          f"{trim_info['trimmed_chars'] / max(trim_info['original_chars'], 1):.0%} of the OCR text, "
+          f"{trim_info['windows']} window(s))")
+    
+    # temperature=0: the same prompt (requested fields, hints, guesses) and text always gives the same answer
+    cache = _get_parse_cache()
+    cache_key = parse_cache_key(prompt + llm_text, PROMPT_VERSION, LLM_MODEL)
+    llm_data = None
+    if cache:
         try:
-            parsed_data = json.loads(response_text)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                parsed_data = json.loads(json_match.group())
-            else:
-                raise ValueError("Could not parse JSON from LLM response")
-        
-        # Debug: Print the exact JSON the LLM returned
-        print(f"LLM returned JSON: {json.dumps(parsed_data, indent=2)}")
-        
-        # Map and validate fields
-        final_data = {}
-        
-        # Utility name (OCR wins over form data)
-        final_data['utility_name'] = parsed_data.get('utility_name', '')
-        
-        # Customer name
-        final_data['customer_name'] = parsed_data.get('customer_name', '')
-        
-        # Account number with validation
-        account_num = parsed_data.get('account_number', '')
-        if account_num:
-            # Strip spaces/dashes, keep leading zeros
-            clean_account = str(account_num).replace(' ', '').replace('-', '')
-            # Validate: must contain at least 6 digits and be 8-18 chars
-            digit_count = sum(c.isdigit() for c in clean_account)
-            if 6 <= digit_count and 8 <= len(clean_account) <= 18:
-                final_data['account_number'] = clean_account
-            else:
-                print("ACCOUNT_NUMBER_NOT_FOUND - validation failed")
-                final_data['account_number'] = ''
-        else:
-            final_data['account_number'] = ''
-        
-        # POID with RG&E-specific validation
-        poid = parsed_data.get('poid', '')
-        utility_name = final_data.get('utility_name', '')
-        
-        print(f"=== POID EXTRACTION DEBUG ===")
-        print(f"Utility: {utility_name}")
-        print(f"LLM extracted POID: '{poid}'")
-        
-        # Special validation for RG&E POIDs
-        if utility_name == 'RG&E':
-            # RG&E POIDs should start with 'R' followed by 14 digits
-            import re
-            
-            # First, let's see what's around "POD ID" in the text
-            pod_context = re.search(r'(.{20}Po[Dd] ID:.{50})', cleaned_text)
-            if pod_context:
-                print(f"POD ID context: ...{pod_context.group(1)}...")
-            
-            if poid and not re.match(r'^R\d{14}$', poid):
-                print(f"WARNING: Invalid RG&E POID format: {poid}")
-                # Check if it's a meter number (typically starts with 035)
-                if poid.startswith('035') and len(poid) == 10:
-                    print(f"ERROR: Meter number {poid} mistaken for POID")
-                
-                # Try multiple patterns to find the real POID
-                patterns = [
-                    r'Po[Dd] ID:\s*([R]\d{14})',
-                    r'POD ID:\s*([R]\d{14})',
-                    r'Point of Delivery ID:\s*([R]\d{14})',
-                    r'([R]\d{14})(?=\s*Meter Number)'  # POID before meter number
-                ]
-                
-                for pattern in patterns:
-                    poid_match = re.search(pattern, cleaned_text)
-                    if poid_match:
-                        poid = poid_match.group(1)
-                        print(f"FIXED: Found correct POID using pattern '{pattern}': {poid}")
-                        break
-                else:
-                    poid = ''
-                    print("ERROR: Could not find valid RG&E POID with any pattern")
-            elif poid and re.match(r'^R\d{14}$', poid):
-                print(f"SUCCESS: Valid RG&E POID format confirmed: {poid}")
-            elif not poid:
-                # LLM didn't extract any POID, try to find it ourselves
-                print("WARNING: LLM didn't extract POID for RG&E bill, searching manually...")
-                patterns = [
-                    r'Po[Dd] ID:\s*([R]\d{14})',
-                    r'POD ID:\s*([R]\d{14})',
-                    r'Point of Delivery ID:\s*([R]\d{14})'
-                ]
-                
-                for pattern in patterns:
-                    poid_match = re.search(pattern, cleaned_text)
-                    if poid_match:
-                        poid = poid_match.group(1)
-                        print(f"FOUND: Located POID using pattern '{pattern}': {poid}")
-                        break
-        
-        print(f"Final POID: '{poid}'")
-        print(f"=== END POID DEBUG ===")
-        
-        final_data['poid'] = poid
-        
-        # Monthly usage with better validation and utility-specific logic
-        monthly_usage_kwh = parsed_data.get('monthly_usage_kwh', '')
-        usage_breakdown = parsed_data.get('usage_breakdown', [])
-        utility_name = final_data.get('utility_name', '')
-        
-        print(f"=== USAGE EXTRACTION DEBUG ===")
-        print(f"Utility: {utility_name}")
-        print(f"Raw monthly_usage_kwh: {monthly_usage_kwh}")
-        print(f"Usage breakdown: {usage_breakdown}")
-        
-        if monthly_usage_kwh:
+            llm_data = cache.get(cache_key)
+        except Exception as e:
+            print(f"⚠️  LLM parse cache lookup failed: {e}")
+    
+    if llm_data is not None:
+        print(f"♻️  LLM parse cache hit ({cache_key[:12]}) - skipping OpenAI call")
+    else:
+        llm_data = _request_llm_parse(prompt, llm_text)
+        if cache:
             try:
-                # Clean and convert monthly usage
-                monthly_clean = str(monthly_usage_kwh).replace(',', '').replace('kWh', '').replace('kwh', '').strip()
-                monthly_value = float(monthly_clean)
-                
-                # For RG&E/NYSEG, verify against breakdown if available
-                if utility_name in ['RG&E', 'NYSEG'] and usage_breakdown:
-                    breakdown_sum = sum(usage_breakdown) if isinstance(usage_breakdown, list) else 0
-                    if breakdown_sum > 0:
-                        print(f"RG&E/NYSEG: Using breakdown sum {breakdown_sum} instead of single value {monthly_value}")
-                        monthly_value = breakdown_sum
-                
-                final_data['monthly_usage'] = str(int(round(monthly_value)))
-                final_data['annual_usage'] = str(int(round(monthly_value * 12)))
-                print(f"Final monthly usage: {monthly_value} kWh -> Annual: {monthly_value * 12} kWh")
-                
-                # Store breakdown for debugging
-                if usage_breakdown:
-                    print(f"Usage breakdown values: {usage_breakdown}")
-                    
-            except (ValueError, AttributeError):
-                print("MONTHLY_USAGE_PARSE_ERROR")
-                final_data['monthly_usage'] = ''
-                final_data['annual_usage'] = ''
+                cache.put(cache_key, llm_data)
+            except Exception as e:
+                print(f"⚠️  Could not cache LLM response: {e}")
+    
+    return {field: llm_data.get(field, '') for field in missing}
+
+def build_parse_result(cleaned_text, rule_results, llm_answers, extraction_timing):
+    """
+    Merge confident rule fields with LLM answers for the rest, then validate and
+    post-process into the result dict. Fields without an answer yet stay empty
+    (source 'pending') - used for the partial result streamed before the LLM returns.
+    """
+    confident, missing = split_confident(rule_results)
+    parsed_data = dict(confident)
+    field_sources = {field: 'rules' for field in confident}
+    for field in missing:
+        parsed_data[field] = llm_answers.get(field, '')
+        field_sources[field] = 'llm' if field in llm_answers else 'pending'
+    field_confidence = {field: confidence for field, (_, confidence) in rule_results.items()}
+    
+    # Debug: Print the merged rules + LLM fields
+    print(f"Parsed JSON: {json.dumps(parsed_data, indent=2)}")
+    
+    # Map and validate fields
+    final_data = {}
+    
+    # Utility name (OCR wins over form data)
+    final_data['utility_name'] = parsed_data.get('utility_name', '')
+    
+    # Customer name
+    final_data['customer_name'] = parsed_data.get('customer_name', '')
+    
+    # Account number with validation
+    account_num = parsed_data.get('account_number', '')
+    if account_num:
+        # Strip spaces/dashes, keep leading zeros
+        clean_account = str(account_num).replace(' ', '').replace('-', '')
+        # Validate: must contain at least 6 digits and be 8-18 chars
+        digit_count = sum(c.isdigit() for c in clean_account)
+        if 6 <= digit_count and 8 <= len(clean_account) <= 18:
+            final_data['account_number'] = clean_account
         else:
-            print("MONTHLY_USAGE_NOT_FOUND")
+            print("ACCOUNT_NUMBER_NOT_FOUND - validation failed")
+            final_data['account_number'] = ''
+    else:
+        final_data['account_number'] = ''
+    
+    # POID with RG&E-specific validation
+    poid = parsed_data.get('poid', '')
+    utility_name = final_data.get('utility_name', '')
+    
+    print(f"=== POID EXTRACTION DEBUG ===")
+    print(f"Utility: {utility_name}")
+    print(f"LLM extracted POID: '{poid}'")
+    
+    # Special validation for RG&E POIDs
+    if utility_name == 'RG&E':
+        # RG&E POIDs should start with 'R' followed by 14 digits
+        import re
+    
+        # First, let's see what's around "POD ID" in the text
+        pod_context = re.search(r'(.{20}Po[Dd] ID:.{50})', cleaned_text)
+        if pod_context:
+            print(f"POD ID context: ...{pod_context.group(1)}...")
+    
+        if poid and not re.match(r'^R\d{14}$', poid):
+            print(f"WARNING: Invalid RG&E POID format: {poid}")
+            # Check if it's a meter number (typically starts with 035)
+            if poid.startswith('035') and len(poid) == 10:
+                print(f"ERROR: Meter number {poid} mistaken for POID")
+    
+            # Try multiple patterns to find the real POID
+            patterns = [
+                r'Po[Dd] ID:\s*([R]\d{14})',
+                r'POD ID:\s*([R]\d{14})',
+                r'Point of Delivery ID:\s*([R]\d{14})',
+                r'([R]\d{14})(?=\s*Meter Number)'  # POID before meter number
+            ]
+    
+            for pattern in patterns:
+                poid_match = re.search(pattern, cleaned_text)
+                if poid_match:
+                    poid = poid_match.group(1)
+                    print(f"FIXED: Found correct POID using pattern '{pattern}': {poid}")
+                    break
+            else:
+                poid = ''
+                print("ERROR: Could not find valid RG&E POID with any pattern")
+        elif poid and re.match(r'^R\d{14}$', poid):
+            print(f"SUCCESS: Valid RG&E POID format confirmed: {poid}")
+        elif not poid:
+            # LLM didn't extract any POID, try to find it ourselves
+            print("WARNING: LLM didn't extract POID for RG&E bill, searching manually...")
+            patterns = [
+                r'Po[Dd] ID:\s*([R]\d{14})',
+                r'POD ID:\s*([R]\d{14})',
+                r'Point of Delivery ID:\s*([R]\d{14})'
+            ]
+    
+            for pattern in patterns:
+                poid_match = re.search(pattern, cleaned_text)
+                if poid_match:
+                    poid = poid_match.group(1)
+                    print(f"FOUND: Located POID using pattern '{pattern}': {poid}")
+                    break
+    
+    print(f"Final POID: '{poid}'")
+    print(f"=== END POID DEBUG ===")
+    
+    final_data['poid'] = poid
+    
+    # Monthly usage with better validation and utility-specific logic
+    monthly_usage_kwh = parsed_data.get('monthly_usage_kwh', '')
+    usage_breakdown = parsed_data.get('usage_breakdown', [])
+    utility_name = final_data.get('utility_name', '')
+    
+    print(f"=== USAGE EXTRACTION DEBUG ===")
+    print(f"Utility: {utility_name}")
+    print(f"Raw monthly_usage_kwh: {monthly_usage_kwh}")
+    print(f"Usage breakdown: {usage_breakdown}")
+    
+    if monthly_usage_kwh:
+        try:
+            # Clean and convert monthly usage
+            monthly_clean = str(monthly_usage_kwh).replace(',', '').replace('kWh', '').replace('kwh', '').strip()
+            monthly_value = float(monthly_clean)
+    
+            # For RG&E/NYSEG, verify against breakdown if available
+            if utility_name in ['RG&E', 'NYSEG'] and usage_breakdown:
+                breakdown_sum = sum(usage_breakdown) if isinstance(usage_breakdown, list) else 0
+                if breakdown_sum > 0:
+                    print(f"RG&E/NYSEG: Using breakdown sum {breakdown_sum} instead of single value {monthly_value}")
+                    monthly_value = breakdown_sum
+    
+            final_data['monthly_usage'] = str(int(round(monthly_value)))
+            final_data['annual_usage'] = str(int(round(monthly_value * 12)))
+            print(f"Final monthly usage: {monthly_value} kWh -> Annual: {monthly_value * 12} kWh")
+    
+            # Store breakdown for debugging
+            if usage_breakdown:
+                print(f"Usage breakdown values: {usage_breakdown}")
+    
+        except (ValueError, AttributeError):
+            print("MONTHLY_USAGE_PARSE_ERROR")
             final_data['monthly_usage'] = ''
             final_data['annual_usage'] = ''
+    else:
+        print("MONTHLY_USAGE_NOT_FOUND")
+        final_data['monthly_usage'] = ''
+        final_data['annual_usage'] = ''
+    
+    print(f"=== END USAGE DEBUG ===")
+    
+    # Service address
+    final_data['service_address'] = parsed_data.get('service_address', '')
+    
+    # Where each field came from ('rules', 'llm' or 'pending'), for debugging extraction quality
+    final_data['field_sources'] = field_sources
+    # Rule confidence per field and time spent, for tuning RULE_MIN_CONFIDENCE against latency
+    final_data['field_confidence'] = field_confidence
+    final_data['extraction_timing'] = extraction_timing
+    
+    return final_data
+
+def parse_utility_bill_with_llm(raw_ocr_text, layout_usage=None):
+    """
+    Use OpenAI to parse utility bill text and extract structured data.
+    layout_usage is the geometric "Billed Usage" column result from the OCR word boxes, if any.
+    """
+    try:
+        # Clean up OCR text first
+        cleaned_text = normalize_ocr_text(raw_ocr_text)
         
-        print(f"=== END USAGE DEBUG ===")
+        # Deterministic per-utility rules first - the LLM only fills the low-confidence fields
+        rules_started = time.perf_counter()
+        rule_results = extract_with_rules(cleaned_text, layout_usage)
+        confident, missing = split_confident(rule_results)
+        extraction_timing = {'rules_ms': round((time.perf_counter() - rules_started) * 1000, 1), 'llm_ms': 0}
+        print(f"📏 Rules extracted {len(confident)}/{len(confident) + len(missing)} fields "
+              f"in {extraction_timing['rules_ms']}ms (confidence { {field: conf for field, (_, conf) in rule_results.items()} })"
+              + (f" - asking LLM for: {', '.join(missing)}" if missing else " - skipping LLM"))
         
-        # Service address
-        final_data['service_address'] = parsed_data.get('service_address', '')
+        llm_answers = {}
+        if missing:
+            llm_started = time.perf_counter()
+            llm_answers = request_missing_fields(cleaned_text, rule_results, missing)
+            if llm_answers is None:
+                print("⚠️  OpenAI not available - returning fallback mock data")
+                return fallback_parse_data()
+            extraction_timing['llm_ms'] = round((time.perf_counter() - llm_started) * 1000, 1)
         
-        return final_data
+        return build_parse_result(cleaned_text, rule_results, llm_answers, extraction_timing)
         
     except Exception as e:
         print(f"LLM parsing error: {e}")
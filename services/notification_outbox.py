@@ -0,0 +1,205 @@
+import os
+import json
+import contextlib
+import time
+import random
+import sqlite3
+import threading
+
+from .job_store import DATA_DIR, local_db_connection
+
+
+class NotificationOutbox:
+    """
+    Durable queue of notification intents (emails, SMS) sent off the critical path.
+
+    The submission pipeline only records what should be sent; a background
+    dispatcher delivers each intent with retries and exponential backoff.
+    Intents carry a dedupe key, so a resumed submission never notifies twice.
+    The lease on an intent is renewed while it is being sent, so a slow send
+    is never picked up again by another worker.
+    """
+
+    # Shared by every outbox in the process; guards the one-time dispatcher start
+    _start_lock = threading.Lock()
+
+    def __init__(self, db_path=None, max_attempts=6, base_delay=10, max_delay=900,
+                 poll_interval=5, lease_seconds=120):
+        self.db_path = db_path or os.path.join(DATA_DIR, 'notification_outbox.db')
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._handlers = {}
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._init_schema()
+
+    def _init_schema(self):
+        with local_db_connection(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedupe_key      TEXT NOT NULL UNIQUE,
+                    kind            TEXT NOT NULL,
+                    payload         TEXT NOT NULL,
+                    status          TEXT NOT NULL,
+                    attempts        INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    lease_until     REAL,
+                    last_error      TEXT,
+                    created_at      REAL NOT NULL,
+                    updated_at      REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+            """)
+
+    def register_handler(self, kind, handler):
+        """handler(payload) delivers one intent; raising marks the attempt as failed"""
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind, payload, dedupe_key):
+        """Record a notification intent. Returns False if the dedupe key was already queued."""
+        now = time.time()
+        try:
+            with local_db_connection(self.db_path) as conn:
+                conn.execute(
+                    "INSERT INTO outbox (dedupe_key, kind, payload, status, next_attempt_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+                    (dedupe_key, kind, json.dumps(payload), now, now, now)
+                )
+        except sqlite3.IntegrityError:
+            print(f"📭 Notification {dedupe_key} already queued - skipping duplicate")
+            return False
+
+        self.start()
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        """Start the dispatcher thread in this process (threads don't survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            thread = threading.Thread(target=self._dispatch_loop, name="notification-dispatcher", daemon=True)
+            thread.start()
+            # Published last so no caller sees the pid before the event the dispatcher waits on exists
+            self._pid = os.getpid()
+        print("✅ Started notification dispatcher")
+
+    def _dispatch_loop(self):
+        while True:
+            try:
+                delivered = self.dispatch_due()
+            except Exception as e:
+                print(f"⚠️  Notification dispatcher error: {e}")
+                delivered = 0
+            if not delivered:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim_next(self):
+        """Atomically lease the oldest due intent (expired leases from dead workers count as due)"""
+        now = time.time()
+        with local_db_connection(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM outbox WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                    "OR (status = 'sending' AND lease_until < ?) ORDER BY next_attempt_at LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE outbox SET status = 'sending', lease_until = ?, updated_at = ? WHERE id = ?",
+                        (now + self.lease_seconds, now, row['id'])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def dispatch_due(self):
+        """Deliver every intent that is currently due. Returns the number handled."""
+        handled = 0
+        while True:
+            row = self._claim_next()
+            if row is None:
+                return handled
+            handled += 1
+            self._deliver(row)
+
+    def _deliver(self, row):
+        handler = self._handlers.get(row['kind'])
+        attempts = row['attempts'] + 1
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for notification kind '{row['kind']}'")
+            with self._holding_lease(row['id']):
+                handler(json.loads(row['payload']))
+        except Exception as e:
+            now = time.time()
+            if attempts >= self.max_attempts:
+                status, next_attempt = 'dead', now
+                print(f"❌ Notification {row['dedupe_key']} failed permanently after {attempts} attempts: {e}")
+            else:
+                delay = min(self.base_delay * (2 ** (attempts - 1)), self.max_delay)
+                status, next_attempt = 'pending', now + delay * random.uniform(0.8, 1.2)
+                print(f"⚠️  Notification {row['dedupe_key']} failed (attempt {attempts}): {e} - retrying in {delay:.0f}s")
+            with local_db_connection(self.db_path) as conn:
+                conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, lease_until = NULL, "
+                    "last_error = ?, updated_at = ? WHERE id = ?",
+                    (status, attempts, next_attempt, str(e), now, row['id'])
+                )
+            return
+
+        now = time.time()
+        with local_db_connection(self.db_path) as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', attempts = ?, lease_until = NULL, last_error = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (attempts, now, row['id'])
+            )
+
+    @contextlib.contextmanager
+    def _holding_lease(self, row_id):
+        """Extend the lease on an intent every third of lease_seconds until the block exits"""
+        done = threading.Event()
+
+        def _renew():
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    with local_db_connection(self.db_path) as conn:
+                        conn.execute(
+                            "UPDATE outbox SET lease_until = ? WHERE id = ? AND status = 'sending'",
+                            (time.time() + self.lease_seconds, row_id)
+                        )
+                except Exception as e:
+                    print(f"⚠️  Could not renew notification lease: {e}")
+
+        renewer = threading.Thread(target=_renew, name="notification-lease", daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            done.set()
+            renewer.join()
+
+    def purge_finished(self, max_age_seconds=86400):
+        """Delete delivered and dead intents (they hold customer contact details)"""
+        cutoff = time.time() - max_age_seconds
+        with local_db_connection(self.db_path) as conn:
+            return conn.execute(
+                "DELETE FROM outbox WHERE status IN ('sent', 'dead') AND updated_at < ?", (cutoff,)
+            ).rowcount
+
+    def count_by_status(self):
+        with local_db_connection(self.db_path) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
@@ -0,0 +1,48 @@
+import os
+import hashlib
+
+from .job_store import DATA_DIR
+from .sqlite_cache import SQLiteKVCache
+
+# Bump when a change to OCR/parsing should invalidate previously cached results
+OCR_CACHE_VERSION = 2
+
+CHUNK_SIZE = 64 * 1024
+
+
+def save_upload_with_hash(file_storage, file_path):
+    """Stream an uploaded file to disk, hashing it on the way. Returns the SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    stream = file_storage.stream
+    with open(file_path, 'wb') as out:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(file_path):
+    """SHA-256 of a file already on disk (used when resuming a job without a recorded hash)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRResultCache(SQLiteKVCache):
+    """
+    Content-addressed cache of extracted bill data (the final ocr_data dict).
+
+    Agents often resubmit the same bill after fixing a typo in the form; a
+    repeat upload hashes to the same key and skips Vision OCR and LLM parsing.
+    Entries expire after ttl_seconds, and the least recently used entries are
+    evicted beyond max_entries. Stored in a local SQLite file shared by workers.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=7 * 86400, max_entries=500):
+        super().__init__(db_path or os.path.join(DATA_DIR, 'ocr_cache.db'), 'ocr_cache',
+                         ttl_seconds, max_entries, version=OCR_CACHE_VERSION)
@@ -1,10 +1,46 @@
+import copy
 import os
-from .llm_parser import parse_utility_bill_with_llm
-from .vision_ocr_service import process_utility_bill_with_vision
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .llm_parser import (normalize_ocr_text, request_missing_fields, build_parse_result,
+                         fallback_parse_data)
+from .rule_extractor import extract_with_rules, split_confident
+from .context_trimmer import FIELD_ANCHORS
+from .vision_ocr_service import iter_bill_text
 
 # Legacy Tesseract functions removed - now using Google Vision API
 
+# Start the LLM as soon as the pages holding the low-confidence fields are in, while OCR continues
+OCR_STREAM_LLM = os.getenv('OCR_STREAM_LLM', 'true').lower() == 'true'
+
+# Fields the POA and agreement embed - once rules are confident in all of them, documents can start
+DOCUMENT_FIELDS = ('utility_name', 'account_number', 'poid', 'monthly_usage_kwh', 'service_address')
+
+def _anchors_present(cleaned_text, fields):
+    # The breakdown rides along with the monthly usage - it has no anchor of its own on most bills
+    return all(FIELD_ANCHORS[field].search(cleaned_text) for field in fields if field != 'usage_breakdown')
+
 def process_utility_bill(file_path, service_account_info, progress_callback=None):
+    """
+    Extract bill data and return the final result.
+    progress_callback(event, data), if given, receives the 'page' and 'fields' events
+    of stream_utility_bill as they happen.
+    """
+    for event, data in stream_utility_bill(file_path, service_account_info):
+        if event == 'result':
+            return data
+        if progress_callback:
+            progress_callback(event, data)
+
+def stream_utility_bill(file_path, service_account_info):
+    """
+    Generator pipeline over a utility bill. Yields:
+      ('page', {'page', 'fields', 'missing'})  as each page's text arrives and the rules re-run
+      ('fields', data)  once, as soon as the rules alone are confident in every DOCUMENT_FIELDS field
+      ('result', data)  last, with LLM answers for the low-confidence fields merged in
+    The LLM request for the low-confidence fields starts as soon as their anchors have
+    appeared in the pages read so far, overlapping with OCR of the remaining pages.
+    """
     try:
         print(f"🔍 DEBUG: Processing file: {file_path}")
         print(f"🔍 DEBUG: File exists: {os.path.exists(file_path)}")
@@ -18,65 +54,145 @@ def process_utility_bill(file_path, service_account_info, progress_callback=None
         # Check if this is a test file
         if 'test_utility_bill' in file_path:
             print("🔍 DEBUG: DETECTED TEST FILE - using mock data")
-            return {
+            yield 'result', {
                 'utility_name': 'National Grid',
                 'customer_name': 'John Test Customer',
                 'account_number': '1234567890',
                 'poid': 'POI12345',
                 'monthly_usage': '1500',
                 'annual_usage': '18000',
-                'service_address': '456 Test Service Lane, Buffalo, NY 14201'
+                'service_address': '456 Test Service Lane, Buffalo, NY 14201',
+                'mock_data': True
             }
+            return
         
         print(f"🔍 DEBUG: Processing REAL file - starting Google Vision OCR...")
         
-        # Extract raw text using Google Vision API
-        try:
-            print(f"🔍 DEBUG: About to call process_utility_bill_with_vision...")
-            raw_text = process_utility_bill_with_vision(file_path, service_account_info)
-            print(f"🔍 DEBUG: Vision API call completed successfully")
-        except Exception as vision_error:
-            print(f"🔍 DEBUG: Vision API error: {vision_error}")
-            import traceback
-            traceback.print_exc()
-            raise
-        
-        print(f"🔍 DEBUG: Vision API returned {len(raw_text) if raw_text else 0} characters")
-        print(f"🔍 DEBUG: Raw text type: {type(raw_text)}")
-        print(f"🔍 DEBUG: Raw text preview: {raw_text[:200] if raw_text else 'EMPTY/NONE'}...")
-        
-        if not raw_text or len(raw_text.strip()) < 10:
-            print("🔍 DEBUG: Empty or minimal text from Vision API!")
-            print(f"🔍 DEBUG: Raw text was: '{raw_text}'")
-            return {
-                'utility_name': '',
-                'customer_name': '',
-                'account_number': '',
-                'poid': '',
-                'monthly_usage': '',
-                'annual_usage': '',
-                'service_address': ''
-            }
-        
-        print(f"🔍 DEBUG: Sending text to LLM parser...")
+        ocr_metadata = {}
+        raw_text = ""
+        extraction_timing = {'rules_ms': 0, 'llm_ms': 0}
+        rule_results = None
+        fields_sent = False
+        pages_read = 0
+        # The early request, the page count it saw and the rule values it was given as guesses
+        early_llm, early_pages, early_guesses = None, 0, {}
         
-        # Use LLM to parse the extracted text
-        try:
-            print(f"🔍 DEBUG: About to call parse_utility_bill_with_llm...")
-            parsed_data = parse_utility_bill_with_llm(raw_text)
-            print(f"🔍 DEBUG: LLM parsing completed successfully")
-        except Exception as llm_error:
-            print(f"🔍 DEBUG: LLM parsing error: {llm_error}")
-            import traceback
-            traceback.print_exc()
-            raise
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-parse") as llm_executor:
+            # Pages stream out of Vision (or the text layer) in order
+            for page_number, page_text in iter_bill_text(file_path, service_account_info, ocr_metadata):
+                raw_text += page_text + "\n"
+                pages_read += 1
+                cleaned_text = normalize_ocr_text(raw_text)
+                
+                rules_started = time.perf_counter()
+                rule_results = extract_with_rules(cleaned_text, ocr_metadata.get('layout_usage'))
+                extraction_timing['rules_ms'] += round((time.perf_counter() - rules_started) * 1000, 1)
+                confident, missing = split_confident(rule_results)
+                print(f"🔍 DEBUG: Page {page_number}: rules confident in {len(confident)} field(s), missing {missing}")
+                yield 'page', {'page': page_number, 'fields': confident, 'missing': missing}
+                
+                if not fields_sent and all(field in confident for field in DOCUMENT_FIELDS):
+                    fields_sent = True
+                    partial = build_parse_result(cleaned_text, rule_results, {}, dict(extraction_timing))
+                    # A snapshot - OCR keeps adding to the live dict while the documents
+                    # stage reads (and checkpoints) this partial on another thread
+                    partial['ocr_metadata'] = copy.deepcopy(ocr_metadata)
+                    yield 'fields', partial
+                
+                if OCR_STREAM_LLM and early_llm is None and missing and _anchors_present(cleaned_text, missing):
+                    print(f"🔍 DEBUG: Anchors for {', '.join(missing)} found by page {page_number} - starting LLM while OCR continues")
+                    early_pages = pages_read
+                    early_guesses = {field: rule_results[field][0] for field in missing}
+                    early_llm = llm_executor.submit(_timed_request, cleaned_text, rule_results, missing)
+            
+            print(f"🔍 DEBUG: Text route: {ocr_metadata.get('route')} "
+                  f"({ocr_metadata.get('vision_pages', 0)} Vision page(s), {ocr_metadata.get('text_layer_pages', 0)} text-layer page(s), "
+                  f"{ocr_metadata.get('vision_requests', 0)} Vision request(s))")
+            print(f"🔍 DEBUG: Vision API returned {len(raw_text)} characters")
+            print(f"🔍 DEBUG: Raw text preview: {raw_text[:200] if raw_text else 'EMPTY/NONE'}...")
             
+            if not raw_text or len(raw_text.strip()) < 10:
+                print("🔍 DEBUG: Empty or minimal text from Vision API!")
+                print(f"🔍 DEBUG: Raw text was: '{raw_text}'")
+                if early_llm:
+                    early_llm.cancel()
+                yield 'result', {
+                    'utility_name': '',
+                    'customer_name': '',
+                    'account_number': '',
+                    'poid': '',
+                    'monthly_usage': '',
+                    'annual_usage': '',
+                    'service_address': '',
+                    'ocr_metadata': ocr_metadata
+                }
+                return
+            
+            # Rules have now seen every page; the LLM covers whatever is still low-confidence
+            _, missing = split_confident(rule_results)
+            llm_answers = {}
+            try:
+                if early_llm and set(missing) & set(early_guesses):
+                    answers, seconds = early_llm.result()
+                    if answers is None:
+                        yield 'result', fallback_parse_data()
+                        return
+                    extraction_timing['llm_ms'] += seconds
+                    llm_answers.update(_usable_early_answers(answers, missing, pages_read > early_pages,
+                                                             early_guesses, rule_results))
+                elif early_llm:
+                    # Later pages made the rules confident after all - the early answer isn't needed
+                    early_llm.cancel()
+                
+                late_fields = [field for field in missing if field not in llm_answers]
+                if late_fields:
+                    # Fields the early request couldn't answer from the pages it saw are asked again over every page
+                    print(f"🔍 DEBUG: Sending {', '.join(late_fields)} to the LLM...")
+                    answers, seconds = _timed_request(cleaned_text, rule_results, late_fields)
+                    if answers is None:
+                        print("⚠️  OpenAI not available - returning fallback mock data")
+                        yield 'result', fallback_parse_data()
+                        return
+                    llm_answers.update(answers)
+                    extraction_timing['llm_ms'] += seconds
+            except Exception as llm_error:
+                print(f"🔍 DEBUG: LLM parsing error: {llm_error}")
+                import traceback
+                traceback.print_exc()
+                raise Exception(f"LLM parsing failed: {str(llm_error)}")
+        
+        parsed_data = build_parse_result(cleaned_text, rule_results, llm_answers, extraction_timing)
         print(f"🔍 DEBUG: LLM parsed data: {parsed_data}")
         
-        return parsed_data
+        # Which pages went through Vision vs. the embedded text layer
+        parsed_data['ocr_metadata'] = ocr_metadata
+        
+        yield 'result', parsed_data
     except Exception as e:
         print(f"🔍 DEBUG ERROR: {e}")
         import traceback
         traceback.print_exc()
         # Return error indication instead of dummy data
-        raise Exception(f"OCR processing failed: {str(e)}")
\ No newline at end of file
+        raise Exception(f"OCR processing failed: {str(e)}")
+
+def _usable_early_answers(answers, missing, more_pages_read, early_guesses, rule_results):
+    """
+    Early LLM answers that still hold for the whole bill. When pages were read after the
+    request went out, a blank answer may just mean the value is on a later page, and a field
+    whose rule guess changed was asked about with stale context - both are asked again.
+    """
+    usable = {}
+    for field in missing:
+        if field not in answers:
+            continue
+        if more_pages_read and (answers[field] in ('', None, 0, [])
+                                or rule_results[field][0] != early_guesses.get(field)):
+            continue
+        usable[field] = answers[field]
+    return usable
+
+def _timed_request(cleaned_text, rule_results, fields):
+    """(LLM answers for fields, milliseconds taken)"""
+    started = time.perf_counter()
+    answers = request_missing_fields(cleaned_text, rule_results, fields)
+    return answers, round((time.perf_counter() - started) * 1000, 1)
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+from .job_store import DATA_DIR, local_db_connection
+
+
+class StageTimingModel:
+    """
+    Measured per-stage durations used to drive progress percentages and ETAs.
+
+    Durations are kept as an exponentially weighted moving average in a local
+    SQLite file, so estimates survive restarts and are shared by every worker
+    on the box. Until a stage has been measured, a conservative prior is used.
+    """
+
+    # Prior durations in seconds, used until real measurements exist
+    DEFAULT_SECONDS = {
+        'ocr': 25.0,
+        'ocr_fields': 15.0,
+        'agent_lookup': 1.5,
+        'drive_folder': 1.5,
+        'poa': 3.0,
+        'agreement': 4.0,
+        'agency_agreement': 2.0,
+        'upload_utility_bill': 2.0,
+        'upload_poa': 2.0,
+        'upload_agreement': 2.0,
+        'upload_agency_agreement': 2.0,
+        'sheet_log': 2.0,
+        'notifications': 0.1,
+    }
+
+    def __init__(self, db_path=None, alpha=0.3, default_seconds=None):
+        self.db_path = db_path or os.path.join(DATA_DIR, 'stage_timings.db')
+        self.alpha = alpha
+        self.default_seconds = dict(self.DEFAULT_SECONDS, **(default_seconds or {}))
+        self._lock = threading.Lock()
+        self._ewma = {}
+        self._init_schema()
+        self.reload()
+
+    def _init_schema(self):
+        with local_db_connection(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stage_timings (
+                    stage      TEXT PRIMARY KEY,
+                    ewma       REAL NOT NULL,
+                    samples    INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def reload(self):
+        """Refresh in-memory estimates from disk (other workers may have recorded samples)"""
+        with local_db_connection(self.db_path) as conn:
+            rows = conn.execute("SELECT stage, ewma FROM stage_timings").fetchall()
+        with self._lock:
+            self._ewma = {row['stage']: row['ewma'] for row in rows}
+
+    def expected(self, stage):
+        """Expected duration of a stage in seconds"""
+        with self._lock:
+            if stage in self._ewma:
+                return self._ewma[stage]
+        return self.default_seconds.get(stage, 2.0)
+
+    def record(self, stage, seconds):
+        """Fold a measured stage duration into the moving average"""
+        now = time.time()
+        with local_db_connection(self.db_path) as conn:
+            # Update in SQL so concurrent workers don't overwrite each other's samples
+            conn.execute(
+                "INSERT INTO stage_timings (stage, ewma, samples, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(stage) DO UPDATE SET ewma = ewma * (1 - ?) + excluded.ewma * ?, "
+                "samples = samples + 1, updated_at = excluded.updated_at",
+                (stage, float(seconds), now, self.alpha, self.alpha)
+            )
+            row = conn.execute("SELECT ewma FROM stage_timings WHERE stage = ?", (stage,)).fetchone()
+        with self._lock:
+            self._ewma[stage] = row['ewma']
+
+    def remaining_seconds(self, dependencies, completed=(), running=None, now=None):
+        """
+        Estimate seconds until every stage finishes, following the critical path.
+
+        dependencies: ordered {stage: (dependency, ...)} in topological order
+        completed: stages already finished
+        running: {stage: started_at} for stages in flight
+        """
+        now = now or time.time()
+        running = running or {}
+        finish = {}
+        for stage, depends_on in dependencies.items():
+            expected = self.expected(stage)
+            if stage in completed:
+                finish[stage] = 0.0
+            elif stage in running:
+                # A stage running past its estimate is assumed to be nearly done
+                finish[stage] = max(expected - (now - running[stage]), 0.1 * expected)
+            else:
+                finish[stage] = max([finish[dep] for dep in depends_on], default=0.0) + expected
+        return max(finish.values(), default=0.0)
+
+    def snapshot(self):
+        """Current estimates for every known stage (for diagnostics)"""
+        stages = set(self.default_seconds)
+        with self._lock:
+            stages.update(self._ewma)
+        return {stage: round(self.expected(stage), 2) for stage in sorted(stages)}
@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import heapq
+import threading
+import contextlib
+from collections import OrderedDict
+
+from .job_store import DATA_DIR, local_db_connection
+
+
+class _SessionRecord:
+    """One in-memory progress session. Index fields are kept out of the data dict."""
+
+    __slots__ = ('data', 'version', 'status', 'start_time', 'completed_time')
+
+    def __init__(self, data):
+        self.data = data
+        self.version = 1
+        self.start_time = data['start_time']
+        # Filled in by MemoryProgressStore._reindex
+        self.status = None
+        self.completed_time = None
+
+
+class MemoryProgressStore:
+    """
+    Progress sessions kept in this process only.
+    Fastest option, but /progress requests must reach the worker running the job,
+    so it only works with a single gunicorn worker.
+
+    Every access goes through one lock, so request threads, job threads and the
+    cleanup thread can share it. Expiry never scans the table: completed
+    sessions sit in an ordered index (oldest completion first) and other
+    finished sessions in a heap keyed by start time, so purge() only touches
+    the sessions it removes.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._completed = OrderedDict()   # session_id -> completed_time, oldest first
+        self._abandoned = []              # heap of (start_time, session_id), lazily invalidated
+        self._changed = threading.Condition()
+
+    def _reindex(self, session_id, record):
+        """Sync the record's index fields with its data after a write (lock held)"""
+        data = record.data
+        status = data.get('status', 'in_progress')
+        if status == record.status and data.get('completed_time') == record.completed_time:
+            return
+        record.status = status
+        record.completed_time = data.get('completed_time')
+        self._completed.pop(session_id, None)
+        if status == 'completed':
+            self._completed[session_id] = record.completed_time or record.start_time
+        elif status != 'in_progress':
+            heapq.heappush(self._abandoned, (record.start_time, session_id))
+
+    def _remove(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._completed.pop(session_id, None)
+
+    def create(self, session_id, record):
+        with self._changed:
+            self._remove(session_id)
+            entry = _SessionRecord(dict(record))
+            self._sessions[session_id] = entry
+            self._reindex(session_id, entry)
+            self._changed.notify_all()
+
+    def get(self, session_id):
+        with self._changed:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            return dict(entry.data, version=entry.version)
+
+    def update(self, session_id, changes=None, mutate=None):
+        """Apply `changes` and/or mutate(record) atomically. Returns the new record or None."""
+        with self._changed:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if changes:
+                entry.data.update(changes)
+            if mutate:
+                mutate(entry.data)
+            entry.version += 1
+            self._reindex(session_id, entry)
+            self._changed.notify_all()
+            return dict(entry.data, version=entry.version)
+
+    def delete(self, session_id):
+        with self._changed:
+            self._remove(session_id)
+            self._changed.notify_all()
+
+    def count(self, status=None):
+        with self._changed:
+            if status is None:
+                return len(self._sessions)
+            if status == 'completed':
+                return len(self._completed)
+            return sum(1 for entry in self._sessions.values() if entry.status == status)
+
+    def version(self, session_id):
+        with self._changed:
+            entry = self._sessions.get(session_id)
+            return entry.version if entry is not None else None
+
+    def _version_locked(self, session_id):
+        entry = self._sessions.get(session_id)
+        return entry.version if entry is not None else None
+
+    def wait_for_change(self, session_id, last_version, timeout):
+        """Block until the session's version differs from last_version (or timeout). Returns the version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._version_locked(session_id) != last_version, timeout=timeout)
+            return self._version_locked(session_id)
+
+    @contextlib.contextmanager
+    def watch(self, session_id):
+        """Context yielding wait(last_version, timeout) for one progress stream"""
+        yield lambda last_version, timeout: self.wait_for_change(session_id, last_version, timeout)
+
+    def purge(self, completed_ttl=120, abandoned_ttl=600, keep_completed=15, now=None):
+        """
+        Remove completed sessions older than completed_ttl, sessions that never
+        finished within abandoned_ttl, and all but the newest keep_completed
+        completed sessions. In-progress sessions are never removed.
+        Returns the number of sessions removed.
+        """
+        now = now or time.time()
+        removed = 0
+        with self._changed:
+            # Oldest completions first - stop at the first one still inside its TTL
+            while self._completed:
+                session_id, completed_time = next(iter(self._completed.items()))
+                if completed_time >= now - completed_ttl and len(self._completed) <= keep_completed:
+                    break
+                self._remove(session_id)
+                removed += 1
+
+            while self._abandoned and self._abandoned[0][0] < now - abandoned_ttl:
+                start_time, session_id = heapq.heappop(self._abandoned)
+                entry = self._sessions.get(session_id)
+                # Skip stale heap entries for sessions that were deleted, recreated or moved on
+                if entry is None or entry.start_time != start_time or entry.status in ('in_progress', 'completed'):
+                    continue
+                self._remove(session_id)
+                removed += 1
+        return removed
+
+
+class SQLiteProgressStore:
+    """
+    Progress sessions in a local SQLite (WAL) file shared by every gunicorn
+    worker on the box, so /progress can be answered by any worker.
+    """
+
+    def __init__(self, db_path=None, poll_interval=0.25):
+        self.db_path = db_path or os.path.join(DATA_DIR, 'progress_sessions.db')
+        self.poll_interval = poll_interval
+        self._init_schema()
+
+    def _init_schema(self):
+        with local_db_connection(self.db_path) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS progress_sessions (
+                    session_id     TEXT PRIMARY KEY,
+                    data           TEXT NOT NULL,
+                    version        INTEGER NOT NULL,
+                    status         TEXT NOT NULL,
+                    start_time     REAL NOT NULL,
+                    completed_time REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_progress_status ON progress_sessions(status, completed_time);
+            """)
+
+    def _write(self, conn, session_id, session):
+        conn.execute(
+            "INSERT OR REPLACE INTO progress_sessions (session_id, data, version, status, start_time, completed_time) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, json.dumps(session), session['version'], session.get('status', 'in_progress'),
+             session['start_time'], session.get('completed_time'))
+        )
+
+    def create(self, session_id, record):
+        with local_db_connection(self.db_path) as conn:
+            self._write(conn, session_id, dict(record, version=1))
+
+    def get(self, session_id):
+        with local_db_connection(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT data FROM progress_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def update(self, session_id, changes=None, mutate=None):
+        """Apply `changes` and/or mutate(record) in one transaction. Returns the new record or None."""
+        with local_db_connection(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT data FROM progress_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return None
+                session = json.loads(row['data'])
+                if changes:
+                    session.update(changes)
+                if mutate:
+                    mutate(session)
+                session['version'] = session.get('version', 0) + 1
+                self._write(conn, session_id, session)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return session
+
+    def delete(self, session_id):
+        with local_db_connection(self.db_path) as conn:
+            conn.execute("DELETE FROM progress_sessions WHERE session_id = ?", (session_id,))
+
+    def count(self, status=None):
+        with local_db_connection(self.db_path) as conn:
+            if status is None:
+                row = conn.execute("SELECT COUNT(*) AS n FROM progress_sessions").fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT COUNT(*) AS n FROM progress_sessions WHERE status = ?", (status,)
+                ).fetchone()
+        return row['n']
+
+    def version(self, session_id):
+        with local_db_connection(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT version FROM progress_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row['version'] if row else None
+
+    def wait_for_change(self, session_id, last_version, timeout):
+        """Block until the session's version differs from last_version (or timeout). Returns the version."""
+        with self.watch(session_id) as wait:
+            return wait(last_version, timeout)
+
+    @contextlib.contextmanager
+    def watch(self, session_id):
+        """
+        Context yielding wait(last_version, timeout) for one progress stream.
+        Polls the (cheap, indexed) version column - writers may live in another
+        process - over one connection held for the whole stream, not one per tick.
+        """
+        with local_db_connection(self.db_path) as conn:
+            def wait(last_version, timeout):
+                deadline = time.time() + timeout
+                while True:
+                    row = conn.execute(
+                        "SELECT version FROM progress_sessions WHERE session_id = ?", (session_id,)
+                    ).fetchone()
+                    current = row['version'] if row else None
+                    if current != last_version or time.time() >= deadline:
+                        return current
+                    time.sleep(self.poll_interval)
+            yield wait
+
+    def purge(self, completed_ttl=120, abandoned_ttl=600, keep_completed=15, now=None):
+        """Same retention policy as MemoryProgressStore.purge. Returns the number removed."""
+        now = now or time.time()
+        with local_db_connection(self.db_path) as conn:
+            removed = conn.execute(
+                "DELETE FROM progress_sessions WHERE "
+                "(status = 'completed' AND COALESCE(completed_time, start_time) < ?) OR "
+                "(status NOT IN ('completed', 'in_progress') AND start_time < ?)",
+                (now - completed_ttl, now - abandoned_ttl)
+            ).rowcount
+            removed += conn.execute(
+                "DELETE FROM progress_sessions WHERE status = 'completed' AND session_id NOT IN "
+                "(SELECT session_id FROM progress_sessions WHERE status = 'completed' "
+                "ORDER BY COALESCE(completed_time, start_time) DESC LIMIT ?)",
+                (keep_completed,)
+            ).rowcount
+        return removed
+
+
+def create_progress_store(backend=None):
+    """Build the progress store selected by PROGRESS_STORE ('sqlite' or 'memory')"""
+    backend = (backend or os.getenv('PROGRESS_STORE', 'sqlite')).lower()
+    if backend == 'memory':
+        return MemoryProgressStore()
+    if backend == 'sqlite':
+        return SQLiteProgressStore()
+    raise ValueError(f"Unknown PROGRESS_STORE backend: {backend}")
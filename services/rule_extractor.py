@@ -0,0 +1,153 @@
+"""
+Deterministic, per-utility extraction rules applied before the LLM.
+
+The utility is classified first and only its profile's rules run (see
+utility_profiles). Each rule returns (value, confidence), which
+field_confidence then re-scores from the value's shape, its distance from
+its label and cross-checks elsewhere on the bill. Fields at or above
+RULE_MIN_CONFIDENCE (or their RULE_FIELD_MIN_CONFIDENCE override) are taken as-is; only the rest are sent to GPT, with
+a prompt covering just those fields. Typical National Grid and RG&E bills
+are fully extracted here in milliseconds.
+
+Rules run on normalize_ocr_text() output, so all whitespace (including
+line breaks) is collapsed to single spaces.
+"""
+
+import os
+import re
+
+from .field_detectors import detect_account_number
+from .utility_profiles import UtilityProfile, classify_utility
+from .field_confidence import score_fields
+
+RULE_MIN_CONFIDENCE = float(os.getenv('RULE_MIN_CONFIDENCE', '0.85'))
+# Per-field thresholds, e.g. "poid=0.9,customer_name=0.8"
+FIELD_MIN_CONFIDENCE = {
+    field.strip(): float(threshold)
+    for field, _, threshold in (item.partition('=') for item in os.getenv('RULE_FIELD_MIN_CONFIDENCE', '').split(','))
+    if field.strip() and threshold.strip()
+}
+
+# Fields the extractor (and the LLM) produce - same keys as the LLM JSON response
+FIELDS = ('utility_name', 'customer_name', 'account_number', 'poid',
+          'monthly_usage_kwh', 'usage_breakdown', 'service_address')
+
+GENERIC_PROFILE = UtilityProfile('', [])
+
+_KWH_VALUE = r'(\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?\s*kWh\b(?!\s*/\s*day)'
+
+BILLED_USAGE_RE = re.compile(r'Billed Usage', re.IGNORECASE)
+# A "Billed Usage" column ends where the next section of the bill starts
+USAGE_COLUMN_END_RE = re.compile(r'Total|Average|Next|Charges|Amount|Delivery|Supply', re.IGNORECASE)
+KWH_RE = re.compile(_KWH_VALUE, re.IGNORECASE)
+LABELED_USAGE_RE = re.compile(
+    r'(?:kWh Used|Total kWh|Total Usage|Energy Usage|Electric Usage|Usage This Period|kWh This Period)'
+    r'[^0-9]{0,30}' + _KWH_VALUE,
+    re.IGNORECASE
+)
+
+CUSTOMER_NAME_RE = re.compile(
+    r'(?:Customer Name|Account Holder|Account Name|Name on Account)\s*:?\s*'
+    # Stop before the next label - OCR text runs fields together on one line
+    r"([A-Z][A-Za-z.'\-]+(?:,?\s+(?!Account|Acct|Service|Billing|Bill\b|Address|Meter|Mailing)[A-Z][A-Za-z.'\-]*){1,3})"
+)
+SERVICE_ADDRESS_RE = re.compile(
+    r'(?:Service Address|Service Location|Property Address)\s*:?\s*'
+    r'(\d+[A-Za-z0-9 .,#\'\-]{3,80}?\b[A-Z]{2}\s+\d{5}(?:-\d{4})?)'
+)
+
+
+def _to_int(value):
+    return int(round(float(value.replace(',', ''))))
+
+
+def _billed_usage_column(text):
+    """Sum the kWh values listed under a "Billed Usage" column (RG&E/NYSEG tables)"""
+    values = []
+    for header in BILLED_USAGE_RE.finditer(text):
+        column = text[header.end():header.end() + 300]
+        end = USAGE_COLUMN_END_RE.search(column)
+        if end:
+            column = column[:end.start()]
+        values.extend(_to_int(match.group(1)) for match in KWH_RE.finditer(column))
+    return values
+
+
+def _first_group(match):
+    """First participating group - profile patterns may offer alternatives"""
+    return next(group for group in match.groups() if group is not None)
+
+
+def _usage(text, profile, layout_usage=None):
+    """(monthly_usage_kwh, usage_breakdown, confidence)"""
+    if profile.usage_method == 'column':
+        if layout_usage and layout_usage.get('values'):
+            # Summed from word boxes aligned under the column header - exact, not inferred from flat text
+            values = list(layout_usage['values'])
+            return sum(values), values, 0.98
+        values = _billed_usage_column(text)
+        if values:
+            return sum(values), values, 0.9
+    match = LABELED_USAGE_RE.search(text)
+    if match:
+        return _to_int(match.group(1)), [], profile.usage_confidence if profile.usage_method == 'labeled' else 0.85
+    return 0, [], 0.0
+
+
+def _poid(text, profile):
+    if profile.poid == 'none':
+        # This utility's bills don't carry a POID - empty is the right answer
+        return '', 0.95
+    if profile.poid_pattern:
+        match = profile.poid_pattern.search(text)
+        if match:
+            return _first_group(match), profile.poid_confidence
+    return '', 0.0
+
+
+def _account_number(text, profile):
+    if profile.account_pattern:
+        match = profile.account_pattern.search(text)
+        if match:
+            return _first_group(match), 0.95
+    return detect_account_number(text)
+
+
+def _search(pattern, text, confidence):
+    match = pattern.search(text)
+    return (match.group(1).strip(' ,'), confidence) if match else ('', 0.0)
+
+
+def extract_with_rules(text, layout_usage=None):
+    """
+    Apply the rules to normalized OCR text: {field: (value, confidence)} for every field in FIELDS.
+    layout_usage is the OCR metadata's geometric "Billed Usage" result, preferred for column-usage utilities.
+    """
+    # Unknown utility - only the utility-independent rules apply
+    profile = classify_utility(text) or GENERIC_PROFILE
+    monthly_usage, breakdown, usage_confidence = _usage(text, profile, layout_usage)
+    results = {
+        'utility_name': (profile.name, 0.95 if profile.name else 0.0),
+        'customer_name': _search(CUSTOMER_NAME_RE, text, 0.85),
+        'account_number': _account_number(text, profile),
+        'poid': _poid(text, profile),
+        'monthly_usage_kwh': (monthly_usage, usage_confidence),
+        'usage_breakdown': (breakdown, usage_confidence),
+        'service_address': _search(SERVICE_ADDRESS_RE, text, 0.9),
+    }
+    # Word-box usage is cross-checked against the flat-text reading of the same column
+    text_column = _billed_usage_column(text) if layout_usage and profile.usage_method == 'column' else None
+    return score_fields(results, text, profile, text_column)
+
+
+def split_confident(rule_results, min_confidence=None):
+    """Split rule output into ({field: value} taken as-is, [fields still needed from the LLM])"""
+    confident, missing = {}, []
+    for field in FIELDS:
+        value, confidence = rule_results[field]
+        threshold = min_confidence if min_confidence is not None else FIELD_MIN_CONFIDENCE.get(field, RULE_MIN_CONFIDENCE)
+        if confidence >= threshold:
+            confident[field] = value
+        else:
+            missing.append(field)
+    return confident, missing
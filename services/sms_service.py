@@ -11,14 +11,25 @@ class SMSService:
         self.from_number = os.getenv('TWILIO_FROM_NUMBER')
         self.internal_numbers = os.getenv('TWILIO_INTERNAL_NUMBERS', '').split(',')
         
+        self._client = None
+        self._client_pid = None
+        
         if not all([self.account_sid, self.auth_token, self.from_number]):
             print("Warning: Twilio credentials not fully configured")
-            self.client = None
             self.validator = None
         else:
-            self.client = Client(self.account_sid, self.auth_token)
             self.validator = RequestValidator(self.auth_token)
     
+    @property
+    def client(self):
+        """Twilio client, created on first use in each process (its HTTP session must not cross fork)"""
+        if not all([self.account_sid, self.auth_token, self.from_number]):
+            return None
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = Client(self.account_sid, self.auth_token)
+            self._client_pid = os.getpid()
+        return self._client
+    
     def send_customer_verification_sms(self, customer_phone, customer_name):
         """Send verification SMS to customer asking to confirm participation"""
         if not self.client:
@@ -66,15 +77,15 @@ GreenWatt USA Team
                 'timestamp': datetime.now().isoformat()
             }
     
-    def send_internal_notification_sms(self, submission_data):
-        """Send notification SMS to internal team about new submission"""
+    def send_internal_notification_sms(self, submission_data, numbers=None):
+        """Send notification SMS to internal team about new submission (optionally only to `numbers`)"""
         if not self.client or not self.internal_numbers:
             print("SMS service not configured - skipping internal notification SMS")
             return False
             
         results = []
         
-        for phone in self.internal_numbers:
+        for phone in (numbers if numbers is not None else self.internal_numbers):
             if not phone.strip():
                 continue
                 
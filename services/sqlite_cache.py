@@ -0,0 +1,87 @@
+import json
+import time
+
+from .job_store import local_db_connection
+
+
+class SQLiteKVCache:
+    """
+    JSON values keyed by string in a local SQLite table shared by every worker.
+
+    Entries expire ttl_seconds after they were written, and the least
+    recently used are evicted beyond max_entries. Entries written under a
+    different `version` are never returned and are dropped on the next eviction.
+    """
+
+    def __init__(self, db_path, table, ttl_seconds, max_entries, version=1):
+        self.db_path = db_path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = version
+        self._init_schema()
+
+    def _init_schema(self):
+        with local_db_connection(self.db_path) as conn:
+            columns = {row['name'] for row in conn.execute(f"PRAGMA table_info({self.table})")}
+            if columns and 'cache_key' not in columns:
+                # Written by an older table layout - it's only a cache, so start over
+                conn.execute(f"DROP TABLE {self.table}")
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    cache_key   TEXT PRIMARY KEY,
+                    version     INTEGER NOT NULL,
+                    value       TEXT NOT NULL,
+                    created_at  REAL NOT NULL,
+                    last_hit_at REAL NOT NULL,
+                    hits        INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_{self.table}_lru ON {self.table}(last_hit_at);
+            """)
+
+    def get(self, cache_key):
+        """Cached value for this key, or None"""
+        now = time.time()
+        with local_db_connection(self.db_path) as conn:
+            row = conn.execute(
+                f"SELECT value FROM {self.table} WHERE cache_key = ? AND version = ? AND created_at >= ?",
+                (cache_key, self.version, now - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                f"UPDATE {self.table} SET last_hit_at = ?, hits = hits + 1 WHERE cache_key = ?",
+                (now, cache_key)
+            )
+        return json.loads(row['value'])
+
+    def put(self, cache_key, value):
+        now = time.time()
+        with local_db_connection(self.db_path) as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (cache_key, version, value, created_at, last_hit_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key, self.version, json.dumps(value), now, now)
+            )
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond max_entries. Returns the number removed."""
+        with local_db_connection(self.db_path) as conn:
+            removed = conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ? OR version != ?",
+                (time.time() - self.ttl_seconds, self.version)
+            ).rowcount
+            removed += conn.execute(
+                f"DELETE FROM {self.table} WHERE cache_key NOT IN "
+                f"(SELECT cache_key FROM {self.table} ORDER BY last_hit_at DESC LIMIT ?)",
+                (self.max_entries,)
+            ).rowcount
+        return removed
+
+    def stats(self):
+        with local_db_connection(self.db_path) as conn:
+            row = conn.execute(
+                f"SELECT COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS hits FROM {self.table}"
+            ).fetchone()
+        return {'entries': row['entries'], 'hits': row['hits']}
@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class StageGraphError(Exception):
+    """Raised when a stage graph is malformed or a stage fails"""
+
+    def __init__(self, stage, error):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class StageGraph:
+    """
+    Runs pipeline stages as a dependency graph.
+
+    Each stage is a callable taking a dict of its dependencies' results.
+    A stage starts as soon as every stage it depends on has finished, so
+    independent work (OCR, Drive folder creation, agent lookup...) overlaps
+    and total wall-clock time approaches the critical path.
+    """
+
+    def __init__(self, name="pipeline"):
+        self.name = name
+        self._stages = OrderedDict()   # name -> (func, depends_on)
+
+    def add_stage(self, name, func, depends_on=()):
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage '{name}'")
+        for dependency in depends_on:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'")
+        self._stages[name] = (func, tuple(depends_on))
+        return self
+
+    @property
+    def stages(self):
+        return list(self._stages)
+
+    def dependencies(self, name):
+        return self._stages[name][1]
+
+    def run(self, max_workers=4, on_stage_start=None, on_stage_complete=None):
+        """
+        Execute all stages and return {stage_name: result}.
+        on_stage_start(name) and on_stage_complete(name, result, seconds) are
+        optional callbacks. The first failing stage cancels everything not yet
+        started and is re-raised as StageGraphError.
+        """
+        results = {}
+        remaining = OrderedDict(self._stages)
+        running = {}   # future -> (name, started_at)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{self.name}-stage") as executor:
+            while remaining or running:
+                # Launch every stage whose dependencies are all satisfied
+                for name, (func, depends_on) in list(remaining.items()):
+                    if all(dep in results for dep in depends_on):
+                        del remaining[name]
+                        if on_stage_start:
+                            on_stage_start(name)
+                        inputs = {dep: results[dep] for dep in depends_on}
+                        running[executor.submit(func, inputs)] = (name, time.time())
+
+                if not running:
+                    # Only possible if the remaining stages depend on each other
+                    raise StageGraphError(next(iter(remaining)), "unsatisfiable dependencies")
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, started_at = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        for pending in running:
+                            pending.cancel()
+                        raise StageGraphError(name, e) from e
+                    if on_stage_complete:
+                        on_stage_complete(name, results[name], time.time() - started_at)
+
+        return results
@@ -0,0 +1,187 @@
+"""
+Per-utility extraction profiles and the classifier that picks one.
+
+A profile says how a utility's bills are read: the keywords that identify
+it, how usage is laid out, account/POID patterns, extra trimming anchors,
+how many pages are worth scanning, and a hint added to the LLM prompt.
+
+The built-in profiles below can be extended or overridden from the
+Utility_Profiles tab of the Dynamic Form Revisions sheet (next to the
+Utilities tab) - one row per utility, blank cells keep the built-in value:
+
+    utility_name | keywords | poid | usage_method | account_regex | poid_regex | max_pages | prompt_hint
+
+keywords are literal phrases separated by "|"; poid is required / none /
+optional; usage_method is column (sum a "Billed Usage" table) or labeled.
+"""
+
+import re
+
+POID_MODES = ('required', 'none', 'optional')
+USAGE_METHODS = ('column', 'labeled')
+
+DEFAULT_MAX_PAGES = 10
+
+
+class UtilityProfile:
+    def __init__(self, name, keywords, poid='optional', usage_method='labeled', usage_confidence=0.85,
+                 account_regex=None, poid_regex=None, poid_confidence=0.9, anchors=None,
+                 max_pages=DEFAULT_MAX_PAGES, prompt_hint=''):
+        self.name = name
+        self.keywords = list(keywords)
+        self.poid = poid
+        self.usage_method = usage_method
+        self.usage_confidence = usage_confidence
+        self.account_pattern = re.compile(account_regex, re.IGNORECASE) if account_regex else None
+        self.poid_pattern = re.compile(poid_regex) if poid_regex else None
+        self.poid_confidence = poid_confidence
+        self.anchor_pattern = re.compile(anchors, re.IGNORECASE) if anchors else None
+        self.max_pages = max_pages
+        self.prompt_hint = prompt_hint
+
+    @property
+    def poid_required(self):
+        return self.poid == 'required'
+
+    def __repr__(self):
+        return f"UtilityProfile({self.name!r})"
+
+
+DEFAULT_PROFILES = [
+    UtilityProfile(
+        'RG&E', ['RG&E', 'rge', 'Rochester Gas'],
+        poid='required', usage_method='column',
+        # POID label, or the bare POID printed right before the meter table when the label is lost in OCR
+        poid_regex=r'Po[Dd] ID:?\s*(R\d{14})|\b(R\d{14})(?=\s*Meter Number)', poid_confidence=0.95,
+        anchors=r'Meter Number', max_pages=4,
+        prompt_hint='This is an RG&E bill: the POID is "R" followed by 14 digits (not the 10-digit meter number '
+                    'starting with 035), and usage is the sum of the Billed Usage column.',
+    ),
+    UtilityProfile(
+        'NYSEG', ['NYSEG'],
+        poid='required', usage_method='column',
+        poid_regex=r'(?:Po[Dd] ID|Point of Delivery ID):?\s*([A-Z]?\d{8,20})',
+        anchors=r'Meter Number', max_pages=4,
+        prompt_hint='This is a NYSEG bill: the PoD ID is in the top right section, and usage is the sum of the '
+                    'Billed Usage column.',
+    ),
+    UtilityProfile(
+        'National Grid', ['National Grid', 'nationalgridus'],
+        poid='none', usage_method='labeled', usage_confidence=0.9,
+        account_regex=r'Account\s*(?:Number|No\.?)\s*:?\s*(\d{5}-\d{5})',
+        max_pages=3,
+        prompt_hint='This is a National Grid bill: it has no POID, and usage is the single monthly kWh value.',
+    ),
+    UtilityProfile('Con Edison', ['Con Edison', 'ConEd', 'Con Ed']),
+    UtilityProfile('PSEG', ['PSEG']),
+    UtilityProfile('Orange & Rockland', ['Orange & Rockland', 'Orange and Rockland', 'O&R', 'oru.com']),
+    UtilityProfile('Central Hudson', ['Central Hudson', 'cenhud']),
+    UtilityProfile('PG&E', ['PG&E', 'pge.com']),
+]
+
+
+def _keyword_pattern(keyword):
+    """Literal keyword -> regex: flexible whitespace, word boundaries on alphanumeric ends"""
+    pattern = r'\s*'.join(re.escape(part) for part in keyword.split())
+    if keyword[:1].isalnum():
+        pattern = r'\b' + pattern
+    if keyword[-1:].isalnum():
+        pattern += r'\b'
+    return pattern
+
+
+class UtilityClassifier:
+    """
+    Finds every utility keyword in one pass with a single compiled alternation
+    (one named group per profile). The utility mentioned most often wins; ties
+    go to the one mentioned first.
+    """
+
+    def __init__(self, profiles):
+        self.profiles = list(profiles)
+        alternatives = [
+            f"(?P<p{index}>{'|'.join(_keyword_pattern(keyword) for keyword in profile.keywords)})"
+            for index, profile in enumerate(self.profiles) if profile.keywords
+        ]
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def classify(self, text):
+        """Best-matching profile for the text, or None"""
+        if not self.pattern or not text:
+            return None
+        hits, first_seen = {}, {}
+        for match in self.pattern.finditer(text):
+            index = int(match.lastgroup[1:])
+            hits[index] = hits.get(index, 0) + 1
+            first_seen.setdefault(index, match.start())
+        if not hits:
+            return None
+        best = max(hits, key=lambda index: (hits[index], -first_seen[index]))
+        return self.profiles[best]
+
+
+def _text(row, key):
+    return (row.get(key) or '').strip()
+
+
+def profiles_from_rows(rows, base_profiles=None):
+    """
+    Merge Utility_Profiles sheet rows (dicts keyed by the header row) over the
+    built-in profiles. Invalid rows or cells are reported and skipped.
+    """
+    profiles = {profile.name: profile for profile in (base_profiles or DEFAULT_PROFILES)}
+    for row in rows or []:
+        name = _text(row, 'utility_name')
+        if not name:
+            continue
+        base = profiles.get(name)
+        try:
+            keywords = [keyword.strip() for keyword in _text(row, 'keywords').split('|') if keyword.strip()]
+            poid = _text(row, 'poid').lower() or (base.poid if base else 'optional')
+            usage_method = _text(row, 'usage_method').lower() or (base.usage_method if base else 'labeled')
+            if poid not in POID_MODES or usage_method not in USAGE_METHODS:
+                raise ValueError(f"poid must be one of {POID_MODES}, usage_method one of {USAGE_METHODS}")
+            max_pages = _text(row, 'max_pages')
+            profiles[name] = UtilityProfile(
+                name,
+                keywords or (base.keywords if base else [name]),
+                poid=poid,
+                usage_method=usage_method,
+                usage_confidence=base.usage_confidence if base else 0.85,
+                account_regex=_text(row, 'account_regex') or (base.account_pattern.pattern if base and base.account_pattern else None),
+                poid_regex=_text(row, 'poid_regex') or (base.poid_pattern.pattern if base and base.poid_pattern else None),
+                poid_confidence=base.poid_confidence if base else 0.9,
+                anchors=base.anchor_pattern.pattern if base and base.anchor_pattern else None,
+                max_pages=int(max_pages) if max_pages else (base.max_pages if base else DEFAULT_MAX_PAGES),
+                prompt_hint=_text(row, 'prompt_hint') or (base.prompt_hint if base else ''),
+            )
+        except (ValueError, re.error) as e:
+            print(f"⚠️  Ignoring Utility_Profiles row for {name}: {e}")
+    return list(profiles.values())
+
+
+_classifier = UtilityClassifier(DEFAULT_PROFILES)
+_configured_rows = None
+
+
+def configure_profiles(rows):
+    """Rebuild the classifier from Utility_Profiles sheet rows (no-op when they haven't changed)"""
+    global _classifier, _configured_rows
+    key = repr(rows)
+    if key == _configured_rows:
+        return
+    _classifier = UtilityClassifier(profiles_from_rows(rows))
+    _configured_rows = key
+    print(f"📋 Loaded {len(_classifier.profiles)} utility profile(s) ({len(rows or [])} from the sheet)")
+
+
+def classify_utility(text):
+    """Profile of the utility that issued this bill, or None"""
+    return _classifier.classify(text)
+
+
+def profile_for(name):
+    for profile in _classifier.profiles:
+        if profile.name == name:
+            return profile
+    return None
@@ -0,0 +1,106 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from google.cloud import vision
+
+
+class _PendingImage:
+    __slots__ = ('content', 'image_context', 'future')
+
+    def __init__(self, content, image_context):
+        self.content = content
+        self.image_context = image_context
+        self.future = Future()
+
+
+class VisionBatcher:
+    """
+    Micro-batches document_text_detection requests.
+
+    Callers (pages of one PDF, or pages from several in-flight submissions)
+    block in annotate(); a collector thread waits up to max_wait_ms after the
+    first image for more to arrive, then sends up to max_batch images in one
+    batch_annotate_images RPC and routes each response back to its caller.
+    """
+
+    def __init__(self, client_getter, max_batch=16, max_wait_ms=10, max_batch_bytes=8 * 1024 * 1024,
+                 max_concurrent_batches=4):
+        self.client_getter = client_getter
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_bytes = max_batch_bytes
+        self.max_concurrent_batches = max_concurrent_batches
+        self._queue = queue.Queue()
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._executor = None
+
+    def _ensure_started(self):
+        """Start the collector in this process (threads don't survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                                thread_name_prefix="vision-batch")
+            thread = threading.Thread(target=self._collect_loop, name="vision-batcher", daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def annotate(self, content, image_context=None, timeout=120):
+        """OCR one encoded image; returns its AnnotateImageResponse"""
+        self._ensure_started()
+        pending = _PendingImage(content, image_context)
+        self._queue.put(pending)
+        return pending.future.result(timeout=timeout)
+
+    def _collect_loop(self):
+        carry = None
+        while True:
+            first = carry or self._queue.get()
+            carry = None
+            batch, batch_bytes = [first], len(first.content)
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if batch_bytes + len(pending.content) > self.max_batch_bytes:
+                    # Keep the RPC under the request size limit - this image opens the next batch
+                    carry = pending
+                    break
+                batch.append(pending)
+                batch_bytes += len(pending.content)
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            requests = []
+            for pending in batch:
+                request = vision.AnnotateImageRequest(
+                    image=vision.Image(content=pending.content),
+                    features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
+                )
+                if pending.image_context is not None:
+                    request.image_context = pending.image_context
+                requests.append(request)
+            print(f"🔍 VISION BATCH: sending {len(batch)} image(s) in one request")
+            response = self.client_getter().batch_annotate_images(requests=requests)
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        for pending, image_response in zip(batch, response.responses):
+            pending.future.set_result(image_response)
+        for pending in batch[len(response.responses):]:
+            pending.future.set_exception(RuntimeError("Vision batch returned fewer responses than requests"))
@@ -6,12 +6,60 @@ from PIL import Image
 import time
 import gc
 import tempfile
+import itertools
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
+import re
+from .field_detectors import detect_fields, missing_fields
+from .utility_profiles import classify_utility
+from .image_preprocessor import preprocess_for_vision
+from .vision_batcher import VisionBatcher
+from .layout_usage import words_from_annotation, billed_usage_from_words
+
+# Stop scanning pages once the field detectors have found everything the LLM needs
+OCR_EARLY_EXIT = os.getenv('OCR_EARLY_EXIT', 'true').lower() == 'true'
+
+# Gather concurrent page OCR requests (across submissions too) into batch_annotate_images calls
+VISION_BATCHING = os.getenv('VISION_BATCHING', 'true').lower() == 'true'
+VISION_BATCH_SIZE = min(16, int(os.getenv('VISION_BATCH_SIZE', '16')))  # API limit is 16 images
+VISION_BATCH_WAIT_MS = int(os.getenv('VISION_BATCH_WAIT_MS', '10'))
+
+# Vision calls in flight per PDF (also the number of rendered pages held in memory)
+OCR_PAGE_CONCURRENCY = max(1, int(os.getenv('OCR_PAGE_CONCURRENCY', '3')))
+
+# Embedded text shorter than this is treated as missing (scanned page with no text layer)
+MIN_TEXT_LAYER_CHARS = int(os.getenv('MIN_TEXT_LAYER_CHARS', '80'))
+
+_WORD_RE = re.compile(r'[A-Za-z]{3,}')
+_VOWEL_RE = re.compile(r'[aeiouyAEIOUY]')
+
+def text_layer_usable(text):
+    """Whether a PDF page's embedded text looks like real text rather than a missing or garbled layer"""
+    stripped = (text or '').strip()
+    if len(stripped) < MIN_TEXT_LAYER_CHARS:
+        return False
+    
+    # Fonts without a Unicode map extract as (cid:NN) or replacement characters
+    if '(cid:' in stripped or stripped.count('\ufffd') > len(stripped) * 0.01:
+        return False
+    
+    # Mostly letters, digits, whitespace and ordinary punctuation
+    readable = sum(1 for ch in stripped if ch.isalnum() or ch.isspace() or ch in '.,:;$%#&/()-\'"*+@')
+    if readable < len(stripped) * 0.9:
+        return False
+    
+    # Real words contain vowels; glyph-shifted encodings mostly don't
+    words = _WORD_RE.findall(stripped)
+    if len(words) < 5:
+        return False
+    return sum(1 for word in words if _VOWEL_RE.search(word)) >= len(words) * 0.6
 
 class VisionOCRService:
     # Class-level client to reuse across requests
     _client = None
     _credentials = None
+    _batcher = None
     
     def __init__(self, service_account_info):
         """Initialize Google Cloud Vision client with service account credentials"""
@@ -39,25 +87,58 @@ class VisionOCRService:
             print("✅ Created shared Vision API client")
         return cls._client
     
-    def extract_text_from_image(self, image_path):
-        """Extract text from image using Vision API document_text_detection"""
+    @classmethod
+    def _get_batcher(cls):
+        """Get or create the shared request batcher"""
+        if not cls._batcher:
+            cls._batcher = VisionBatcher(cls._get_client, max_batch=VISION_BATCH_SIZE,
+                                         max_wait_ms=VISION_BATCH_WAIT_MS)
+        return cls._batcher
+    
+    @classmethod
+    def _reset_after_fork(cls):
+        """gRPC channels must not be shared across fork - each worker builds its own client"""
+        cls._client = None
+        cls._batcher = None
+    
+    def extract_text_from_image(self, image_path, words=None):
+        """Extract text from image using Vision API document_text_detection (word boxes are appended to `words` if given)"""
+        print(f"🔍 VISION EXTRACT: Reading file: {image_path}")
         try:
-            print(f"🔍 VISION EXTRACT: Reading file: {image_path}")
             with io.open(image_path, 'rb') as image_file:
                 content = image_file.read()
+        except Exception as e:
+            print(f"🔍 VISION EXTRACT ERROR: {e}")
+            return ""
+        
+        print(f"🔍 VISION EXTRACT: File read successfully, {len(content)} bytes")
+        return self.extract_text_from_bytes(content, words)
+    
+    def extract_text_from_bytes(self, content, words=None):
+        """
+        Extract text from encoded image bytes (PNG/JPEG) using Vision API document_text_detection.
+        If a words list is passed, the word bounding boxes are appended to it as (x0, y0, x1, y1, text).
+        """
+        try:
+            # Rotate, deskew, downscale and JPEG-encode - Vision only needs legible text
+            content, prep = preprocess_for_vision(content)
+            if prep['preprocessed']:
+                print(f"🔍 VISION EXTRACT: Preprocessed image {prep['original_bytes']} -> {prep['processed_bytes']} bytes "
+                      f"(scale {prep['scale']}, deskew {prep['deskew_degrees']}°)")
             
-            print(f"🔍 VISION EXTRACT: File read successfully, {len(content)} bytes")
-            
-            image = vision.Image(content=content)
-            client = self._get_client()
+            image_context = vision.ImageContext(language_hints=["en"])
             
             print(f"🔍 VISION EXTRACT: About to call Vision API document_text_detection")
             
             # Use document_text_detection for better utility bill reading
-            response = client.document_text_detection(
-                image=image,
-                image_context=vision.ImageContext(language_hints=["en"])
-            )
+            if VISION_BATCHING:
+                # Concurrent pages share one batch_annotate_images RPC
+                response = self._get_batcher().annotate(content, image_context)
+            else:
+                response = self._get_client().document_text_detection(
+                    image=vision.Image(content=content),
+                    image_context=image_context
+                )
             
             print(f"🔍 VISION EXTRACT: Vision API call completed")
             
@@ -71,6 +152,9 @@ class VisionOCRService:
             texts = response.text_annotations
             print(f"🔍 VISION EXTRACT: Text annotations count: {len(texts) if texts else 0}")
             
+            if words is not None:
+                words.extend(words_from_annotation(response.full_text_annotation))
+            
             if texts:
                 result_text = texts[0].description
                 print(f"🔍 VISION EXTRACT: Extracted text length: {len(result_text) if result_text else 0}")
@@ -89,19 +173,163 @@ class VisionOCRService:
             del content
             gc.collect()
     
-    def extract_text_from_pdf(self, pdf_path):
-        """Extract text from PDF using Vision API - simplified approach to avoid gRPC issues"""
+    def extract_text_from_pdf(self, pdf_path, metadata=None):
+        """Extract the text of a PDF (see iter_pdf_text), concatenated in page order"""
+        return "".join(text + "\n" for _, text in self.iter_pdf_text(pdf_path, metadata))
+    
+    def iter_pdf_text(self, pdf_path, metadata=None):
+        """
+        Yield (page_number, text) for each page of a PDF as soon as it is read, in page order.
+        Pages with a usable embedded text layer (utility-generated PDFs) are read
+        directly; only scanned or garbled pages are rasterized in memory with
+        PyMuPDF and sent to Vision, up to OCR_PAGE_CONCURRENCY pages at a time.
+        The scan stops early once the cheap field detectors have found every
+        required field, or at the utility profile's page limit. With early exit
+        on, pages are read ahead one per field still missing, so few Vision
+        calls are spent on pages past the one that completes the set.
+        If a metadata dict is passed, the route taken for each page and the
+        number of Vision requests made are recorded in it.
+        """
+        metadata = metadata if metadata is not None else {}
+        metadata.update({'source': 'pdf', 'rasterizer': 'pymupdf', 'pages': [], 'early_exit': False,
+                         'vision_requests': 0})
         try:
-            # Use the simpler fallback method directly to avoid gRPC async issues
-            print("Processing PDF with Vision API (image conversion method)...")
-            return self._fallback_pdf_to_images(pdf_path)
+            file_size = os.path.getsize(pdf_path)
+            print(f"PDF file size: {file_size / (1024*1024):.1f} MB")
+            if file_size > 50 * 1024 * 1024:  # 50MB limit
+                print("PDF file too large (>50MB), skipping conversion")
+                return
+            
+            try:
+                pages = self._iter_pdf_pages(pdf_path, metadata)
+                # Open the document now so a broken PyMuPDF install falls back before any OCR
+                first_page = next(pages, None)
+            except Exception as e:
+                print(f"PyMuPDF unavailable ({e}) - falling back to pdf2image")
+                yield 1, self._fallback_pdf_to_images(pdf_path, metadata)
+                return
+            
+            full_text = ""
+            remaining_pages = [first_page] if first_page is not None else []
+            # Pages still to be assembled, in order: (page_number, route, text or Future, words).
+            # At most OCR_PAGE_CONCURRENCY pages are rendered ahead of the assembly point,
+            # which caps both Vision calls in flight and decoded page images in memory.
+            window = collections.deque()
+            # Page 1 usually completes the fields on its own - start with it alone
+            lookahead = 1 if OCR_EARLY_EXIT else OCR_PAGE_CONCURRENCY
+            page_limit = None  # Set once the utility is recognised
+            page_source = itertools.chain(remaining_pages, pages)
+            with ThreadPoolExecutor(max_workers=OCR_PAGE_CONCURRENCY, thread_name_prefix="vision-page") as executor:
+                try:
+                    while True:
+                        while len(window) < lookahead:
+                            page = next(page_source, None)
+                            if page is None or (page_limit and page[0] > page_limit):
+                                break
+                            started = self._start_page_text(page, executor)
+                            if started[1] == 'vision':
+                                metadata['vision_requests'] += 1
+                            window.append(started)
+                        if not window:
+                            break
+                        
+                        page_number, route, pending, words = window.popleft()
+                        text = pending.result() if route == 'vision' else pending
+                        metadata['pages'].append({'page': page_number, 'route': route, 'chars': len(text),
+                                                  'words': len(words)})
+                        full_text += text + "\n"
+                        _record_layout_usage(metadata, page_number, words)
+                        yield page_number, text
+                        
+                        # The utility's profile caps how many pages of its statements are worth reading
+                        if 'utility_profile' not in metadata:
+                            profile = classify_utility(full_text)
+                            if profile:
+                                metadata['utility_profile'] = profile.name
+                                page_limit = profile.max_pages
+                        if page_limit and page_number >= page_limit:
+                            metadata['page_limit_reached'] = True
+                            print(f"Reached the {metadata['utility_profile']} page limit ({page_limit}) - skipping remaining pages")
+                            break
+                        
+                        # Account number, POID and usage are usually on pages 1-2 of a long statement
+                        if OCR_EARLY_EXIT:
+                            detected = detect_fields(full_text)
+                            missing = missing_fields(detected)
+                            if not missing:
+                                metadata['early_exit'] = True
+                                metadata['detected_fields'] = {field: round(conf, 2) for field, (_, conf) in detected.items()}
+                                print(f"Required fields found after page {page_number} - skipping remaining pages")
+                                break
+                            # Expect each further page to turn up at least one missing field
+                            lookahead = min(OCR_PAGE_CONCURRENCY, len(missing))
+                finally:
+                    # Also runs when the consumer stops iterating early
+                    metadata['vision_requests'] -= self._stop_page_window(window, pages)
+            
+            vision_pages = sum(1 for page in metadata['pages'] if page['route'] == 'vision')
+            print(f"PDF processing complete. Extracted {len(full_text)} characters "
+                  f"({vision_pages}/{len(metadata['pages'])} page(s) read with Vision, "
+                  f"{metadata['vision_requests']} Vision request(s) made)")
             
         except Exception as e:
             print(f"Vision PDF OCR Error: {e}")
-            return ""
     
-    def _fallback_pdf_to_images(self, pdf_path):
-        """Fallback method: convert PDF pages to images and process with Vision"""
+    @staticmethod
+    def _stop_page_window(window, pages):
+        """
+        Cancel page OCR that hasn't started and stop rendering further pages.
+        Returns how many Vision requests were cancelled before being sent.
+        """
+        cancelled = 0
+        for _, route, later, _ in window:
+            if route == 'vision' and later.cancel():
+                cancelled += 1
+        pages.close()
+        return cancelled
+    
+    def _iter_pdf_pages(self, pdf_path, metadata, max_pages=10):
+        """
+        Yield (page_number, page) for each page up to max_pages.
+        The PDF is opened once and processed in-process - no poppler subprocesses or temp files.
+        """
+        import fitz  # PyMuPDF
+        
+        doc = fitz.open(pdf_path)
+        try:
+            page_count = doc.page_count
+            metadata['page_count'] = page_count
+            print(f"PDF has {page_count} pages")
+            for page_index in range(min(page_count, max_pages)):
+                yield page_index + 1, doc[page_index]
+        finally:
+            doc.close()
+    
+    def _start_page_text(self, numbered_page, executor, dpi=150):
+        """
+        Begin extracting one PDF page: returns (page_number, route, text, words) when the
+        embedded text layer is usable, otherwise (page_number, 'vision', Future, words)
+        with words filled in once the Future completes.
+        Rendering stays on the calling thread - a PyMuPDF document isn't thread-safe.
+        """
+        page_number, page = numbered_page
+        embedded_text = page.get_text("text")
+        if text_layer_usable(embedded_text):
+            print(f"Page {page_number}: using embedded text layer ({len(embedded_text)} chars) - Vision skipped")
+            words = [tuple(word[:5]) for word in page.get_text("words")]
+            return page_number, 'text_layer', embedded_text, words
+        
+        print(f"Page {page_number}: no usable text layer - rendering for Vision")
+        pix = page.get_pixmap(dpi=dpi)
+        png_bytes = pix.tobytes("png")
+        pix = None  # Release the raw pixel buffer before OCR
+        words = []
+        return page_number, 'vision', executor.submit(self.extract_text_from_bytes, png_bytes, words), words
+    
+    def _fallback_pdf_to_images(self, pdf_path, metadata=None):
+        """Fallback method: convert PDF pages to images with pdf2image/poppler and process with Vision"""
+        metadata = metadata if metadata is not None else {}
+        metadata.update({'source': 'pdf', 'rasterizer': 'pdf2image', 'pages': []})
         try:
             from pdf2image import convert_from_path
             print("Using fallback: PDF to images conversion")
@@ -155,6 +383,7 @@ class VisionOCRService:
                             # Extract text from this page using Vision
                             page_text = self.extract_text_from_image(temp_image_path)
                             full_text += page_text + "\n"
+                            metadata['pages'].append({'page': page_num, 'route': 'vision', 'chars': len(page_text)})
                             
                             # Remove temp file immediately
                             try:
@@ -164,6 +393,7 @@ class VisionOCRService:
                         
                 except Exception as e:
                     print(f"Error processing PDF pages individually: {e}")
+                    metadata['pages'] = []
                     # Fallback to all-at-once conversion if page-by-page fails
                     pages = convert_from_path(
                         pdf_path, 
@@ -180,6 +410,7 @@ class VisionOCRService:
                         
                         page_text = self.extract_text_from_image(temp_image_path)
                         full_text += page_text + "\n"
+                        metadata['pages'].append({'page': i + 1, 'route': 'vision', 'chars': len(page_text)})
                         
                         try:
                             os.remove(temp_image_path)
@@ -203,8 +434,19 @@ class VisionOCRService:
         finally:
             gc.collect()
 
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=VisionOCRService._reset_after_fork)
+
 def process_utility_bill_with_vision(file_path, service_account_info):
     """Main function to process utility bill using Google Vision API"""
+    return extract_bill_text(file_path, service_account_info)[0]
+
+def iter_bill_text(file_path, service_account_info, metadata):
+    """
+    Yield (page_number, text) for each page of a utility bill as it is read.
+    metadata (a dict) is filled in as pages arrive - per-page routes, early
+    exit, layout usage - and summarized once the last page has been yielded.
+    """
     try:
         print(f"🔍 VISION DEBUG: Starting Vision API processing")
         print(f"🔍 VISION DEBUG: File path: {file_path}")
@@ -217,26 +459,67 @@ def process_utility_bill_with_vision(file_path, service_account_info):
             
             if file_path.lower().endswith('.pdf'):
                 print("Processing PDF with Google Vision API...")
-                raw_text = vision_service.extract_text_from_pdf(file_path)
+                yield from vision_service.iter_pdf_text(file_path, metadata)
             else:
                 print("Processing image with Google Vision API...")
-                raw_text = vision_service.extract_text_from_image(file_path)
+                words = []
+                raw_text = vision_service.extract_text_from_image(file_path, words)
+                metadata.update({'source': 'image',
+                                 'pages': [{'page': 1, 'route': 'vision', 'chars': len(raw_text), 'words': len(words)}]})
+                _record_layout_usage(metadata, 1, words)
+                yield 1, raw_text
                 
             print(f"🔍 VISION DEBUG: Vision API call completed")
-            print(f"🔍 VISION DEBUG: Raw text type: {type(raw_text)}")
-            print(f"🔍 VISION DEBUG: Raw text length: {len(raw_text) if raw_text else 0}")
-        
-        print("="*50)
-        print("GOOGLE VISION OCR TEXT:")
-        print(raw_text if raw_text else "EMPTY/NONE")
-        print("="*50)
-        
-        return raw_text
-        
     except Exception as e:
         print(f"🔍 VISION ERROR: {e}")
         import traceback
         traceback.print_exc()
-        return ""
     finally:
+        _summarize_routes(metadata)
         gc.collect()
+
+def extract_bill_text(file_path, service_account_info):
+    """
+    Extract the raw text of a utility bill.
+    Returns (raw_text, metadata); metadata records the route taken for each page
+    (embedded text layer vs. Vision OCR) so we can measure how often Vision is skipped.
+    """
+    metadata = {}
+    raw_text = "".join(text + "\n" for _, text in iter_bill_text(file_path, service_account_info, metadata))
+    
+    print("="*50)
+    print("GOOGLE VISION OCR TEXT:")
+    print(raw_text if raw_text else "EMPTY/NONE")
+    print("="*50)
+    
+    return raw_text, metadata
+
+def _record_layout_usage(metadata, page_number, words):
+    """Store the first page's geometric "Billed Usage" column readings in the OCR metadata"""
+    if 'layout_usage' in metadata or not words:
+        return
+    try:
+        values = billed_usage_from_words(words)
+    except Exception as e:
+        print(f"⚠️  Layout usage extraction failed on page {page_number}: {e}")
+        return
+    if values:
+        metadata['layout_usage'] = {'page': page_number, 'values': values, 'total': sum(values)}
+        print(f"📐 Billed Usage column on page {page_number}: {values} -> {sum(values)} kWh")
+
+def _summarize_routes(metadata):
+    """Add page counts and an overall route ('text_layer', 'vision' or 'mixed') to OCR metadata"""
+    pages = metadata.setdefault('pages', [])
+    metadata['vision_pages'] = sum(1 for page in pages if page['route'] == 'vision')
+    metadata['text_layer_pages'] = sum(1 for page in pages if page['route'] == 'text_layer')
+    # Requests whose page was never used (in flight when the scan stopped) still count here
+    metadata.setdefault('vision_requests', metadata['vision_pages'])
+    if not pages:
+        metadata['route'] = 'none'
+    elif metadata['vision_pages'] == 0:
+        metadata['route'] = 'text_layer'
+    elif metadata['text_layer_pages'] == 0:
+        metadata['route'] = 'vision'
+    else:
+        metadata['route'] = 'mixed'
+    return metadata
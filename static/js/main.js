@@ -139,31 +139,86 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Real-time progress tracking variables
     let progressInterval = null;
+    let progressSource = null;
     let progressStartTime = null;
     
-    // Real-time progress polling function
+    // Apply a progress update and stop tracking once processing has finished
+    function handleProgress(progress) {
+        // Update progress UI elements
+        updateProgressUI(progress);
+        
+        // Check if processing is complete
+        if (progress.status === 'completed') {
+            stopProgressTracking();
+            showCompletionResult(progress);
+        } else if (progress.status === 'error') {
+            stopProgressTracking();
+            showErrorResult(progress);
+        }
+    }
+    
+    function stopProgressTracking() {
+        if (progressSource) {
+            progressSource.close();
+            progressSource = null;
+        }
+        clearInterval(progressInterval);
+        progressInterval = null;
+    }
+    
+    // Real-time progress polling function (fallback when streaming is unavailable)
     async function pollProgress(sessionId) {
         try {
             const response = await fetch(`/progress/${sessionId}`);
-            const progress = await response.json();
-            
-            // Update progress UI elements
-            updateProgressUI(progress);
-            
-            // Check if processing is complete
-            if (progress.status === 'completed') {
-                clearInterval(progressInterval);
-                showCompletionResult(progress);
-            } else if (progress.status === 'error') {
-                clearInterval(progressInterval);
-                showErrorResult(progress);
+            if (response.status === 404) {
+                handleSessionGone();
+                return;
             }
+            const progress = await response.json();
+            handleProgress(progress);
         } catch (error) {
             console.error('Error polling progress:', error);
             // Continue polling on network errors (temporary issues)
         }
     }
     
+    function startPolling(sessionId) {
+        if (progressInterval) return;
+        progressInterval = setInterval(() => {
+            pollProgress(sessionId);
+        }, 1000);
+    }
+    
+    // Prefer the server-pushed event stream; fall back to polling every second
+    function trackProgress(sessionId) {
+        if (!window.EventSource) {
+            startPolling(sessionId);
+            return;
+        }
+        
+        let failures = 0;
+        progressSource = new EventSource(`/progress/${sessionId}/stream`);
+        progressSource.onmessage = function(event) {
+            failures = 0;
+            handleProgress(JSON.parse(event.data));
+        };
+        // The session expired or was never known to the server - reconnecting won't help
+        progressSource.addEventListener('gone', handleSessionGone);
+        progressSource.onerror = function() {
+            // The server ends long streams on purpose and the browser reconnects by itself.
+            // Give up on streaming if the connection is refused or keeps failing.
+            failures += 1;
+            if (!progressSource || progressSource.readyState === EventSource.CLOSED || failures > 3) {
+                console.warn('Progress stream unavailable - falling back to polling');
+                if (progressSource) {
+                    progressSource.close();
+                    progressSource = null;
+                }
+                startPolling(sessionId);
+            }
+        };
+    }
+    
     // Update progress UI with real-time data
     function updateProgressUI(progress) {
         const progressFill = document.getElementById('progressFill');
@@ -171,14 +226,18 @@ document.addEventListener('DOMContentLoaded', function() {
         const progressStep = document.getElementById('progressStep');
         const progressDescription = document.getElementById('progressDescription');
         
+        // The server reports `percentage`/`step_description`; the initial local state uses `progress`
+        const percent = progress.percentage !== undefined ? progress.percentage : progress.progress;
+        const description = progress.step_description || progress.description;
+        
         // Update progress bar
-        if (progressFill && progress.progress !== undefined) {
-            progressFill.style.width = `${progress.progress}%`;
+        if (progressFill && percent !== undefined) {
+            progressFill.style.width = `${percent}%`;
         }
         
         // Update percentage text
-        if (progressPercent && progress.progress !== undefined) {
-            progressPercent.textContent = `${Math.round(progress.progress)}%`;
+        if (progressPercent && percent !== undefined) {
+            progressPercent.textContent = `${Math.round(percent)}%`;
         }
         
         // Update step name and description
@@ -186,8 +245,8 @@ document.addEventListener('DOMContentLoaded', function() {
             progressStep.textContent = progress.step_name;
         }
         
-        if (progressDescription && progress.description) {
-            progressDescription.textContent = progress.description;
+        if (progressDescription && description) {
+            progressDescription.textContent = progress.time_text ? `${description} · ${progress.time_text}` : description;
         }
     }
     
@@ -229,6 +288,20 @@ document.addEventListener('DOMContentLoaded', function() {
         `;
     }
     
+    // Show that progress for this submission can no longer be tracked
+    function handleSessionGone() {
+        stopProgressTracking();
+        loading.style.display = 'none';
+        result.style.display = 'block';
+        result.className = 'result error';
+        result.innerHTML = `
+            <h3>Progress Unavailable</h3>
+            <p>This submission's progress has expired or is unknown to the server.</p>
+            <p>It may still have been processed - please check before submitting again.</p>
+            <button onclick="location.reload()" style="margin-top: 20px;">Start Over</button>
+        `;
+    }
+    
     // Format elapsed time for display
     function formatElapsedTime() {
         if (!progressStartTime) return 'Unknown';
@@ -267,10 +340,8 @@ document.addEventListener('DOMContentLoaded', function() {
             const data = await response.json();
             
             if (response.ok && data.session_id) {
-                // Start polling progress every 1 second
-                progressInterval = setInterval(() => {
-                    pollProgress(data.session_id);
-                }, 1000);
+                // Follow progress over the event stream (polling as fallback)
+                trackProgress(data.session_id);
                 
                 // Start with initial progress state
                 updateProgressUI({
@@ -0,0 +1,46 @@
+import re
+
+from services import context_trimmer
+from services.context_trimmer import trim_to_anchors
+
+BOILERPLATE = "Rates are subject to change by order of the Public Service Commission. " * 40
+
+
+def _bill():
+    return ("NYSEG Jane Doe 12 Main St Rochester NY " + BOILERPLATE
+            + "PoD ID: N01000012345678 " + BOILERPLATE
+            + "Billed Usage 400 kWh 250 kWh " + BOILERPLATE)
+
+
+def test_header_and_anchor_windows_are_kept():
+    text = _bill()
+    trimmed, info = trim_to_anchors(text, fields=['poid', 'monthly_usage_kwh'], window=50, header=60)
+    assert info['trimmed'] and info['trimmed_chars'] < len(text) * 0.5
+    assert trimmed.startswith("NYSEG Jane Doe")
+    assert "PoD ID: N01000012345678" in trimmed
+    assert "Billed Usage 400 kWh 250 kWh" in trimmed
+    assert info['windows'] == 3
+
+
+def test_overlapping_windows_are_merged():
+    text = "x" * 1000 + "Account Number 1 Account Holder Jane" + "y" * 1000
+    trimmed, info = trim_to_anchors(text, fields=['account_number', 'customer_name'], window=20, header=10)
+    assert info['windows'] == 2
+    assert trimmed.count(' ... ') == 1
+
+
+def test_profile_anchors_add_windows():
+    text = _bill() + "Meter Number 0351234567 " + BOILERPLATE
+    trimmed, _ = trim_to_anchors(text, fields=['poid'], window=40, header=60,
+                                 extra_anchors=re.compile('Meter Number'))
+    assert "Meter Number 0351234567" in trimmed
+
+
+def test_text_is_kept_whole_when_trimming_would_not_help(monkeypatch):
+    short = "NYSEG Account 123 Billed Usage 400 kWh"
+    assert trim_to_anchors(short, header=600) == (short, {'original_chars': len(short), 'trimmed_chars': len(short),
+                                                          'windows': 0, 'trimmed': False})
+    no_anchors = BOILERPLATE
+    assert trim_to_anchors(no_anchors, fields=['poid'], header=60)[0] == no_anchors
+    monkeypatch.setattr(context_trimmer, 'LLM_CONTEXT_TRIM', False)
+    assert trim_to_anchors(_bill(), window=50, header=60)[1]['trimmed'] is False
@@ -0,0 +1,43 @@
+import pytest
+
+from services.field_confidence import PROXIMITY_FLOOR, score_fields
+from services.utility_profiles import profile_for
+
+RGE = profile_for('RG&E')
+
+
+def _score(text, **fields):
+    results = {'utility_name': ('RG&E', 0.95), 'customer_name': ('', 0.0), 'account_number': ('', 0.0),
+               'poid': ('', 0.0), 'monthly_usage_kwh': (0, 0.0), 'usage_breakdown': ([], 0.0),
+               'service_address': ('', 0.0)}
+    results.update(fields)
+    return score_fields(results, text, RGE)
+
+
+def test_account_number_repeated_on_the_remittance_stub_scores_higher():
+    once = _score("Account Number: 2001-2345-678", account_number=('20012345678', 0.9))
+    twice = _score("Account Number: 2001-2345-678 ... Return with payment Account 2001 2345 678",
+                   account_number=('20012345678', 0.9))
+    assert once['account_number'][1] == pytest.approx(0.9)
+    assert twice['account_number'][1] == pytest.approx(0.95)
+
+
+def test_values_far_from_their_label_lose_confidence():
+    text = "Account Number:" + " filler" * 100 + " 2001-2345-678"
+    confidence = _score(text, account_number=('20012345678', 0.9))['account_number'][1]
+    assert 0.9 * PROXIMITY_FLOOR <= confidence < 0.9
+
+
+def test_values_of_the_wrong_shape_are_rejected():
+    assert _score("PoD ID: 0351234567", poid=('0351234567', 0.95))['poid'][1] == 0.0
+    assert _score("Customer Name: RG&E Customer", customer_name=('RG&E Customer', 0.85))['customer_name'][1] == 0.0
+
+
+def test_usage_readings_that_add_up_to_a_printed_total_agree():
+    usage = {'monthly_usage_kwh': (650, 0.9), 'usage_breakdown': ([400, 250], 0.9)}
+    with_total = _score("Billed Usage 400 kWh 250 kWh Total 650 kWh", **usage)
+    without_total = _score("Billed Usage 400 kWh 250 kWh", **usage)
+    assert with_total['monthly_usage_kwh'][1] == pytest.approx(0.95)
+    assert without_total['monthly_usage_kwh'][1] == pytest.approx(0.9)
+    # The breakdown follows the total it sums to
+    assert with_total['usage_breakdown'] == ([400, 250], with_total['monthly_usage_kwh'][1])
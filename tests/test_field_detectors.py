@@ -0,0 +1,40 @@
+from services.field_detectors import (detect_account_number, detect_fields, detect_poid, detect_usage,
+                                      fields_complete, missing_fields)
+
+NYSEG_PAGE = (
+    "NYSEG\n"
+    "Account Number: 1001-2345-678\n"
+    "PoD ID: R12345678901234\n"
+    "Billed Usage 1,250 kWh\n"
+)
+
+
+def test_account_number_needs_a_label_and_enough_digits():
+    assert detect_account_number("Account Number: 1001-2345-678") == ('10012345678', 0.9)
+    assert detect_account_number("your account 1001 2345 678") == ('10012345678', 0.7)
+    assert detect_account_number("Account Number: 123") == ('', 0.0)
+
+
+def test_poid_patterns_are_tried_strongest_first():
+    assert detect_poid("PoD ID: R12345678901234") == ('R12345678901234', 0.95)
+    assert detect_poid("Point of Delivery ID: 123456789") == ('123456789', 0.8)
+    assert detect_poid("no identifier here") == ('', 0.0)
+
+
+def test_usage_needs_a_usage_label_and_ignores_daily_averages():
+    assert detect_usage("Billed Usage 1,250 kWh") == (['1250'], 0.8)
+    assert detect_usage("Average 41 kWh/day") == ([], 0.0)
+    assert detect_usage("Rate 0.12 per 100 kWh") == ([], 0.0)
+
+
+def test_poid_is_only_required_where_the_utility_uses_one():
+    nyseg = detect_fields(NYSEG_PAGE)
+    assert fields_complete(nyseg)
+    without_poid = detect_fields(NYSEG_PAGE.replace("PoD ID: R12345678901234\n", ""))
+    assert missing_fields(without_poid) == ['poid']
+    con_ed = detect_fields("Con Edison\nAccount Number: 1234-5678-90\nBilled Usage 650 kWh\n")
+    assert fields_complete(con_ed)
+
+
+def test_unknown_utility_is_never_complete():
+    assert 'utility_name' in missing_fields(detect_fields("Account Number: 1234-5678-90\nBilled Usage 650 kWh"))
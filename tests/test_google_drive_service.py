@@ -0,0 +1,78 @@
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('googleapiclient')
+pytest.importorskip('google_auth_httplib2')
+
+from googleapiclient.errors import HttpError
+
+from services import google_drive_service
+from services.google_drive_service import GoogleDriveService, UPLOAD_KEY_PROPERTY
+
+
+class Call:
+    def __init__(self, execute):
+        self.execute = execute
+
+
+class FakeFiles:
+    """files() of a Drive folder whose create calls fail as scripted"""
+
+    def __init__(self, failures):
+        self.failures = list(failures)   # (error, created_anyway) per failing create call
+        self.created = []
+
+    def create(self, body, media_body=None, fields=None, supportsAllDrives=None):
+        def execute():
+            if self.failures:
+                error, created_anyway = self.failures.pop(0)
+                if created_anyway:
+                    self.created.append(body)
+                raise error
+            self.created.append(body)
+            return {'id': f"file-{len(self.created)}"}
+        return Call(execute)
+
+    def list(self, q, **kwargs):
+        def execute():
+            matches = [f"file-{index}" for index, body in enumerate(self.created, 1)
+                       if f"value='{body['appProperties'][UPLOAD_KEY_PROPERTY]}'" in q]
+            return {'files': [{'id': file_id} for file_id in matches]}
+        return Call(execute)
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    def _drive(failures):
+        files = FakeFiles(failures)
+        manager = SimpleNamespace(get_drive_service=lambda: SimpleNamespace(files=lambda: files))
+        monkeypatch.setattr(google_drive_service, 'GoogleServiceManager', lambda: manager)
+        monkeypatch.setattr(google_drive_service.time, 'sleep', lambda seconds: None)
+        return GoogleDriveService(), files
+    return _drive
+
+
+def _http_error(status):
+    return HttpError(SimpleNamespace(status=status, reason=''), b'')
+
+
+def test_retry_after_a_write_that_succeeded_does_not_upload_twice(drive):
+    service, files = drive([(socket.timeout('read timed out'), True)])
+    file_id = service.upload_file(b'%PDF', 'poa.pdf', 'folder-1', retries=3)
+    assert file_id == 'file-1'
+    assert len(files.created) == 1
+
+
+def test_retry_after_a_failed_write_uploads_again(drive):
+    service, files = drive([(_http_error(503), False), (_http_error(429), False)])
+    assert service.upload_file(b'%PDF', 'poa.pdf', 'folder-1', retries=3) == 'file-1'
+    assert len(files.created) == 1
+
+
+def test_non_retryable_errors_are_raised(drive):
+    service, files = drive([(_http_error(403), False)])
+    with pytest.raises(HttpError):
+        service.upload_file(b'%PDF', 'poa.pdf', 'folder-1', retries=3)
+    assert files.created == []
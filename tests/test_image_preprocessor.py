@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+Image = pytest.importorskip('PIL.Image')
+
+from services import image_preprocessor
+from services.image_preprocessor import deskew, estimate_skew, estimate_text_height, preprocess_for_vision
+
+LINE = "Account Number 1234567 Billed Usage 650 kWh"
+
+
+def _page(width=2400, height=3200, font_scale=2.0):
+    """A white page of printed text lines, ~23 px of text height per unit of font_scale"""
+    page = np.full((height, width), 255, np.uint8)
+    for y in range(150, height - 100, int(60 * font_scale)):
+        cv2.putText(page, LINE, (100, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0, 3)
+    return page
+
+
+def _jpeg(gray, quality=95, exif=None):
+    buffer = io.BytesIO()
+    image = Image.fromarray(gray)
+    if exif is None:
+        image.save(buffer, 'JPEG', quality=quality)
+    else:
+        image.save(buffer, 'JPEG', quality=quality, exif=exif)
+    return buffer.getvalue()
+
+
+def test_text_height_is_measured_in_full_size_pixels():
+    small = estimate_text_height(_page())
+    # Twice the size, so measured on a downscaled copy - the answer still scales with the page
+    large = estimate_text_height(_page(4800, 6400, 4.0))
+    assert 35 <= small <= 55
+    assert large == pytest.approx(2 * small, rel=0.15)
+
+
+def test_skew_is_estimated_and_undone():
+    skewed = deskew(_page(), -3)
+    angle = estimate_skew(skewed)
+    assert angle == pytest.approx(3, abs=0.5)
+    assert abs(estimate_skew(deskew(skewed, angle))) < 0.5
+
+
+def test_large_text_is_shrunk_towards_the_target_height():
+    content = _jpeg(_page())
+    processed, info = preprocess_for_vision(content)
+    assert info['preprocessed']
+    assert info['scale'] < 1
+    assert len(processed) < len(content)
+    assert max(info['processed_size']) >= image_preprocessor.OCR_MIN_IMAGE_DIMENSION
+
+
+def test_exif_rotation_is_kept_even_when_the_result_is_larger():
+    exif = Image.Exif()
+    exif[image_preprocessor.EXIF_ORIENTATION_TAG] = 6   # Rotate 90° clockwise to display
+    content = _jpeg(_page(1200, 800, 1.0), quality=30, exif=exif)
+    processed, info = preprocess_for_vision(content)
+    assert info['preprocessed']
+    assert info['processed_size'] == [800, 1200]
+
+
+def test_unreadable_bytes_are_passed_through():
+    assert preprocess_for_vision(b'not an image') == (b'not an image', {'original_bytes': 12, 'preprocessed': False})
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from services.job_queue import QueueFullError, SubmissionJobQueue
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_jobs_run_and_record_their_outcome():
+    pool = SubmissionJobQueue(worker_count=2, max_queued=4)
+    ran = []
+    pool.submit('ok', ran.append, 'ok')
+    pool.submit('bad', lambda: 1 / 0)
+    assert _wait_for(lambda: pool.get_job('ok')['status'] == 'done' and pool.get_job('bad')['status'] == 'failed')
+    assert ran == ['ok']
+    assert 'division by zero' in pool.get_job('bad')['error']
+
+
+def test_backlog_beyond_max_queued_is_rejected():
+    pool = SubmissionJobQueue(worker_count=1, max_queued=1)
+    release = threading.Event()
+    pool.submit('running', release.wait)
+    assert _wait_for(lambda: pool.get_job('running')['status'] == 'running')
+    assert pool.submit('waiting', release.wait) == 1
+    assert not pool.has_capacity()
+    with pytest.raises(QueueFullError):
+        pool.submit('rejected', release.wait)
+    release.set()
+    assert _wait_for(lambda: pool.get_job('waiting')['status'] == 'done')
+    assert pool.has_capacity()
+
+
+def test_concurrent_first_submits_start_one_pool():
+    pool = SubmissionJobQueue(worker_count=2, max_queued=16)
+    release = threading.Event()
+    submitters = [threading.Thread(target=pool.submit, args=(f"job-{index}", release.wait)) for index in range(8)]
+    for thread in submitters:
+        thread.start()
+    for thread in submitters:
+        thread.join()
+    assert len(pool._threads) == 2
+    assert _wait_for(lambda: pool.stats()['running'] == 2)
+    assert pool.stats()['queued'] == 6
+    release.set()
+    assert _wait_for(lambda: all(pool.get_job(f"job-{index}")['status'] == 'done' for index in range(8)))
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+from services.job_store import SubmissionJobStore, local_db_connection
+
+
+def _dead_pid():
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+    return child.pid
+
+
+def _orphan(store, job_id, attempts=1):
+    """Make a running job look like its worker was recycled"""
+    store.create_job(job_id, f"session-{job_id}", {'account_name': 'Acme'}, f"/tmp/{job_id}.pdf")
+    with local_db_connection(store.db_path) as conn:
+        conn.execute("UPDATE jobs SET status = 'running', owner_pid = ?, attempts = ? WHERE job_id = ?",
+                     (_dead_pid(), attempts, job_id))
+
+
+def test_checkpoints_round_trip(tmp_path):
+    store = SubmissionJobStore(db_path=str(tmp_path / 'jobs.db'))
+    store.create_job('job-1', 'session-1', {'account_name': 'Acme'}, '/tmp/bill.pdf')
+    store.save_checkpoint('job-1', 'ocr', {'account_number': '12345'})
+    store.save_checkpoint('job-1', 'drive_folder', 'folder-id')
+    assert store.get_checkpoint('job-1') == {'ocr': {'account_number': '12345'}, 'drive_folder': 'folder-id'}
+
+
+def test_orphaned_jobs_are_claimed_once(tmp_path):
+    store = SubmissionJobStore(db_path=str(tmp_path / 'jobs.db'), max_attempts=3)
+    _orphan(store, 'orphan')
+    store.create_job('live', 'session-live', {}, '/tmp/live.pdf')
+
+    claimed = store.claim_orphaned_jobs()
+    assert [job['job_id'] for job in claimed] == ['orphan']
+    assert claimed[0]['form_data'] == {'account_name': 'Acme'}
+    # Now owned by this (live) process
+    assert store.claim_orphaned_jobs() == []
+
+
+def test_jobs_out_of_attempts_are_failed_not_resumed(tmp_path):
+    store = SubmissionJobStore(db_path=str(tmp_path / 'jobs.db'), max_attempts=2)
+    _orphan(store, 'exhausted', attempts=2)
+    assert store.claim_orphaned_jobs() == []
+    with local_db_connection(store.db_path) as conn:
+        row = conn.execute("SELECT status, error FROM jobs WHERE job_id = 'exhausted'").fetchone()
+    assert row['status'] == 'failed'
+    assert 'interrupted attempts' in row['error']
+
+
+def test_purge_removes_finished_jobs_and_their_checkpoints(tmp_path):
+    store = SubmissionJobStore(db_path=str(tmp_path / 'jobs.db'))
+    store.create_job('done', 'session-done', {}, '/tmp/done.pdf')
+    store.save_checkpoint('done', 'ocr', {})
+    store.mark_completed('done')
+    store.create_job('active', 'session-active', {}, '/tmp/active.pdf')
+    store.purge_finished(max_age_seconds=-1)
+    assert store.get_checkpoint('done') == {}
+    with local_db_connection(store.db_path) as conn:
+        assert [row['job_id'] for row in conn.execute("SELECT job_id FROM jobs")] == ['active']
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from services.layout_usage import billed_usage_from_words
+
+LINE = 12
+
+
+def _row(y, *cells):
+    """Word boxes for one table row: cells are (x0, text) with ~7px per character"""
+    return [(x0, y, x0 + 7 * len(text), y + LINE, text) for x0, text in cells]
+
+
+def _table(header_rows, reading_rows):
+    words = _row(100, (50, 'Meter'), (200, 'Read'), *header_rows)
+    for offset, cells in enumerate(reading_rows, 1):
+        words += _row(100 + 30 * offset, *cells)
+    return words
+
+
+def test_readings_under_the_header_are_read_top_to_bottom():
+    words = _table([(300, 'Billed'), (350, 'Usage'), (600, 'Delivery')], [
+        [(50, '0351234567'), (305, '1,400'), (345, 'kWh'), (600, '120'), (630, 'kWh')],
+        [(50, '0357654321'), (310, '250kWh'), (600, '80'), (630, 'kWh')],
+        [(50, 'Total'), (310, '1,650'), (350, 'kWh')],
+    ])
+    # The Delivery column and the Total row are left out
+    assert billed_usage_from_words(words) == [1400, 250]
+
+
+def test_header_wrapped_onto_two_lines():
+    words = _row(100, (300, 'Billed')) + _row(100 + LINE + 2, (300, 'Usage'))
+    words += _row(140, (305, '400'), (335, 'kWh'))
+    assert billed_usage_from_words(words) == [400]
+
+
+def test_daily_averages_and_distant_tables_are_ignored():
+    words = _table([(300, 'Billed'), (350, 'Usage')], [
+        [(305, '400'), (335, 'kWh')],
+        [(305, '13'), (325, 'kWh/day')],
+    ])
+    words += _row(600, (305, '999'), (335, 'kWh'))
+    assert billed_usage_from_words(words) == [400]
+
+
+def test_no_header_means_no_readings():
+    assert billed_usage_from_words(_row(100, (50, 'Usage'), (305, '400'), (335, 'kWh'))) == []
+    assert billed_usage_from_words([]) == []
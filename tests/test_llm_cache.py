@@ -0,0 +1,32 @@
+from services.job_store import local_db_connection
+from services.llm_cache import LLMParseCache, parse_cache_key
+from services.sqlite_cache import SQLiteKVCache
+
+
+def test_cache_key_covers_text_prompt_version_and_model():
+    key = parse_cache_key("Account 123", 'v3', 'gpt-4o-mini')
+    assert key == parse_cache_key("Account 123", 'v3', 'gpt-4o-mini')
+    assert key != parse_cache_key("Account 124", 'v3', 'gpt-4o-mini')
+    assert key != parse_cache_key("Account 123", 'v4', 'gpt-4o-mini')
+    assert key != parse_cache_key("Account 123", 'v3', 'gpt-4o')
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SQLiteKVCache(str(tmp_path / 'cache.db'), 'kv', ttl_seconds=3600, max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1   # 'a' is now more recent than 'b'
+    cache.put('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.stats()['entries'] == 2
+
+
+def test_a_table_in_the_old_layout_is_replaced(tmp_path):
+    path = str(tmp_path / 'llm_parse_cache.db')
+    with local_db_connection(path) as conn:
+        conn.execute("CREATE TABLE llm_parse_cache (text_hash TEXT PRIMARY KEY, response TEXT)")
+        conn.execute("INSERT INTO llm_parse_cache VALUES ('abc', '{}')")
+    cache = LLMParseCache(db_path=path)
+    assert cache.get('abc') is None
+    cache.put('abc', {'account_number': '123'})
+    assert cache.get('abc') == {'account_number': '123'}
@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+from services import llm_client
+from services.llm_client import LLMClient, LLMRequestError
+
+
+class MockOpenAI:
+    """Local chat completions endpoint; each request takes the next scripted (status, delay) step"""
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.requests = 0
+        self._lock = threading.Lock()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                with mock._lock:
+                    mock.requests += 1
+                    status, delay = mock.steps.pop(0) if mock.steps else (200, 0)
+                time.sleep(delay)
+                body = json.dumps({'choices': [{'message': {'content': ' {"poid": ""} '}}],
+                                   'usage': {'prompt_tokens': 10, 'completion_tokens': 5}}
+                                  if status == 200 else {'error': 'scripted'}).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    if status == 429:
+                        self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client gave up on this request
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def mock_openai(monkeypatch):
+    monkeypatch.setattr(llm_client, 'BACKOFF_BASE_SECONDS', 0.01)
+    servers = []
+
+    def _start(*steps):
+        server = MockOpenAI(steps)
+        servers.append(server)
+        return server
+    yield _start
+    for server in servers:
+        server.close()
+
+
+def _client(server, **kwargs):
+    options = dict(api_key='sk-test', base_url=server.url, deadline=5, attempt_timeout=2, hedge=False)
+    options.update(kwargs)
+    return LLMClient(**options)
+
+
+def _chat(client):
+    return client.chat_completion([{'role': 'user', 'content': 'bill text'}], model='gpt-4o-mini')
+
+
+def test_returns_the_message_and_counts_tokens(mock_openai):
+    client = _client(mock_openai())
+    assert _chat(client) == '{"poid": ""}'
+    stats = client.stats()
+    assert (stats['successes'], stats['prompt_tokens'], stats['completion_tokens']) == (1, 10, 5)
+    assert stats['latency_ms']['samples'] == 1
+
+
+def test_transient_errors_are_retried(mock_openai):
+    server = mock_openai((503, 0), (429, 0))
+    client = _client(server)
+    assert _chat(client) == '{"poid": ""}'
+    assert server.requests == 3
+    assert client.stats()['retries'] == 2
+
+
+def test_client_errors_are_not_retried(mock_openai):
+    server = mock_openai((400, 0))
+    client = _client(server)
+    with pytest.raises(LLMRequestError) as raised:
+        _chat(client)
+    assert raised.value.status == 400
+    assert server.requests == 1
+    assert client.stats()['failures'] == 1
+
+
+def test_each_timed_out_attempt_is_counted_once(mock_openai):
+    server = mock_openai((200, 1.0), (200, 1.0))
+    client = _client(server, attempt_timeout=0.3, deadline=5, max_retries=1)
+    with pytest.raises(LLMRequestError) as raised:
+        _chat(client)
+    assert raised.value.timed_out
+    stats = client.stats()
+    assert (stats['attempts'], stats['timeouts'], stats['retries']) == (2, 2, 1)
+
+
+def test_no_retry_is_started_past_the_deadline(mock_openai):
+    server = mock_openai((200, 1.0), (200, 1.0))
+    client = _client(server, attempt_timeout=0.5, deadline=0.6, max_retries=3)
+    started = time.monotonic()
+    with pytest.raises(LLMRequestError):
+        _chat(client)
+    assert time.monotonic() - started < 1.0
+    assert server.requests <= 2
+
+
+def test_a_slow_request_is_hedged_and_the_faster_copy_wins(mock_openai):
+    server = mock_openai((200, 1.5))
+    client = _client(server, hedge=True, hedge_percentile=95)
+    client._latencies.extend([0.05] * llm_client.HEDGE_MIN_SAMPLES)
+    started = time.monotonic()
+    assert _chat(client) == '{"poid": ""}'
+    assert time.monotonic() - started < 1.0
+    stats = client.stats()
+    assert (stats['hedges'], stats['hedge_wins']) == (1, 1)
+
+
+def test_missing_api_key_fails_without_a_request(monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    client = LLMClient(base_url='http://127.0.0.1:9/v1')
+    assert not client.configured
+    with pytest.raises(LLMRequestError):
+        _chat(client)
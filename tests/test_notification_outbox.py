@@ -0,0 +1,64 @@
+import threading
+import time
+
+from services.notification_outbox import NotificationOutbox
+
+
+def _outbox(tmp_path, **kwargs):
+    return NotificationOutbox(db_path=str(tmp_path / 'outbox.db'), **kwargs)
+
+
+def test_dedupe_key_is_queued_once(tmp_path, monkeypatch):
+    outbox = _outbox(tmp_path)
+    monkeypatch.setattr(outbox, 'start', lambda: None)
+    assert outbox.enqueue('email', {'to': 'a@example.com'}, dedupe_key='job-1:email') is True
+    assert outbox.enqueue('email', {'to': 'a@example.com'}, dedupe_key='job-1:email') is False
+    assert outbox.count_by_status() == {'pending': 1}
+
+
+def test_failed_sends_are_retried_until_dead(tmp_path, monkeypatch):
+    outbox = _outbox(tmp_path, max_attempts=2, base_delay=0)
+    monkeypatch.setattr(outbox, 'start', lambda: None)
+    sent = []
+
+    def flaky(payload):
+        sent.append(payload)
+        raise RuntimeError("SMTP unavailable")
+
+    outbox.register_handler('email', flaky)
+    outbox.enqueue('email', {'n': 1}, dedupe_key='job-1:email')
+    outbox.dispatch_due()
+    assert len(sent) == 2
+    assert outbox.count_by_status() == {'dead': 1}
+
+
+def test_lease_is_renewed_while_a_slow_send_runs(tmp_path, monkeypatch):
+    outbox = _outbox(tmp_path, lease_seconds=0.3)
+    other_worker = _outbox(tmp_path, lease_seconds=0.3)
+    monkeypatch.setattr(outbox, 'start', lambda: None)
+    sent, claimed_elsewhere = [], []
+
+    def slow_send(payload):
+        sent.append(payload)
+        time.sleep(0.4)
+        # Past the original lease - another worker must still not be able to claim the intent
+        claimed_elsewhere.append(other_worker._claim_next())
+        time.sleep(0.2)
+
+    outbox.register_handler('sms', slow_send)
+    outbox.enqueue('sms', {'phone': '+15555550100'}, dedupe_key='job-1:sms')
+    outbox.dispatch_due()
+    assert len(sent) == 1
+    assert claimed_elsewhere == [None]
+    assert outbox.count_by_status() == {'sent': 1}
+
+
+def test_concurrent_start_runs_one_dispatcher(tmp_path):
+    outbox = _outbox(tmp_path, poll_interval=60)
+    starters = [threading.Thread(target=outbox.start) for _ in range(8)]
+    for thread in starters:
+        thread.start()
+    for thread in starters:
+        thread.join()
+    dispatchers = [thread for thread in threading.enumerate() if thread.name == 'notification-dispatcher']
+    assert len(dispatchers) == 1
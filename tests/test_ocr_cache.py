@@ -0,0 +1,35 @@
+import hashlib
+import io
+from types import SimpleNamespace
+
+from services import ocr_cache
+from services.ocr_cache import OCRResultCache, hash_file, save_upload_with_hash
+
+BILL = {'account_number': '12345-67890', 'monthly_usage': '650', 'utility_name': 'Con Edison'}
+
+
+def test_upload_hash_matches_the_saved_file(tmp_path):
+    content = b'%PDF-1.4 ' + bytes(range(256)) * 600
+    path = str(tmp_path / 'bill.pdf')
+    digest = save_upload_with_hash(SimpleNamespace(stream=io.BytesIO(content)), path)
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert hash_file(path) == digest
+    with open(path, 'rb') as saved:
+        assert saved.read() == content
+
+
+def test_cached_results_are_returned_until_they_expire(tmp_path):
+    path = str(tmp_path / 'ocr_cache.db')
+    cache = OCRResultCache(db_path=path, ttl_seconds=60)
+    cache.put('hash-1', BILL)
+    assert cache.get('hash-1') == BILL
+    assert cache.get('hash-2') is None
+    # The same entry is already too old for a cache with a shorter TTL
+    assert OCRResultCache(db_path=path, ttl_seconds=-1).get('hash-1') is None
+
+
+def test_results_from_an_older_cache_version_are_ignored(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ocr_cache.db')
+    OCRResultCache(db_path=path).put('hash-1', BILL)
+    monkeypatch.setattr(ocr_cache, 'OCR_CACHE_VERSION', ocr_cache.OCR_CACHE_VERSION + 1)
+    assert OCRResultCache(db_path=path).get('hash-1') is None
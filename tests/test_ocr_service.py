@@ -0,0 +1,88 @@
+import re
+
+import pytest
+
+pytest.importorskip('google.cloud.vision')
+pytest.importorskip('cv2')
+pytest.importorskip('requests')
+
+from services import ocr_service
+
+PAGE_1 = (
+    "National Grid\n"
+    "Account Number: 12345-67890\n"
+    "Customer Service 1-800-642-4272\n"
+    "Service Address: 12 Main St, Syracuse, NY 13202\n"
+    "Delivery charge per kWh 0.0712\n"
+)
+PAGE_2 = (
+    "Bill prepared for Jane Doe\n"
+    "Electricity used this month 650 kWh\n"
+)
+
+
+def _fake_llm(cleaned_text, rule_results, fields):
+    """Answers only from the text it is given, like the real model"""
+    usage = re.search(r'used this month (\d+) kWh', cleaned_text)
+    name = re.search(r'prepared for ([A-Z]\w+ [A-Z]\w+)', cleaned_text)
+    values = {'monthly_usage_kwh': int(usage.group(1)) if usage else '',
+              'customer_name': name.group(1) if name else ''}
+    return {field: values.get(field, '') for field in fields}
+
+
+def _run(monkeypatch, pages, stream_llm=True):
+    requests_seen = []
+
+    def fake_iter_bill_text(file_path, service_account_info, metadata):
+        for number, text in enumerate(pages, 1):
+            yield number, text
+
+    def fake_request(cleaned_text, rule_results, fields):
+        requests_seen.append(list(fields))
+        return _fake_llm(cleaned_text, rule_results, fields)
+
+    monkeypatch.setattr(ocr_service, 'iter_bill_text', fake_iter_bill_text)
+    monkeypatch.setattr(ocr_service, 'request_missing_fields', fake_request)
+    monkeypatch.setattr(ocr_service, 'OCR_STREAM_LLM', stream_llm)
+    events = list(ocr_service.stream_utility_bill('bill.pdf', {}))
+    assert events[-1][0] == 'result'
+    return events[-1][1], requests_seen
+
+
+def test_values_on_a_later_page_are_not_lost_to_the_early_llm_request(monkeypatch):
+    result, requests_seen = _run(monkeypatch, [PAGE_1, PAGE_2])
+    assert result['customer_name'] == 'Jane Doe'
+    assert str(result['monthly_usage']) == '650'
+    # Page 1 already had the anchors, so the early request went out - and was followed up
+    assert len(requests_seen) == 2
+
+
+def test_streaming_matches_the_non_streaming_result(monkeypatch):
+    streamed, _ = _run(monkeypatch, [PAGE_1, PAGE_2], stream_llm=True)
+    batch, requests_seen = _run(monkeypatch, [PAGE_1, PAGE_2], stream_llm=False)
+    assert len(requests_seen) == 1
+    for field in ('customer_name', 'monthly_usage', 'account_number', 'service_address'):
+        assert streamed[field] == batch[field]
+
+
+def test_early_answer_is_used_when_no_pages_follow(monkeypatch):
+    result, requests_seen = _run(monkeypatch, [PAGE_1 + PAGE_2])
+    assert result['customer_name'] == 'Jane Doe'
+    assert len(requests_seen) == 1
+
+
+def test_usable_early_answers_drops_blanks_and_stale_guesses():
+    rule_results = {'customer_name': ('', 0.0), 'poid': ('R12345678901234', 0.8), 'account_number': ('1', 0.5)}
+    answers = {'customer_name': '', 'poid': 'R999', 'account_number': '12345-67890'}
+    guesses = {'customer_name': '', 'poid': '', 'account_number': '1'}
+    missing = ['customer_name', 'poid', 'account_number']
+    assert ocr_service._usable_early_answers(answers, missing, True, guesses, rule_results) == {
+        'account_number': '12345-67890'}
+    assert ocr_service._usable_early_answers(answers, missing, False, guesses, rule_results) == answers
+
+
+def test_placeholder_results_are_marked(monkeypatch):
+    monkeypatch.setattr(ocr_service, 'iter_bill_text', lambda *args: iter([(1, PAGE_1 + PAGE_2)]))
+    monkeypatch.setattr(ocr_service, 'request_missing_fields', lambda *args: None)
+    assert list(ocr_service.stream_utility_bill('bill.pdf', {}))[-1][1]['mock_data'] is True
+    assert list(ocr_service.stream_utility_bill('test_utility_bill.pdf', {}))[-1][1]['mock_data'] is True
@@ -0,0 +1,39 @@
+import pytest
+
+from services.progress_model import StageTimingModel
+
+STAGES = {
+    'ocr': (),
+    'drive_folder': (),
+    'poa': ('ocr',),
+    'upload_poa': ('drive_folder', 'poa'),
+}
+PRIORS = {'ocr': 10.0, 'drive_folder': 1.0, 'poa': 3.0, 'upload_poa': 2.0}
+
+
+def _model(tmp_path, **kwargs):
+    return StageTimingModel(db_path=str(tmp_path / 'timings.db'), default_seconds=PRIORS, **kwargs)
+
+
+def test_remaining_time_follows_the_critical_path(tmp_path):
+    model = _model(tmp_path)
+    # ocr -> poa -> upload_poa; the Drive folder runs alongside
+    assert model.remaining_seconds(STAGES) == pytest.approx(15.0)
+    assert model.remaining_seconds(STAGES, completed={'ocr'}) == pytest.approx(5.0)
+    assert model.remaining_seconds(STAGES, completed={'ocr'}, running={'poa': 100.0}, now=102.0) == pytest.approx(3.0)
+
+
+def test_overrunning_stage_is_assumed_nearly_done(tmp_path):
+    model = _model(tmp_path)
+    assert model.remaining_seconds({'ocr': ()}, running={'ocr': 0.0}, now=60.0) == pytest.approx(1.0)
+
+
+def test_measurements_move_the_estimate_and_are_shared(tmp_path):
+    model = _model(tmp_path, alpha=0.5)
+    model.record('ocr', 20.0)
+    assert model.expected('ocr') == pytest.approx(20.0)
+    model.record('ocr', 10.0)
+    assert model.expected('ocr') == pytest.approx(15.0)
+    # Another worker on the box reads the same estimates
+    assert _model(tmp_path).expected('ocr') == pytest.approx(15.0)
+    assert _model(tmp_path).expected('poa') == pytest.approx(3.0)
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+from services.progress_store import MemoryProgressStore, SQLiteProgressStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryProgressStore()
+    return SQLiteProgressStore(db_path=str(tmp_path / 'progress.db'), poll_interval=0.01)
+
+
+def _session(start_time=1000.0, **fields):
+    return dict({'start_time': start_time, 'status': 'in_progress', 'percentage': 0}, **fields)
+
+
+def test_updates_bump_the_version(store):
+    store.create('s1', _session())
+    assert store.get('s1')['version'] == 1
+    updated = store.update('s1', {'percentage': 40}, mutate=lambda session: session.update(step_name='OCR'))
+    assert (updated['version'], updated['percentage'], updated['step_name']) == (2, 40, 'OCR')
+    assert store.version('s1') == 2
+    assert store.update('unknown', {'percentage': 1}) is None
+
+
+def test_watch_wakes_on_a_change_from_another_thread(store):
+    store.create('s1', _session())
+    threading.Timer(0.05, store.update, args=('s1', {'percentage': 50})).start()
+    with store.watch('s1') as wait:
+        started = time.time()
+        assert wait(1, timeout=5) == 2
+        assert time.time() - started < 2
+        # No further change: returns the same version once the timeout passes
+        assert wait(2, timeout=0.05) == 2
+
+
+def test_watch_reports_a_deleted_session(store):
+    store.create('s1', _session())
+    store.delete('s1')
+    with store.watch('s1') as wait:
+        assert wait(1, timeout=1) is None
+
+
+def test_purge_applies_the_same_retention_on_both_backends(store):
+    now = 10000.0
+    store.create('running', _session(start_time=now - 5000))
+    store.create('abandoned', _session(start_time=now - 700, status='error'))
+    store.create('recent_error', _session(start_time=now - 60, status='error'))
+    store.create('expired', _session(start_time=now - 400, status='completed', completed_time=now - 300))
+    # Completed in the opposite order to how they started: the newest completions are kept
+    for index in reversed(range(4)):
+        store.create(f"done-{index}", _session(start_time=now - 100 + index, status='completed',
+                                               completed_time=now - index))
+
+    removed = store.purge(completed_ttl=120, abandoned_ttl=600, keep_completed=2, now=now)
+    assert removed == 4
+    remaining = {session_id for session_id in ('running', 'abandoned', 'recent_error', 'expired',
+                                               'done-0', 'done-1', 'done-2', 'done-3')
+                 if store.get(session_id) is not None}
+    assert remaining == {'running', 'recent_error', 'done-0', 'done-1'}
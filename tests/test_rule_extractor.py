@@ -0,0 +1,45 @@
+from services.rule_extractor import FIELDS, extract_with_rules, split_confident
+
+# Normalized OCR text: line breaks already collapsed to spaces
+RGE_BILL = ("RG&E Rochester Gas and Electric Account Number: 2001-2345-678 Customer Name: Jane Doe "
+            "Service Address: 12 Main St, Rochester, NY 14604 PoD ID: R12345678901234 "
+            "Billed Usage 400 kWh 250 kWh Total Charges $99")
+NATIONAL_GRID_BILL = ("National Grid Account Number: 12345-67890 "
+                      "Service Address: 1 Elm St, Syracuse, NY 13202 kWh Used 650 kWh")
+
+
+def test_a_typical_rge_bill_needs_no_llm():
+    confident, missing = split_confident(extract_with_rules(RGE_BILL))
+    assert missing == []
+    assert confident == {
+        'utility_name': 'RG&E',
+        'customer_name': 'Jane Doe',
+        'account_number': '20012345678',
+        'poid': 'R12345678901234',
+        'monthly_usage_kwh': 650,
+        'usage_breakdown': [400, 250],
+        'service_address': '12 Main St, Rochester, NY 14604',
+    }
+
+
+def test_only_uncertain_fields_go_to_the_llm():
+    results = extract_with_rules(NATIONAL_GRID_BILL)
+    confident, missing = split_confident(results)
+    assert missing == ['customer_name']
+    # National Grid bills carry no POID - blank is a confident answer
+    assert confident['poid'] == ''
+    assert confident['account_number'] == '12345-67890'
+    assert confident['monthly_usage_kwh'] == 650
+
+
+def test_word_box_usage_is_preferred_for_column_utilities():
+    value, confidence = extract_with_rules(RGE_BILL, {'values': [400, 250]})['monthly_usage_kwh']
+    assert value == 650
+    assert confidence > extract_with_rules(RGE_BILL)['monthly_usage_kwh'][1]
+
+
+def test_unknown_utility_sends_nearly_everything_to_the_llm():
+    results = extract_with_rules("Statement Account Number 1234567890")
+    assert set(results) == set(FIELDS)
+    assert split_confident(results)[0] == {'account_number': '1234567890'}
+    assert split_confident(results, min_confidence=1.0)[0] == {}
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from services.stage_graph import StageGraph, StageGraphError
+
+
+def test_stages_receive_their_dependencies_results():
+    graph = StageGraph()
+    graph.add_stage('ocr', lambda inputs: {'account': '123'})
+    graph.add_stage('folder', lambda inputs: 'folder-id')
+    graph.add_stage('upload', lambda inputs: f"{inputs['folder']}/{inputs['ocr']['account']}", ('ocr', 'folder'))
+    assert graph.run()['upload'] == 'folder-id/123'
+
+
+def test_independent_stages_overlap():
+    # Each stage waits for the other to start - this only finishes if they run at once
+    both_started = threading.Barrier(2, timeout=5)
+    graph = StageGraph()
+    graph.add_stage('a', lambda inputs: both_started.wait())
+    graph.add_stage('b', lambda inputs: both_started.wait())
+    assert set(graph.run(max_workers=2)) == {'a', 'b'}
+
+
+def test_callbacks_report_each_stage():
+    started, completed = [], []
+    graph = StageGraph()
+    graph.add_stage('first', lambda inputs: 1)
+    graph.add_stage('second', lambda inputs: inputs['first'] + 1, ('first',))
+    graph.run(on_stage_start=started.append,
+              on_stage_complete=lambda name, result, seconds: completed.append((name, result)))
+    assert started == ['first', 'second']
+    assert completed == [('first', 1), ('second', 2)]
+
+
+def test_a_failing_stage_stops_its_dependents():
+    ran = []
+    graph = StageGraph()
+    graph.add_stage('ocr', lambda inputs: 1 / 0)
+    graph.add_stage('poa', lambda inputs: ran.append('poa'), ('ocr',))
+    with pytest.raises(StageGraphError) as raised:
+        graph.run()
+    assert raised.value.stage == 'ocr'
+    assert isinstance(raised.value.error, ZeroDivisionError)
+    assert ran == []
+
+
+def test_malformed_graphs_are_rejected():
+    graph = StageGraph()
+    graph.add_stage('ocr', lambda inputs: None)
+    with pytest.raises(ValueError):
+        graph.add_stage('ocr', lambda inputs: None)
+    with pytest.raises(ValueError):
+        graph.add_stage('poa', lambda inputs: None, ('missing',))
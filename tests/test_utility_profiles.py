@@ -0,0 +1,42 @@
+from services import utility_profiles
+from services.utility_profiles import (UtilityClassifier, classify_utility, configure_profiles, profile_for,
+                                       profiles_from_rows)
+
+
+def test_most_mentioned_utility_wins_and_ties_go_to_the_first():
+    assert classify_utility("NYSEG partner notice ... RG&E RG&E").name == 'RG&E'
+    assert classify_utility("Con Ed and PSEG").name == 'Con Edison'
+    assert classify_utility("national\n  grid").name == 'National Grid'
+
+
+def test_keywords_match_whole_words_only():
+    # "rge" is an RG&E keyword but must not match inside "large" or "charge"
+    assert classify_utility("A large charge") is None
+    assert classify_utility("") is None
+
+
+def test_sheet_rows_override_and_extend_the_built_in_profiles():
+    profiles = {profile.name: profile for profile in profiles_from_rows([
+        {'utility_name': 'National Grid', 'max_pages': '2', 'prompt_hint': 'Usage is in the top box.'},
+        {'utility_name': 'Acme Power', 'keywords': 'Acme Power|acmepower.com', 'poid': 'none'},
+        {'utility_name': 'Broken', 'poid': 'sometimes'},
+        {'utility_name': 'Bad Regex', 'account_regex': '(unclosed'},
+    ])}
+    national_grid = profiles['National Grid']
+    # Blank cells keep the built-in values
+    assert (national_grid.max_pages, national_grid.poid, national_grid.usage_method) == (2, 'none', 'labeled')
+    assert national_grid.prompt_hint == 'Usage is in the top box.'
+    assert national_grid.account_pattern is not None
+    assert profiles['Acme Power'].keywords == ['Acme Power', 'acmepower.com']
+    assert not profiles['Acme Power'].poid_required
+    assert 'Broken' not in profiles and 'Bad Regex' not in profiles
+
+
+def test_configured_profiles_are_used_for_classification(monkeypatch):
+    monkeypatch.setattr(utility_profiles, '_classifier', UtilityClassifier(utility_profiles.DEFAULT_PROFILES))
+    monkeypatch.setattr(utility_profiles, '_configured_rows', None)
+    assert classify_utility("Acme Power statement") is None
+    configure_profiles([{'utility_name': 'Acme Power', 'keywords': 'Acme Power', 'poid': 'required'}])
+    assert classify_utility("Acme Power statement").name == 'Acme Power'
+    assert profile_for('Acme Power').poid_required
+    assert profile_for('RG&E') is not None
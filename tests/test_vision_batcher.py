@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('google.cloud.vision')
+
+from services.vision_batcher import VisionBatcher
+
+
+class FakeClient:
+    """Answers each image with its own bytes, so routing mistakes show up"""
+
+    def __init__(self, drop_last=False, error=None):
+        self.batches = []
+        self.drop_last = drop_last
+        self.error = error
+        self._lock = threading.Lock()
+
+    def batch_annotate_images(self, requests):
+        with self._lock:
+            self.batches.append(len(requests))
+        if self.error:
+            raise self.error
+        responses = [SimpleNamespace(text=request.image.content) for request in requests]
+        return SimpleNamespace(responses=responses[:-1] if self.drop_last else responses)
+
+
+def _annotate_all(batcher, images):
+    with ThreadPoolExecutor(max_workers=len(images)) as pool:
+        return list(pool.map(lambda content: batcher.annotate(content, timeout=5), images))
+
+
+def test_concurrent_images_share_a_request_and_get_their_own_answer():
+    client = FakeClient()
+    batcher = VisionBatcher(lambda: client, max_batch=16, max_wait_ms=200)
+    images = [f"page-{index}".encode() for index in range(6)]
+    responses = _annotate_all(batcher, images)
+    assert [response.text for response in responses] == images
+    assert sum(client.batches) == 6
+    assert len(client.batches) < 6
+
+
+def test_batches_respect_the_image_and_byte_limits():
+    client = FakeClient()
+    batcher = VisionBatcher(lambda: client, max_batch=2, max_wait_ms=200, max_batch_bytes=10)
+    images = [bytes([index]) * 6 for index in range(4)]
+    assert [response.text for response in _annotate_all(batcher, images)] == images
+    # Two 6-byte images don't fit in 10 bytes, so every image goes on its own
+    assert client.batches == [1, 1, 1, 1]
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    batcher = VisionBatcher(lambda: FakeClient(error=RuntimeError("quota exceeded")), max_wait_ms=50)
+    with pytest.raises(RuntimeError, match="quota exceeded"):
+        batcher.annotate(b'page', timeout=5)
+
+
+def test_missing_responses_fail_instead_of_hanging():
+    batcher = VisionBatcher(lambda: FakeClient(drop_last=True), max_wait_ms=50)
+    with pytest.raises(RuntimeError, match="fewer responses"):
+        batcher.annotate(b'page', timeout=5)
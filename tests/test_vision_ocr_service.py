@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+pytest.importorskip('google.cloud.vision')
+pytest.importorskip('PIL')
+pytest.importorskip('cv2')
+
+from services import vision_ocr_service
+from services.vision_ocr_service import VisionOCRService
+
+# A scanned Con Edison bill: the usage needed for early exit is on page 3 of 5
+SCANNED_PAGES = [
+    "Con Edison\nAccount Number: 12345-67890\n",
+    "Important information about your service\n",
+    "Billed Usage 650 kWh\n",
+    "Ways to pay\n",
+    "Terms and conditions\n",
+]
+
+
+class FakePixmap:
+    def __init__(self, number):
+        self.number = number
+
+    def tobytes(self, fmt):
+        return f"page-{self.number}".encode()
+
+
+class FakePage:
+    """A page with no text layer, so it has to go to Vision"""
+
+    def __init__(self, number):
+        self.number = number
+
+    def get_text(self, kind):
+        return "" if kind == "text" else []
+
+    def get_pixmap(self, dpi):
+        return FakePixmap(self.number)
+
+
+@pytest.fixture
+def scanned_bill(monkeypatch):
+    sent = []
+    lock = threading.Lock()
+
+    def fake_pages(self, pdf_path, metadata, max_pages=10):
+        metadata['page_count'] = len(SCANNED_PAGES)
+        for number in range(1, len(SCANNED_PAGES) + 1):
+            yield number, FakePage(number)
+
+    def fake_vision(self, content, words=None):
+        number = int(content.decode().split('-')[1])
+        with lock:
+            sent.append(number)
+        return SCANNED_PAGES[number - 1]
+
+    monkeypatch.setattr(vision_ocr_service.os.path, 'getsize', lambda path: 1024)
+    monkeypatch.setattr(VisionOCRService, '_iter_pdf_pages', fake_pages)
+    monkeypatch.setattr(VisionOCRService, 'extract_text_from_bytes', fake_vision)
+    monkeypatch.setattr(VisionOCRService, '_credentials', object())
+    monkeypatch.setattr(vision_ocr_service, 'OCR_PAGE_CONCURRENCY', 3)
+    return sent
+
+
+def _read(metadata):
+    return [number for number, _ in VisionOCRService({}).iter_pdf_text('bill.pdf', metadata)]
+
+
+def test_early_exit_does_not_send_pages_past_the_one_that_completes_the_fields(scanned_bill):
+    metadata = {}
+    assert _read(metadata) == [1, 2, 3]
+    assert metadata['early_exit'] is True
+    # Only the usage was missing after page 1, so pages were read one at a time
+    assert sorted(scanned_bill) == [1, 2, 3]
+    assert metadata['vision_requests'] == 3
+
+
+def test_vision_requests_count_every_page_sent(scanned_bill, monkeypatch):
+    monkeypatch.setattr(vision_ocr_service, 'OCR_EARLY_EXIT', False)
+    metadata = {}
+    assert _read(metadata) == [1, 2, 3, 4, 5]
+    assert sorted(scanned_bill) == [1, 2, 3, 4, 5]
+    assert metadata['vision_requests'] == 5
+
+
+def test_vision_requests_include_pages_in_flight_when_the_consumer_stops(scanned_bill, monkeypatch):
+    monkeypatch.setattr(vision_ocr_service, 'OCR_EARLY_EXIT', False)
+    metadata = {}
+    pages = VisionOCRService({}).iter_pdf_text('bill.pdf', metadata)
+    assert next(pages)[0] == 1
+    pages.close()
+    # Pages 2 and 3 were read ahead; whatever wasn't cancelled in time was sent and is counted
+    assert metadata['vision_requests'] == len(scanned_bill)
+    assert 1 <= metadata['vision_requests'] <= 3